@@ -1,2 +1,3 @@
 from .raster import Raster
 from .rasterlayer import RasterLayer
+from .cube import RasterCube
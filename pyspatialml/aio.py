@@ -0,0 +1,68 @@
+import asyncio
+import concurrent.futures
+import threading
+
+from .parallel import _handle_pool
+
+# Options for the asyncio methods of the Raster class:
+#   max_workers : number of threads that run the blocking GDAL calls of the
+#       requests. This is also the maximum number of dataset handles that are
+#       opened for each Raster, which are shared by the requests that are in flight.
+options = {
+    "max_workers": 8,
+}
+
+_lock = threading.Lock()
+_executor = None
+
+
+def _get_executor():
+    """The thread pool that is shared by the asyncio methods, which is created on
+    first use and is recreated if `options["max_workers"]` changes.
+    """
+    global _executor
+
+    with _lock:
+        if _executor is None or _executor._max_workers != options["max_workers"]:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+
+            _executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=options["max_workers"]
+            )
+
+    return _executor
+
+
+def _borrow(raster, function):
+    """Call a function with a Raster that is borrowed from the handle pool of a
+    Raster.
+    """
+    pool = _handle_pool(raster, options["max_workers"])
+
+    with pool.borrow() as handle:
+        return function(handle)
+
+
+async def _run(raster, function):
+    """Run a blocking function of a Raster in the shared thread pool.
+
+    The function is called with a copy of the Raster that has its own dataset
+    handles for the duration of the call, so that concurrent requests do not read
+    from the same handles, and do not each open the datasets.
+
+    Parameters
+    ----------
+    raster : pyspatialml.Raster
+        Raster that is read.
+
+    function : callable
+        Function that takes a pyspatialml.Raster.
+
+    Returns
+    -------
+    The result of the function.
+    """
+    loop = asyncio.get_running_loop()
+
+    return await loop.run_in_executor(_get_executor(), _borrow, raster, function)
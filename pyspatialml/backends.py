@@ -0,0 +1,1697 @@
+import concurrent.futures
+import json
+import math
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+import zlib
+from xml.sax.saxutils import escape
+
+import numpy as np
+import rasterio
+import rasterio.shutil
+from rasterio.coords import BoundingBox
+from rasterio.crs import CRS
+from rasterio.dtypes import _gdal_typename
+from rasterio.enums import MaskFlags, Resampling
+from rasterio.transform import Affine, TransformMethodsMixin, array_bounds
+from rasterio.warp import reproject
+from rasterio.windows import Window, WindowMethodsMixin
+
+from .utils import _get_nodata
+from .warp import _source_window
+
+
+class VirtualDataset(WindowMethodsMixin, TransformMethodsMixin):
+    """Base class for read-only raster datasets that are not backed by a
+    GDAL-supported file.
+
+    Implements the subset of the rasterio.DatasetReader API that is used by
+    RasterLayer and Raster objects, so that virtual datasets can be used
+    interchangeably with rasterio datasets, i.e. `rasterio.band(dataset, 1)` can be
+    used to create a RasterLayer. Subclasses only need to implement the
+    `_read_indices` method.
+
+    Parameters
+    ----------
+    count : int
+        Number of bands.
+
+    dtype : str or numpy.dtype
+        Data type of the bands.
+
+    width, height : int
+        Dimensions of the dataset in pixels.
+
+    crs : rasterio.crs.CRS (opt)
+        Coordinate reference system of the dataset.
+
+    transform : affine.Affine (opt)
+        Affine transform of the dataset.
+
+    nodata : any number (opt)
+        Value that represents nodata pixels.
+
+    name : str (opt)
+        Name of the dataset, which is used to name RasterLayers.
+    """
+
+    driver = "Virtual"
+
+    def __init__(
+        self, count, dtype, width, height, crs=None, transform=None, nodata=None,
+        name=None
+    ):
+        self.count = count
+        self.dtypes = tuple([np.dtype(dtype).name] * count)
+        self.width = width
+        self.height = height
+        self.crs = crs
+        self.transform = transform
+        self.nodata = nodata
+        self.name = name if name is not None else "virtual"
+        self.mode = "r"
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __repr__(self):
+        return "<{0} name='{1}' count={2}>".format(
+            type(self).__name__, self.name, self.count
+        )
+
+    @property
+    def shape(self):
+        return self.height, self.width
+
+    @property
+    def indexes(self):
+        return tuple(range(1, self.count + 1))
+
+    @property
+    def nodatavals(self):
+        return tuple([self.nodata] * self.count)
+
+    @property
+    def res(self):
+        return abs(self.transform.a), abs(self.transform.e)
+
+    @property
+    def bounds(self):
+        return BoundingBox(*array_bounds(self.height, self.width, self.transform))
+
+    @property
+    def files(self):
+        return [self.name]
+
+    @property
+    def mask_flag_enums(self):
+        if self.nodata is None:
+            flags = [MaskFlags.all_valid]
+        else:
+            flags = [MaskFlags.nodata]
+        return tuple([flags] * self.count)
+
+    @property
+    def meta(self):
+        return {
+            "driver": self.driver,
+            "dtype": self.dtypes[0],
+            "nodata": self.nodata,
+            "width": self.width,
+            "height": self.height,
+            "count": self.count,
+            "crs": self.crs,
+            "transform": self.transform,
+        }
+
+    @property
+    def profile(self):
+        return self.meta
+
+    def block_windows(self, bidx=0):
+        """Generator of ((row, col), window) tuples of 256 x 256 pixel blocks.
+        """
+        for i, row_off in enumerate(range(0, self.height, 256)):
+            for j, col_off in enumerate(range(0, self.width, 256)):
+                window = Window(
+                    col_off,
+                    row_off,
+                    min(256, self.width - col_off),
+                    min(256, self.height - row_off),
+                )
+                yield (i, j), window
+
+    def close(self):
+        self.closed = True
+
+    def _read_indices(self, indexes, rows, cols):
+        """Read the pixels at the intersection of rows and cols.
+
+        Parameters
+        ----------
+        indexes : list
+            Band indexes (starting at 1) to read.
+
+        rows, cols : ndarray
+            1d arrays of the row and column indices to read.
+
+        Returns
+        -------
+        ndarray
+            3d array of (band, rows, cols).
+        """
+        raise NotImplementedError()
+
+    def _read(self, indexes, window):
+        """Read a window of pixels at full resolution. Subclasses can override this
+        method if reading a contiguous window can be done more efficiently.
+        """
+        rows = np.arange(window.row_off, window.row_off + window.height)
+        cols = np.arange(window.col_off, window.col_off + window.width)
+        return self._read_indices(indexes, rows, cols)
+
+    def read(
+        self,
+        indexes=None,
+        window=None,
+        masked=False,
+        out_shape=None,
+        resampling=Resampling.nearest,
+        out_dtype=None,
+        boundless=False,
+        **kwargs
+    ):
+        """Read data from the dataset.
+
+        Parameters follow the rasterio.DatasetReader.read method, except that
+        boundless reads are not supported.
+
+        Returns
+        -------
+        ndarray
+            2d array if `indexes` is an int, otherwise a 3d array of (band, row,
+            col).
+        """
+        if boundless is True:
+            raise NotImplementedError("boundless reads are not supported")
+
+        if self.closed:
+            raise ValueError("dataset is closed")
+
+        if indexes is None:
+            band_indexes = list(self.indexes)
+        elif isinstance(indexes, int):
+            band_indexes = [indexes]
+        else:
+            band_indexes = list(indexes)
+
+        if window is None:
+            window = Window(0, 0, self.width, self.height)
+        elif not isinstance(window, Window):
+            window = Window.from_slices(*window)
+
+        window = Window(
+            int(window.col_off),
+            int(window.row_off),
+            int(window.width),
+            int(window.height),
+        )
+
+        if out_shape is not None:
+            out_rows, out_cols = out_shape[-2:]
+        else:
+            out_rows, out_cols = window.height, window.width
+
+        if isinstance(resampling, str):
+            resampling = Resampling[resampling]
+
+        if (out_rows, out_cols) == (window.height, window.width):
+            arr = self._read(band_indexes, window)
+
+        elif resampling == Resampling.nearest:
+            # decimated read of the pixels nearest to the centres of the output
+            scale_rows = window.height / out_rows
+            scale_cols = window.width / out_cols
+            rows = window.row_off + np.floor(
+                (np.arange(out_rows) + 0.5) * scale_rows
+            ).astype(int)
+            cols = window.col_off + np.floor(
+                (np.arange(out_cols) + 0.5) * scale_cols
+            ).astype(int)
+            arr = self._read_indices(band_indexes, rows, cols)
+
+        else:
+            arr = self._resample(
+                self._read(band_indexes, window), window, out_rows, out_cols,
+                resampling
+            )
+
+        if out_dtype is not None:
+            arr = arr.astype(out_dtype)
+
+        if masked is True:
+            if self.nodata is None:
+                mask = np.zeros(arr.shape, dtype=bool)
+            elif np.isnan(self.nodata):
+                mask = np.isnan(arr)
+            else:
+                mask = arr == self.nodata
+
+            # masked reads can be modified in place, like the reads of rasterio
+            arr = np.ma.MaskedArray(arr, mask=mask, copy=not arr.flags.writeable)
+
+        if isinstance(indexes, int):
+            arr = arr[0]
+
+        return arr
+
+    def _resample(self, arr, window, out_rows, out_cols, resampling):
+        """Resample a window of data to a different shape using GDAL's warper.
+        """
+        src_transform = self.window_transform(window)
+        dst_transform = src_transform * src_transform.scale(
+            window.width / out_cols, window.height / out_rows
+        )
+        out = np.zeros((arr.shape[0], out_rows, out_cols), dtype=arr.dtype)
+
+        for i in range(arr.shape[0]):
+            reproject(
+                source=arr[i],
+                destination=out[i],
+                src_transform=src_transform,
+                dst_transform=dst_transform,
+                src_crs=self.crs,
+                dst_crs=self.crs,
+                src_nodata=self.nodata,
+                dst_nodata=self.nodata,
+                resampling=resampling,
+            )
+
+        return out
+
+
+class FunctionDataset(VirtualDataset):
+    """Virtual dataset with pixel values that are calculated on demand by a
+    function of the row and column indices of the pixels.
+
+    Parameters
+    ----------
+    function : callable
+        Function that takes a list of band indexes (starting at 1), and 1d arrays
+        of row indices and column indices, and returns a 3d array of (band, rows,
+        cols). The function must be picklable to be used with process-based
+        parallel backends.
+
+    count, dtype, width, height, crs, transform, nodata, name :
+        See VirtualDataset.
+    """
+
+    driver = "Function"
+
+    def __init__(self, function, count, dtype, width, height, crs=None,
+                 transform=None, nodata=None, name=None):
+        super().__init__(count, dtype, width, height, crs, transform, nodata, name)
+        self.function = function
+
+    def _read_indices(self, indexes, rows, cols):
+        arr = self.function(indexes, rows, cols)
+        return np.asarray(arr, dtype=self.dtypes[0])
+
+
+class ArrayDataset(VirtualDataset):
+    """Virtual dataset that reads from an in-memory numpy array.
+
+    Windows are read by slicing the array, so that small intermediate results can
+    be used without writing and reading a file. Like the reads of rasterio, reads
+    return new arrays that can be modified without changing the dataset.
+
+    Parameters
+    ----------
+    arr : ndarray
+        2d array of (rows, cols) or 3d array of (band, rows, cols).
+
+    crs, transform, nodata, name :
+        See VirtualDataset. The transform defaults to the identity transform.
+    """
+
+    driver = "Array"
+
+    def __init__(self, arr, crs=None, transform=None, nodata=None, name=None):
+        arr = np.asarray(arr)
+
+        if arr.ndim == 2:
+            arr = arr[np.newaxis, :, :]
+
+        if transform is None:
+            transform = Affine.identity()
+
+        count, height, width = arr.shape
+        super().__init__(
+            count, arr.dtype, width, height, crs, transform, nodata, name
+        )
+        self.arr = arr
+
+    def _read_indices(self, indexes, rows, cols):
+        bands = np.asarray(indexes) - 1
+        return self.arr[np.ix_(bands, rows, cols)]
+
+    def _read(self, indexes, window):
+        rows, cols = window.toslices()
+
+        # indexing the bands with an array copies the window
+        return self.arr[np.asarray(indexes) - 1, rows, cols]
+
+
+class MemmapDataset(ArrayDataset):
+    """Dataset that stores the bands as a contiguous array in an uncompressed numpy
+    .npy file, which is accessed using a memory map.
+
+    Reading a window of a band is a read-only view of the memory map, without any
+    decoding by GDAL. Masked reads copy the window so that they can be modified. The georeferencing of the dataset is stored in a json sidecar file
+    with the same name as the .npy file with an added '.json' extension. The
+    dataset can be written to any GDAL-supported format using the write methods
+    of the Raster and RasterLayer objects.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the .npy file.
+
+    mode : str, default='r'
+        Mode to open the file, one of 'r', 'r+' or 'w'.
+
+    count, dtype, width, height, crs, transform, nodata :
+        Properties of a new dataset, only used with mode='w'.
+    """
+
+    driver = "NPY"
+
+    def __init__(
+        self, file_path, mode="r", count=None, dtype=None, width=None, height=None,
+        crs=None, transform=None, nodata=None, **kwargs
+    ):
+        if not file_path.endswith(".npy"):
+            raise ValueError("file_path must have a .npy extension")
+
+        if mode == "w":
+            arr = np.lib.format.open_memmap(
+                file_path, mode="w+", dtype=dtype, shape=(count, height, width)
+            )
+            self._write_sidecar(file_path, crs, transform, nodata)
+
+        elif mode in ["r", "r+"]:
+            arr = np.load(file_path, mmap_mode=mode)
+
+            with open(file_path + ".json") as src:
+                sidecar = json.load(src)
+
+            crs = CRS.from_wkt(sidecar["crs"]) if sidecar["crs"] else None
+            transform = sidecar["transform"]
+            transform = Affine(*transform) if transform else None
+            nodata = sidecar["nodata"]
+
+        else:
+            raise ValueError("mode must be one of 'r', 'r+', or 'w'")
+
+        super().__init__(arr, crs, transform, nodata, file_path)
+        self.arr = arr
+        self.mode = mode
+
+    def _read(self, indexes, window):
+        rows, cols = window.toslices()
+
+        # contiguous bands are read as a read-only view of the memory map
+        if list(indexes) == list(range(indexes[0], indexes[0] + len(indexes))):
+            bands = slice(indexes[0] - 1, indexes[0] - 1 + len(indexes))
+        else:
+            bands = np.asarray(indexes) - 1
+
+        arr = self.arr[bands, rows, cols]
+        arr.flags.writeable = False
+
+        return arr
+
+    def __getstate__(self):
+        # the memory map is reopened instead of pickling the data
+        if self.mode != "r":
+            self.arr.flush()
+
+        state = self.__dict__.copy()
+        del state["arr"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.arr = np.load(self.name, mmap_mode="r")
+        self.mode = "r"
+
+    @staticmethod
+    def _write_sidecar(file_path, crs, transform, nodata):
+        if isinstance(nodata, np.generic):
+            nodata = nodata.item()
+
+        sidecar = {
+            "crs": crs.to_wkt() if crs else None,
+            "transform": list(transform)[:6] if transform else None,
+            "nodata": nodata,
+        }
+
+        with open(file_path + ".json", "w") as dst:
+            json.dump(sidecar, dst)
+
+    def write(self, arr, indexes=None, window=None):
+        """Write data to the dataset following the rasterio.DatasetWriter.write
+        method.
+        """
+        if self.mode == "r":
+            raise ValueError("dataset is not opened for writing")
+
+        if indexes is None:
+            bands = slice(None)
+        elif isinstance(indexes, int):
+            bands = indexes - 1
+        else:
+            bands = np.asarray(indexes) - 1
+
+        if window is None:
+            rows, cols = slice(None), slice(None)
+        else:
+            rows, cols = window.toslices()
+
+        self.arr[bands, rows, cols] = arr
+
+    def close(self):
+        if not self.closed and self.mode != "r":
+            self.arr.flush()
+
+        self.closed = True
+
+
+class ZarrDataset:
+    """Chunked Zarr (version 2) store that results are written to in parallel.
+
+    Each chunk contains all of the bands of a block of pixels and is stored in a
+    separate file, so that threads or processes can write different windows at the
+    same time without a shared writer lock. Chunks that are covered by a write are
+    replaced atomically. Writes that only partially cover a chunk are merged with
+    the existing chunk under a lock that is not shared between processes, so
+    parallel writers should use the windows returned by `block_windows`.
+
+    The store uses the layout of GDAL's Zarr driver, with the georeferencing stored
+    as X and Y coordinate arrays and a '_CRS' attribute, so that the store is read
+    by rasterio like any other dataset.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the directory of the store.
+
+    mode : str, default='w'
+        Either 'w' to create a new store, replacing any existing file, or 'r+' to
+        write to an existing store.
+
+    count, dtype, width, height, crs, transform, nodata :
+        Properties of a new store, only used with mode='w'.
+
+    blockxsize, blockysize : int, default=256
+        Width and height of the chunks in pixels.
+
+    compress : str (opt)
+        Either 'deflate' or 'zlib' to compress the chunks with zlib.
+    """
+
+    driver = "Zarr"
+
+    def __init__(
+        self, file_path, mode="w", count=None, dtype=None, width=None, height=None,
+        crs=None, transform=None, nodata=None, blockxsize=256, blockysize=256,
+        compress=None, **kwargs
+    ):
+        self.name = file_path
+        self.mode = mode
+        self.closed = False
+        self._lock = threading.Lock()
+        self._array = os.path.join(
+            file_path, os.path.splitext(os.path.basename(file_path.rstrip("/")))[0]
+        )
+
+        if mode == "w":
+            self._create(
+                count, dtype, width, height, crs, transform, nodata, blockxsize,
+                blockysize, compress
+            )
+
+        elif mode != "r+":
+            raise ValueError("mode must be one of 'w' or 'r+'")
+
+        with open(os.path.join(self._array, ".zarray")) as src:
+            zarray = json.load(src)
+
+        self.count, self.height, self.width = zarray["shape"]
+        self.chunks = tuple(zarray["chunks"])
+        self.dtypes = tuple([np.dtype(zarray["dtype"]).name] * self.count)
+        self.nodata = None if zarray["fill_value"] is None else float(
+            zarray["fill_value"]
+        )
+        self._dtype = np.dtype(zarray["dtype"])
+        self._compressor = zarray["compressor"]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __repr__(self):
+        return "<ZarrDataset name='{0}' count={1}>".format(self.name, self.count)
+
+    def __getstate__(self):
+        # workers reopen the store for writing
+        state = self.__dict__.copy()
+        del state["_lock"]
+        state["mode"] = "r+"
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _create(
+        self, count, dtype, width, height, crs, transform, nodata, blockxsize,
+        blockysize, compress
+    ):
+        if os.path.isdir(self.name):
+            shutil.rmtree(self.name)
+        elif os.path.exists(self.name):
+            os.unlink(self.name)
+
+        if compress is not None and compress.lower() not in ("deflate", "zlib"):
+            raise ValueError("compress must be one of 'deflate' or 'zlib'")
+
+        if isinstance(nodata, np.generic):
+            nodata = nodata.item()
+
+        if nodata is not None and math.isnan(nodata):
+            nodata = "NaN"
+
+        # coordinates of the pixel centres
+        x = transform.c + transform.a * (np.arange(width) + 0.5)
+        y = transform.f + transform.e * (np.arange(height) + 0.5)
+        attrs = {"_ARRAY_DIMENSIONS": ["Band", "Y", "X"]}
+
+        if crs is not None:
+            attrs["_CRS"] = {"wkt": crs.to_wkt()}
+
+        self._write_json(os.path.join(self.name, ".zgroup"), {"zarr_format": 2})
+
+        for dim, coords in (("X", x), ("Y", y)):
+            path = os.path.join(self.name, dim)
+            self._write_array_meta(path, [len(coords)], [len(coords)], "<f8", None)
+            self._write_json(
+                os.path.join(path, ".zattrs"), {"_ARRAY_DIMENSIONS": [dim]}
+            )
+
+            with open(os.path.join(path, "0"), "wb") as dst:
+                dst.write(coords.astype("<f8").tobytes())
+
+        self._write_array_meta(
+            self._array,
+            [count, height, width],
+            [count, min(blockysize, height), min(blockxsize, width)],
+            np.dtype(dtype).newbyteorder("<").str,
+            nodata,
+            {"id": "zlib", "level": 1} if compress is not None else None,
+        )
+        self._write_json(os.path.join(self._array, ".zattrs"), attrs)
+
+    @staticmethod
+    def _write_json(file_path, obj):
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+        with open(file_path, "w") as dst:
+            json.dump(obj, dst)
+
+    def _write_array_meta(
+        self, path, shape, chunks, dtype, fill_value, compressor=None
+    ):
+        zarray = {
+            "chunks": chunks,
+            "compressor": compressor,
+            "dtype": dtype,
+            "fill_value": fill_value,
+            "filters": None,
+            "order": "C",
+            "shape": shape,
+            "zarr_format": 2,
+        }
+        self._write_json(os.path.join(path, ".zarray"), zarray)
+
+    @property
+    def shape(self):
+        return self.height, self.width
+
+    @property
+    def indexes(self):
+        return tuple(range(1, self.count + 1))
+
+    def block_windows(self, bidx=0):
+        """Generator of ((row, col), window) tuples of the chunks of the store.
+        """
+        _, rows, cols = self.chunks
+
+        for i, row_off in enumerate(range(0, self.height, rows)):
+            for j, col_off in enumerate(range(0, self.width, cols)):
+                window = Window(
+                    col_off,
+                    row_off,
+                    min(cols, self.width - col_off),
+                    min(rows, self.height - row_off),
+                )
+                yield (i, j), window
+
+    def _chunk_path(self, i, j):
+        return os.path.join(self._array, "0.{0}.{1}".format(i, j))
+
+    def _read_chunk(self, i, j):
+        path = self._chunk_path(i, j)
+
+        if not os.path.exists(path):
+            fill = np.nan if self.nodata is None else self.nodata
+            return np.full(self.chunks, fill, dtype=self._dtype)
+
+        with open(path, "rb") as src:
+            data = src.read()
+
+        if self._compressor is not None:
+            data = zlib.decompress(data)
+
+        return np.frombuffer(data, dtype=self._dtype).reshape(self.chunks).copy()
+
+    def _write_chunk(self, i, j, chunk):
+        data = np.ascontiguousarray(chunk, dtype=self._dtype).tobytes()
+
+        if self._compressor is not None:
+            data = zlib.compress(data, self._compressor.get("level", 1))
+
+        # chunks are replaced atomically so that they are never partially written
+        path = self._chunk_path(i, j)
+        part_path = os.path.join(
+            self._array, "." + os.path.basename(path) + "." + uuid.uuid4().hex
+        )
+
+        with open(part_path, "wb") as dst:
+            dst.write(data)
+
+        os.replace(part_path, path)
+
+    def write(self, arr, indexes=None, window=None):
+        """Write data to the store following the rasterio.DatasetWriter.write
+        method.
+        """
+        if self.closed:
+            raise ValueError("dataset is closed")
+
+        if indexes is None:
+            bands = list(range(self.count))
+        elif isinstance(indexes, int):
+            bands = [indexes - 1]
+        else:
+            bands = [i - 1 for i in indexes]
+
+        arr = np.asarray(arr)
+
+        if arr.ndim == 2:
+            arr = arr[np.newaxis, :, :]
+
+        if window is None:
+            window = Window(0, 0, self.width, self.height)
+
+        row_off, col_off = int(window.row_off), int(window.col_off)
+        row_end, col_end = row_off + int(window.height), col_off + int(window.width)
+        _, rows, cols = self.chunks
+
+        for i in range(row_off // rows, (row_end - 1) // rows + 1):
+            for j in range(col_off // cols, (col_end - 1) // cols + 1):
+                # extent of the chunk within the array
+                r0, c0 = i * rows, j * cols
+                r1, c1 = min(r0 + rows, self.height), min(c0 + cols, self.width)
+
+                # part of the chunk that is covered by the window
+                wr0, wc0 = max(r0, row_off), max(c0, col_off)
+                wr1, wc1 = min(r1, row_end), min(c1, col_end)
+
+                data = arr[
+                    :, wr0 - row_off : wr1 - row_off, wc0 - col_off : wc1 - col_off
+                ]
+                covered = (
+                    len(bands) == self.count
+                    and (wr0, wc0, wr1, wc1) == (r0, c0, r1, c1)
+                )
+
+                if covered:
+                    fill = np.nan if self.nodata is None else self.nodata
+                    chunk = np.full(self.chunks, fill, dtype=self._dtype)
+                    chunk[bands, : r1 - r0, : c1 - c0] = data
+                    self._write_chunk(i, j, chunk)
+                    continue
+
+                with self._lock:
+                    chunk = self._read_chunk(i, j)
+                    chunk[
+                        np.ix_(
+                            bands,
+                            np.arange(wr0 - r0, wr1 - r0),
+                            np.arange(wc0 - c0, wc1 - c0),
+                        )
+                    ] = data
+                    self._write_chunk(i, j, chunk)
+
+    def close(self):
+        self.closed = True
+
+
+def _decimate(arr, factor, resampling="nearest", nodata=None):
+    """Reduce the resolution of a 3d array by an integer factor, which is used to
+    calculate the overviews of a raster.
+
+    Cells at the right and bottom edges that are only partly covered by the array
+    are calculated from the available pixels.
+
+    Parameters
+    ----------
+    arr : ndarray
+        Array of (band, row, col).
+
+    factor : int
+        Number of pixels along each side of a cell of the result.
+
+    resampling : str, default='nearest'
+        Either 'nearest' to take the pixel at the centre of each cell, or 'average'
+        to take the mean of the pixels of each cell that are not nodata.
+
+    nodata : any number (opt)
+        Nodata value of the array.
+
+    Returns
+    -------
+    ndarray
+    """
+    bands, rows, cols = arr.shape
+    out_rows, out_cols = -(-rows // factor), -(-cols // factor)
+
+    if resampling == "nearest":
+        r = np.minimum(np.arange(out_rows) * factor + factor // 2, rows - 1)
+        c = np.minimum(np.arange(out_cols) * factor + factor // 2, cols - 1)
+        return arr[:, r[:, np.newaxis], c[np.newaxis, :]]
+
+    if resampling != "average":
+        raise ValueError("resampling must be one of 'nearest' or 'average'")
+
+    data = np.full((bands, out_rows * factor, out_cols * factor), np.nan)
+    data[:, :rows, :cols] = arr
+
+    if nodata is not None:
+        data[data == nodata] = np.nan
+
+    data = data.reshape((bands, out_rows, factor, out_cols, factor))
+    valid = np.isfinite(data).sum(axis=(2, 4))
+    result = np.nansum(data, axis=(2, 4)) / np.maximum(valid, 1)
+
+    if np.issubdtype(arr.dtype, np.integer):
+        result = np.rint(result)
+
+    fill = np.nan if nodata is None else nodata
+    result[valid == 0] = fill
+
+    return result.astype(arr.dtype)
+
+
+class COGDataset:
+    """Cloud-optimized GeoTIFF that is written in windows, with the internal
+    overviews calculated in the same pass as the data.
+
+    Windows are collected into tiles of `blocksize` pixels. When a tile is
+    complete it is written to a temporary tiled GeoTIFF, and is decimated into each
+    overview level that is not coarser than a tile. The coarser levels are
+    calculated from the coarsest of these levels when the dataset is closed. The
+    COG is then assembled by GDAL's COG driver from the data and the existing
+    overviews, so that the full resolution data is not read again to build the
+    overviews.
+
+    Windows that are aligned with the tiles, such as those returned by
+    `block_windows`, are processed immediately, otherwise the partly written tiles
+    are kept in memory until they are complete.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the COG.
+
+    mode : str, default='w'
+        Only 'w' is supported.
+
+    count, dtype, width, height, crs, transform, nodata :
+        Properties of the COG.
+
+    blocksize : int, default=512
+        Width and height of the tiles in pixels, which must be a power of 2 of at
+        least 128.
+
+    compress : str, default='deflate'
+        Compression of the tiles.
+
+    overview_resampling : str, default='nearest'
+        Either 'nearest' or 'average' (which ignores nodata pixels) to calculate
+        the overviews.
+
+    overview_count : int (opt)
+        Number of overview levels. Defaults to the number of levels until the
+        smallest overview fits in a single tile.
+
+    kwargs : opt
+        Other creation options of the COG driver, for example `predictor=2` or
+        `level=9`.
+    """
+
+    driver = "GTiff"
+
+    def __init__(
+        self, file_path, mode="w", count=None, dtype=None, width=None, height=None,
+        crs=None, transform=None, nodata=None, blocksize=512, compress="deflate",
+        overview_resampling="nearest", overview_count=None, **kwargs
+    ):
+        from .temporary_files import workspace
+
+        if mode != "w":
+            raise ValueError("COGs can only be opened with mode='w'")
+
+        if blocksize < 128 or blocksize & (blocksize - 1) != 0:
+            raise ValueError("blocksize must be a power of 2 of at least 128")
+
+        if overview_resampling not in ("nearest", "average"):
+            raise ValueError(
+                "overview_resampling must be one of 'nearest' or 'average'"
+            )
+
+        # COGs are always tiled using the blocksize
+        for key in ("tiled", "blockxsize", "blockysize", "interleave"):
+            kwargs.pop(key, None)
+
+        self.name = file_path
+        self.mode = mode
+        self.closed = False
+        self.count = count
+        self.width = width
+        self.height = height
+        self.crs = crs
+        self.transform = transform
+        self.nodata = nodata
+        self.dtypes = tuple([np.dtype(dtype).name] * count)
+        self.blocksize = blocksize
+        self.overview_resampling = overview_resampling
+        self._options = dict(kwargs, compress=compress)
+        self._tiles = {}
+        self._written = set()
+
+        if overview_count is None:
+            overview_count = 0
+
+            while max(width, height) / 2 ** overview_count > blocksize:
+                overview_count += 1
+
+        self.factors = [2 ** (i + 1) for i in range(overview_count)]
+
+        # temporary files are kept in memory if the COG is
+        if file_path.startswith("/vsimem/"):
+            self._scratch = "/vsimem/pyspatialml/" + uuid.uuid4().hex
+        else:
+            self._scratch = tempfile.mkdtemp(dir=workspace.directory)
+
+        meta = dict(
+            driver="GTiff", count=count, dtype=dtype, crs=crs, nodata=nodata,
+        )
+        self._base = rasterio.open(
+            self._path("base"), "w+", width=width, height=height,
+            transform=transform, tiled=True, blockxsize=blocksize,
+            blockysize=blocksize, **meta
+        )
+        self._overviews = []
+
+        for factor in self.factors:
+            if factor > blocksize:
+                break
+
+            self._overviews.append(
+                rasterio.open(
+                    self._path(factor), "w", width=-(-width // factor),
+                    height=-(-height // factor),
+                    transform=transform * Affine.scale(factor), **meta
+                )
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+        if exc_type is not None:
+            self._cleanup()
+        else:
+            self.close()
+
+    def __repr__(self):
+        return "<COGDataset name='{0}' count={1}>".format(self.name, self.count)
+
+    def _path(self, level):
+        return self._scratch + "/{0}.tif".format(level)
+
+    @property
+    def shape(self):
+        return self.height, self.width
+
+    @property
+    def indexes(self):
+        return tuple(range(1, self.count + 1))
+
+    def block_windows(self, bidx=0):
+        """Generator of ((row, col), window) tuples of the tiles of the COG.
+        """
+        size = self.blocksize
+
+        for i, row_off in enumerate(range(0, self.height, size)):
+            for j, col_off in enumerate(range(0, self.width, size)):
+                window = Window(
+                    col_off,
+                    row_off,
+                    min(size, self.width - col_off),
+                    min(size, self.height - row_off),
+                )
+                yield (i, j), window
+
+    def _tile_window(self, i, j):
+        size = self.blocksize
+        row_off, col_off = i * size, j * size
+
+        return Window(
+            col_off,
+            row_off,
+            min(size, self.width - col_off),
+            min(size, self.height - row_off),
+        )
+
+    def _tile(self, i, j):
+        """Data and written pixels of a tile that is being collected.
+        """
+        if (i, j) not in self._tiles:
+            window = self._tile_window(i, j)
+            shape = (self.count, int(window.height), int(window.width))
+
+            if (i, j) in self._written:
+                # tiles that are written to again are read back from the data
+                data = self._base.read(window=window)
+                written = np.ones(shape, dtype=bool)
+            else:
+                fill = 0 if self.nodata is None else self.nodata
+                data = np.full(shape, fill, dtype=self.dtypes[0])
+                written = np.zeros(shape, dtype=bool)
+
+            self._tiles[(i, j)] = (data, written)
+
+        return self._tiles[(i, j)]
+
+    def _flush(self, i, j):
+        """Write a tile and its decimated versions to the temporary files.
+        """
+        data, _ = self._tiles.pop((i, j))
+        window = self._tile_window(i, j)
+        self._base.write(data, window=window)
+
+        for factor, dst in zip(self.factors, self._overviews):
+            overview = _decimate(data, factor, self.overview_resampling, self.nodata)
+            dst.write(
+                overview,
+                window=Window(
+                    window.col_off // factor,
+                    window.row_off // factor,
+                    overview.shape[2],
+                    overview.shape[1],
+                ),
+            )
+
+        self._written.add((i, j))
+
+    def write(self, arr, indexes=None, window=None):
+        """Write data to the COG following the rasterio.DatasetWriter.write
+        method.
+        """
+        if self.closed:
+            raise ValueError("dataset is closed")
+
+        if indexes is None:
+            bands = list(range(self.count))
+        elif isinstance(indexes, int):
+            bands = [indexes - 1]
+        else:
+            bands = [i - 1 for i in indexes]
+
+        arr = np.asarray(arr)
+
+        if arr.ndim == 2:
+            arr = arr[np.newaxis, :, :]
+
+        if window is None:
+            window = Window(0, 0, self.width, self.height)
+
+        row_off, col_off = int(window.row_off), int(window.col_off)
+        row_end, col_end = row_off + int(window.height), col_off + int(window.width)
+        size = self.blocksize
+
+        for i in range(row_off // size, (row_end - 1) // size + 1):
+            for j in range(col_off // size, (col_end - 1) // size + 1):
+                r0, c0 = i * size, j * size
+
+                # part of the tile that is covered by the window
+                wr0, wc0 = max(r0, row_off), max(c0, col_off)
+                wr1, wc1 = min(r0 + size, row_end), min(c0 + size, col_end)
+
+                data, written = self._tile(i, j)
+                index = np.ix_(
+                    bands, np.arange(wr0 - r0, wr1 - r0), np.arange(wc0 - c0, wc1 - c0)
+                )
+                data[index] = arr[
+                    :, wr0 - row_off : wr1 - row_off, wc0 - col_off : wc1 - col_off
+                ]
+                written[index] = True
+
+                if written.all():
+                    self._flush(i, j)
+
+    def _vrt_xml(self):
+        """XML of a VRT of the data that refers to the temporary overviews.
+        """
+        bands = []
+
+        for bidx in self.indexes:
+            band = '<VRTRasterBand dataType="{0}" band="{1}">'.format(
+                _gdal_typename(self.dtypes[0]), bidx
+            )
+
+            if self.nodata is not None:
+                band += "<NoDataValue>{0!r}</NoDataValue>".format(float(self.nodata))
+
+            band += (
+                '<SimpleSource><SourceFilename relativeToVRT="0">{0}</SourceFilename>'
+                "<SourceBand>{1}</SourceBand></SimpleSource>"
+            ).format(escape(self._path("base")), bidx)
+
+            for factor in self.factors:
+                band += (
+                    '<Overview><SourceFilename relativeToVRT="0">{0}</SourceFilename>'
+                    "<SourceBand>{1}</SourceBand></Overview>"
+                ).format(escape(self._path(factor)), bidx)
+
+            bands.append(band + "</VRTRasterBand>")
+
+        header = '<VRTDataset rasterXSize="{0}" rasterYSize="{1}">'.format(
+            self.width, self.height
+        )
+
+        if self.crs is not None:
+            header += "<SRS>{0}</SRS>".format(escape(self.crs.to_wkt()))
+
+        header += "<GeoTransform>{0}</GeoTransform>".format(
+            ", ".join(repr(i) for i in self.transform.to_gdal())
+        )
+
+        return header + "".join(bands) + "</VRTDataset>"
+
+    def _finish_overviews(self):
+        """Calculate the overview levels that are coarser than a tile from the
+        previous level.
+        """
+        for level in range(len(self._overviews), len(self.factors)):
+            previous = (
+                self._path("base") if level == 0 else self._path(self.factors[level - 1])
+            )
+
+            with rasterio.open(previous) as src:
+                overview = _decimate(
+                    src.read(), 2, self.overview_resampling, self.nodata
+                )
+                meta = src.meta
+                meta.update(
+                    width=overview.shape[2],
+                    height=overview.shape[1],
+                    transform=src.transform * Affine.scale(2),
+                )
+
+            with rasterio.open(self._path(self.factors[level]), "w", **meta) as dst:
+                dst.write(overview)
+
+    def close(self):
+        """Write the remaining tiles and assemble the COG.
+
+        Pixels that were not written are set to the nodata value, or to zero if the
+        COG does not have a nodata value.
+        """
+        if self.closed:
+            return
+
+        try:
+            for i, j in list(self._tiles):
+                self._flush(i, j)
+
+            self._base.close()
+
+            for dst in self._overviews:
+                dst.close()
+
+            self._finish_overviews()
+
+            with rasterio.open(self._vrt_xml()) as src:
+                rasterio.shutil.copy(
+                    src,
+                    self.name,
+                    driver="COG",
+                    blocksize=self.blocksize,
+                    overviews="FORCE_USE_EXISTING",
+                    **self._options
+                )
+        finally:
+            self._cleanup()
+
+    def _cleanup(self):
+        """Close and remove the temporary files.
+        """
+        self._base.close()
+
+        for dst in self._overviews:
+            dst.close()
+
+        if self._scratch.startswith("/vsimem/"):
+            for level in ["base"] + self.factors:
+                if rasterio.shutil.exists(self._path(level)):
+                    rasterio.shutil.delete(self._path(level))
+        else:
+            shutil.rmtree(self._scratch, ignore_errors=True)
+
+        self._tiles = {}
+        self.closed = True
+
+
+class SourceDataset(VirtualDataset):
+    """Base class for virtual datasets that are derived from the data of a source
+    dataset.
+
+    Source datasets that are opened with rasterio are reopened from their file path
+    when the dataset is pickled, so that derived datasets can be used by
+    process-based parallel backends.
+
+    Parameters
+    ----------
+    source : rasterio.io.DatasetReader or VirtualDataset
+        Dataset that the data is derived from.
+
+    count, dtype, width, height, crs, transform, nodata, name :
+        See VirtualDataset.
+    """
+
+    def __init__(
+        self, source, count, dtype, width, height, crs=None, transform=None,
+        nodata=None, name=None
+    ):
+        super().__init__(count, dtype, width, height, crs, transform, nodata, name)
+        self.source = source
+
+    def __getstate__(self):
+        # rasterio datasets are reopened instead of being pickled
+        state = self.__dict__.copy()
+
+        if not _is_virtual(self.source):
+            state["source"] = self.source.name
+
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+        if isinstance(self.source, str):
+            self.source = rasterio.open(self.source)
+
+    def _read_indices(self, indexes, rows, cols):
+        # read the window that spans the rows and cols and select the pixels
+        window = Window(
+            cols.min(), rows.min(), cols.max() - cols.min() + 1,
+            rows.max() - rows.min() + 1
+        )
+        arr = self._read(indexes, window)
+        return arr[np.ix_(range(len(indexes)), rows - rows.min(), cols - cols.min())]
+
+
+class WindowDataset(SourceDataset):
+    """Virtual dataset that is a window of a source dataset.
+
+    Reads are translated by the offset of the window and read directly from the
+    source dataset, so that a spatial subset can be used without copying any data.
+    Reads of a window of an ArrayDataset or MemmapDataset are views of the
+    underlying array.
+
+    Parameters
+    ----------
+    source : rasterio.io.DatasetReader or VirtualDataset
+        Dataset to take the window from.
+
+    window : rasterio.windows.Window
+        Window of the source dataset, which must be within the extent of the
+        source.
+    """
+
+    driver = "Window"
+
+    def __init__(self, source, window):
+        # windows of windows are taken directly from the original source
+        if isinstance(source, WindowDataset):
+            window = Window(
+                window.col_off + source.window.col_off,
+                window.row_off + source.window.row_off,
+                window.width,
+                window.height,
+            )
+            source = source.source
+
+        window = Window(
+            int(window.col_off), int(window.row_off), int(window.width),
+            int(window.height)
+        )
+
+        super().__init__(
+            source,
+            source.count,
+            np.result_type(*source.dtypes),
+            window.width,
+            window.height,
+            source.crs,
+            source.window_transform(window),
+            source.nodata,
+            source.name,
+        )
+        self.window = window
+
+    def _offset(self, window):
+        return Window(
+            window.col_off + self.window.col_off,
+            window.row_off + self.window.row_off,
+            window.width,
+            window.height,
+        )
+
+    def _read_indices(self, indexes, rows, cols):
+        if _is_virtual(self.source):
+            return self.source._read_indices(
+                indexes, rows + self.window.row_off, cols + self.window.col_off
+            )
+
+        return super()._read_indices(indexes, rows, cols)
+
+    def _read(self, indexes, window):
+        if _is_virtual(self.source):
+            return self.source._read(indexes, self._offset(window))
+
+        return self.source.read(indexes, window=self._offset(window))
+
+
+class WarpedDataset(SourceDataset):
+    """Virtual dataset that reprojects or resamples a source dataset onto a target
+    grid on the fly.
+
+    Similar to GDAL's WarpedVRT, each window that is read is warped from the
+    window of the source dataset that covers it, so that no intermediate copy of
+    the source is created. Pixels of the target grid that are outside of the
+    source are nodata.
+
+    Parameters
+    ----------
+    source : rasterio.io.DatasetReader or VirtualDataset
+        Dataset to warp.
+
+    crs : rasterio.crs.CRS
+        Crs of the target grid.
+
+    transform : affine.Affine
+        Transform of the target grid.
+
+    width, height : int
+        Dimensions of the target grid.
+
+    resampling : str, default='nearest'
+        Resampling method used to warp the source.
+
+    nodata : any number (opt)
+        Nodata value of the warped dataset. Defaults to the nodata value of the
+        source, or the minimum value of the data type if the source does not have a
+        nodata value.
+    """
+
+    driver = "Warped"
+
+    def __init__(
+        self, source, crs, transform, width, height, resampling="nearest",
+        nodata=None
+    ):
+        dtype = np.result_type(*source.dtypes)
+
+        if nodata is None:
+            nodata = source.nodata
+
+        if nodata is None:
+            nodata = _get_nodata(dtype)
+
+        super().__init__(
+            source, source.count, dtype, width, height, crs, transform, nodata,
+            source.name
+        )
+        self.resampling = resampling
+
+    def _read(self, indexes, window):
+        dtype = self.dtypes[0]
+        out = np.full((len(indexes), window.height, window.width), self.nodata, dtype)
+        src_window = _source_window(self.source, window, self.transform, self.crs)
+
+        if src_window is None:
+            return out
+
+        arr = self.source.read(indexes, window=src_window, masked=True)
+        arr = np.ma.filled(arr, self.nodata).astype(dtype, copy=False)
+
+        for band, dst_band in zip(arr, out):
+            reproject(
+                source=band,
+                destination=dst_band,
+                src_transform=self.source.window_transform(src_window),
+                src_crs=self.source.crs,
+                src_nodata=self.nodata,
+                dst_transform=self.window_transform(window),
+                dst_crs=self.crs,
+                dst_nodata=self.nodata,
+                resampling=Resampling[self.resampling],
+            )
+
+        return out
+
+
+def _open_dataset(file_path, mode="r", driver=None, **kwargs):
+    """Open a dataset using rasterio, or using the MemmapDataset backend for .npy
+    files.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the dataset.
+
+    mode : str, default='r'
+        Mode to open the dataset.
+
+    driver : str (opt)
+        Format driver. 'NPY' is used to create a MemmapDataset, 'Zarr' is used to
+        write to a ZarrDataset and 'COG' is used to write to a COGDataset,
+        otherwise the driver is passed to rasterio.open.
+
+    kwargs : opt
+        Named arguments to pass to rasterio.open, MemmapDataset, ZarrDataset or
+        COGDataset. `cog=True` writes a COGDataset with any driver.
+
+    Returns
+    -------
+    rasterio.io.DatasetReader, rasterio.io.DatasetWriter, MemmapDataset,
+    ZarrDataset or COGDataset
+    """
+    cog = kwargs.pop("cog", False)
+
+    if driver == "NPY" or (driver is None and str(file_path).endswith(".npy")):
+        return MemmapDataset(file_path, mode=mode, **kwargs)
+
+    # Zarr stores are written without GDAL so that workers can write in parallel
+    if driver == "Zarr" and mode in ("w", "r+"):
+        return ZarrDataset(file_path, mode=mode, **kwargs)
+
+    # GDAL can only create COGs by copying a dataset that has overviews
+    if (cog or driver == "COG") and mode == "w":
+        return COGDataset(file_path, mode=mode, **kwargs)
+
+    if driver is not None:
+        kwargs["driver"] = driver
+
+    return rasterio.open(file_path, mode, **kwargs)
+
+
+class LazyDataset:
+    """Header of a raster dataset that is opened when its data is first accessed.
+
+    Only the metadata of the dataset is read when the LazyDataset is created and
+    the file is closed again, so that a Raster can be created from a large number
+    of files without holding open file handles. RasterLayers replace the
+    LazyDataset with the opened dataset when their `ds` property is first
+    accessed, and layers that share the same file share the opened dataset.
+
+    Parameters
+    ----------
+    file_path : str
+        Path to the dataset.
+
+    mode : str, default='r'
+        Mode used to open the dataset.
+
+    header : dataset (opt)
+        Opened dataset or LazyDataset of the same file whose metadata is used,
+        in which case the file is not opened to read its header.
+    """
+
+    def __init__(self, file_path, mode="r", header=None):
+        if header is None:
+            with _open_dataset(file_path) as src:
+                self._read_header(src)
+        else:
+            self._read_header(header)
+
+        self.file_path = file_path
+        self.mode = mode
+        self.variable = None
+        self.closed = False
+        self._dataset = None
+        self._lock = threading.Lock()
+
+    def _read_header(self, src):
+        self.name = src.name
+        self.subdatasets = list(getattr(src, "subdatasets", []))
+
+        # the dataset itself is listed first, because the first file of a store
+        # such as Zarr is one of its metadata files
+        files = list(src.files) if src.files else []
+        self.files = [src.name] + [f for f in files if f != src.name]
+        self.count = src.count
+        self.indexes = src.indexes
+        self.dtypes = src.dtypes
+        self.nodata = src.nodata
+        self.nodatavals = src.nodatavals
+        self.crs = src.crs
+        self.transform = src.transform
+        self.width = src.width
+        self.height = src.height
+        self.shape = src.shape
+        self.bounds = src.bounds
+        self.res = src.res
+        self.meta = src.meta
+
+    def __repr__(self):
+        return "<LazyDataset name='{0}' opened={1}>".format(
+            self.name, self._dataset is not None
+        )
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_dataset"] = None
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def open(self):
+        """Open the dataset, or return the dataset if it is already open.
+        """
+        with self._lock:
+            if self._dataset is None:
+                self._dataset = _open_dataset(self.file_path, mode=self.mode)
+
+            return self._dataset
+
+    def close(self):
+        with self._lock:
+            if self._dataset is not None:
+                self._dataset.close()
+
+            self.closed = True
+
+
+def _open_datasets(file_paths, mode="r"):
+    """Read the headers of a list of datasets as LazyDatasets. The headers are
+    read by multiple threads because opening files is dominated by I/O.
+    """
+    if len(file_paths) == 1:
+        datasets = [LazyDataset(file_paths[0], mode)]
+    else:
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(16, len(file_paths))
+        ) as executor:
+            datasets = list(executor.map(lambda f: LazyDataset(f, mode), file_paths))
+
+    # containers of variables without bands of their own, such as NetCDF files and
+    # Zarr groups, are opened as a dataset for each variable. One-dimensional
+    # variables such as coordinate arrays are skipped
+    expanded = []
+
+    for dataset in datasets:
+        if dataset.count == 0 and dataset.subdatasets:
+            variables = _open_datasets(dataset.subdatasets, mode)
+
+            for variable, name in zip(variables, dataset.subdatasets):
+                if variable.width > 1 and variable.height > 1:
+                    variable.variable = name.rsplit(":", 1)[-1].strip("/")
+                    expanded.append(variable)
+        else:
+            expanded.append(dataset)
+
+    return expanded
+
+
+def _vrt_xml(layers, dtype=None, nodata=None):
+    """XML of a GDAL VRT that stacks the bands of a list of RasterLayers.
+
+    Each RasterLayer becomes a band of the VRT that refers to the band of the
+    layer's file, so that the VRT can be read as a single multi-band dataset
+    without copying any data.
+
+    Parameters
+    ----------
+    layers : list
+        List of aligned pyspatialml.RasterLayer objects that are stored in files
+        that GDAL can open.
+
+    dtype : str (optional)
+        Data type of the bands. Defaults to the data type of each layer.
+
+    nodata : any number (optional)
+        Nodata value of the bands. Pixels that are equal to the nodata value of a
+        layer are converted to this value. Defaults to the nodata value of each
+        layer.
+
+    Returns
+    -------
+    str
+    """
+    first = layers[0]
+    bands = []
+
+    for i, layer in enumerate(layers):
+        if _is_virtual(layer.ds):
+            raise ValueError(
+                "RasterLayer '{0}' is not stored in a file and cannot be referenced "
+                "by a VRT".format(layer.names[0])
+            )
+
+        band_dtype = dtype if dtype is not None else layer.dtype
+        band_nodata = nodata if nodata is not None else layer.nodata
+        source = (
+            '<SourceFilename relativeToVRT="0">{0}</SourceFilename>'
+            "<SourceBand>{1}</SourceBand>"
+        ).format(escape(layer.file), layer.bidx)
+
+        # complex sources skip the pixels of the source that are nodata, leaving
+        # the nodata value of the band
+        if layer.nodata is not None and band_nodata != layer.nodata:
+            source = "<ComplexSource>{0}<NODATA>{1!r}</NODATA></ComplexSource>".format(
+                source, float(layer.nodata)
+            )
+        else:
+            source = "<SimpleSource>{0}</SimpleSource>".format(source)
+
+        band = '<VRTRasterBand dataType="{0}" band="{1}">'.format(
+            _gdal_typename(np.dtype(band_dtype).name), i + 1
+        )
+        band += "<Description>{0}</Description>".format(escape(layer.names[0]))
+
+        if band_nodata is not None:
+            band += "<NoDataValue>{0!r}</NoDataValue>".format(float(band_nodata))
+
+        bands.append(band + source + "</VRTRasterBand>")
+
+    header = '<VRTDataset rasterXSize="{0}" rasterYSize="{1}">'.format(
+        first.width, first.height
+    )
+
+    if first.crs is not None:
+        header += "<SRS>{0}</SRS>".format(escape(first.crs.to_wkt()))
+
+    header += "<GeoTransform>{0}</GeoTransform>".format(
+        ", ".join(repr(i) for i in first.transform.to_gdal())
+    )
+
+    return header + "".join(bands) + "</VRTDataset>"
+
+
+def _dataset_file(dataset):
+    """File of a dataset that is used to name RasterLayers. This is the name of the
+    dataset if it is one of its files, because the first file of stores such as
+    Zarr is a metadata file.
+    """
+    files = list(dataset.files)
+
+    if dataset.name in files or not files:
+        return dataset.name
+
+    return files[0]
+
+
+def _output_driver(dataset):
+    """Driver used to write the results of calculations on a dataset.
+    """
+    if _is_virtual(dataset) and not isinstance(dataset, MemmapDataset):
+        return "GTiff"
+
+    # VRTs refer to other files and cannot store the results, and containers of
+    # variables are not written to by calculations
+    if dataset.driver in ("VRT", "netCDF", "HDF5", "Zarr"):
+        return "GTiff"
+
+    return dataset.driver
+
+
+def _is_virtual(dataset):
+    """Whether a dataset is a VirtualDataset rather than a rasterio dataset.
+    """
+    return isinstance(dataset, VirtualDataset)
+
+
+def _virtual_layers(dataset, names=None):
+    """Create a list of RasterLayers from each band of a virtual dataset.
+    """
+    from .rasterlayer import RasterLayer
+
+    layers = []
+
+    for i in dataset.indexes:
+        layer = RasterLayer(rasterio.band(dataset, i))
+
+        if names is not None:
+            layer.names = [names[i - 1]]
+
+        layers.append(layer)
+
+    return layers
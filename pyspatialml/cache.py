@@ -0,0 +1,278 @@
+import functools
+import hashlib
+import inspect
+import json
+import os
+import uuid
+
+import numpy as np
+import rasterio
+
+from .backends import MemmapDataset, _is_virtual
+
+# Options for caching the results of operations on disk:
+#   directory : directory used to store cached results. Caching is disabled if
+#       the directory is None (default).
+#   max_size : maximum size in bytes of the cached results. The least recently
+#       used results are removed when the size is exceeded.
+options = {"directory": None, "max_size": 2 ** 32}
+
+# parameters that do not change the result of an operation
+_ignored = ("file_path", "progress", "n_jobs", "warp_mem_lim", "backend")
+
+# prefix of the partial files that results are written to before they are moved
+# into the cache, which does not clash with the hexadecimal keys of the entries
+_part_prefix = "part-"
+
+
+def _sources(obj):
+    """List of (file, band index, modification time, size) tuples that identify the
+    files used by a Raster, RasterLayer or rasterio dataset. Returns None if any of
+    the data is not stored in a file, in which case the result cannot be cached.
+    """
+    if hasattr(obj, "iloc"):
+        layers = list(obj.iloc)
+    elif hasattr(obj, "bidx"):
+        layers = [obj]
+    elif isinstance(obj, rasterio.io.DatasetReader):
+        return _file_sources([(obj.name, None)])
+    else:
+        return None
+
+    # virtual datasets compute their data, except for memory-mapped files
+    for layer in layers:
+        if _is_virtual(layer.ds) and not isinstance(layer.ds, MemmapDataset):
+            return None
+
+    files = [(layer.file, layer.bidx) for layer in layers]
+
+    # VRTs also depend on the files that they refer to
+    for layer in layers:
+        if layer.driver == "VRT":
+            files.extend((file, None) for file in layer.ds.files[1:])
+
+    return _file_sources(files)
+
+
+def _file_sources(layers):
+    sources = []
+
+    for file, bidx in layers:
+        if not os.path.isfile(file):
+            return None
+
+        stat = os.stat(file)
+        sources.append((os.path.abspath(file), bidx, stat.st_mtime_ns, stat.st_size))
+
+    return sources
+
+
+class _Uncacheable(Exception):
+    """Raised for parameter values that do not have a deterministic token.
+    """
+
+
+def _token(obj):
+    """Deterministic string representation of a parameter value.
+
+    Raises
+    ------
+    _Uncacheable
+        If the value is of a type that cannot be represented exactly.
+    """
+    if obj is None or isinstance(obj, (bool, int, float, str, np.generic)):
+        return repr(obj)
+
+    if isinstance(obj, dict):
+        return "{" + ",".join(k + ":" + _token(obj[k]) for k in sorted(obj)) + "}"
+
+    if isinstance(obj, (list, tuple)):
+        return "[" + ",".join(_token(i) for i in obj) + "]"
+
+    if isinstance(obj, np.ndarray):
+        data = hashlib.sha256(np.ascontiguousarray(obj).tobytes()).hexdigest()
+        return "array({0},{1},{2})".format(obj.dtype.str, obj.shape, data)
+
+    if isinstance(obj, np.dtype):
+        return obj.str
+
+    if hasattr(obj, "geometry") and hasattr(obj, "crs"):
+        # geopandas GeoDataFrame or GeoSeries
+        wkb = b"".join(geom.wkb for geom in obj.geometry)
+        return hashlib.sha256(wkb).hexdigest() + _token(obj.crs)
+
+    if hasattr(obj, "wkb"):
+        # shapely geometries
+        return hashlib.sha256(obj.wkb).hexdigest()
+
+    if hasattr(obj, "to_wkt"):
+        return obj.to_wkt()
+
+    if isinstance(obj, type):
+        return obj.__name__
+
+    raise _Uncacheable(type(obj).__name__)
+
+
+def _key(operation, sources, params):
+    """Hash of the input files, the name of the operation and its parameters.
+    """
+    content = _token([operation, sources, params])
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def _entries(directory):
+    """Dict of cache keys and lists of the files that belong to each key. Partial
+    files that are still being written are not entries of the cache.
+    """
+    entries = {}
+
+    for name in os.listdir(directory):
+        if name.startswith(_part_prefix):
+            continue
+
+        key = name.split(".")[0]
+        entries.setdefault(key, []).append(os.path.join(directory, name))
+
+    return entries
+
+
+def _evict(directory, max_size, keep=None):
+    """Remove the least recently used results until the cache is below max_size.
+    The result with the `keep` key is never removed.
+    """
+    entries = _entries(directory)
+    sizes = {
+        key: sum(os.path.getsize(f) for f in files) for key, files in entries.items()
+    }
+    used = {
+        key: max(os.path.getmtime(f) for f in files) for key, files in entries.items()
+    }
+    total = sum(sizes.values())
+
+    for key in sorted(entries, key=used.get):
+        if total <= max_size:
+            break
+
+        if key == keep:
+            continue
+
+        for file in entries[key]:
+            try:
+                os.unlink(file)
+            except OSError:
+                pass
+
+        total -= sizes[key]
+
+
+def _load(file_path, names):
+    from .raster import Raster
+
+    raster = Raster(file_path)
+    raster.rename({old: new for old, new in zip(raster.names, names)})
+
+    return raster
+
+
+def cached(operation):
+    """Decorator that caches the Raster returned by an operation on disk.
+
+    The result is stored in `options["directory"]` under a hash of the identities
+    of the input files (path, modification time and size), the name of the
+    operation and its parameters. On a cache hit a Raster is returned that points
+    at the cached file. Results are only cached when caching is enabled and the
+    operation would write its result to a temporary file.
+
+    Parameters
+    ----------
+    operation : str
+        Name of the operation.
+    """
+
+    def decorator(function):
+        signature = inspect.signature(function)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            directory = options["directory"]
+
+            if directory is None:
+                return function(*args, **kwargs)
+
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            src = arguments.pop(next(iter(signature.parameters)))
+
+            if arguments.get("file_path") is not None:
+                return function(*args, **kwargs)
+
+            # lazy layers and views do not write a result, and directory stores are
+            # not cached
+            if arguments.get("lazy") or arguments.get("view"):
+                return function(*args, **kwargs)
+
+            if arguments.get("driver") == "Zarr":
+                return function(*args, **kwargs)
+
+            sources = _sources(src)
+
+            if sources is None:
+                return function(*args, **kwargs)
+
+            params = {k: v for k, v in arguments.items() if k not in _ignored}
+
+            # results with parameters that cannot be hashed exactly are not cached
+            try:
+                key = _key(operation, sources, params)
+            except _Uncacheable:
+                return function(*args, **kwargs)
+
+            ext = ".npy" if params.get("driver") == "NPY" else ".tif"
+            file_path = os.path.join(directory, key + ext)
+            index_path = os.path.join(directory, key + ".names")
+
+            # cache hit
+            if os.path.exists(file_path) and os.path.exists(index_path):
+                with open(index_path) as f:
+                    names = json.load(f)
+
+                os.utime(file_path)
+                return _load(file_path, names)
+
+            # write the result to a partial file that is moved into the cache
+            os.makedirs(directory, exist_ok=True)
+            part_path = os.path.join(directory, _part_prefix + uuid.uuid4().hex + ext)
+            bound.arguments["file_path"] = part_path
+            result = function(*bound.args, **bound.kwargs)
+            names = result.names
+            result.close()
+
+            for suffix in ["", ".json", ".aux.xml"]:
+                if os.path.exists(part_path + suffix):
+                    os.replace(part_path + suffix, file_path + suffix)
+
+            with open(index_path, "w") as f:
+                json.dump(names, f)
+
+            _evict(directory, options["max_size"], keep=key)
+
+            return _load(file_path, names)
+
+        return wrapper
+
+    return decorator
+
+
+def clear():
+    """Remove all of the cached results.
+    """
+    directory = options["directory"]
+
+    if directory is None or not os.path.isdir(directory):
+        return
+
+    for files in _entries(directory).values():
+        for file in files:
+            os.unlink(file)
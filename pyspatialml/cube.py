@@ -0,0 +1,481 @@
+import warnings
+from functools import partial
+
+import numpy as np
+
+from .raster import Raster
+
+# statistics that are calculated along the time axis of a RasterCube
+_statistics = ("mean", "median", "min", "max", "std", "count", "percentile", "trend")
+
+
+def _time_values(times):
+    """Numeric values of a time coordinate that are used to fit trends.
+
+    Dates are converted into decimal years so that trends are expressed as a
+    change per year, other values are used unchanged.
+    """
+    times = np.asarray(times)
+
+    if np.issubdtype(times.dtype, np.datetime64):
+        days = (times - times.min()).astype("timedelta64[s]").astype("float64")
+        return days / (86400 * 365.25)
+
+    return times.astype("float64")
+
+
+def _to_cube(arr, n_times):
+    """Reshape a 3d window of a flattened stack (time * band, row, col) into a 4d
+    array of (time, band, row, col).
+    """
+    return arr.reshape((n_times, arr.shape[0] // n_times) + arr.shape[1:])
+
+
+def _apply_cube(arr, function, n_times):
+    """Apply a function to a window of a RasterCube.
+    """
+    return function(_to_cube(arr, n_times))
+
+
+def _percentile(data, n, q):
+    """Percentile along the first axis of an array where invalid values are nan,
+    using linear interpolation between the valid values.
+
+    This is a vectorised per-pixel percentile: the values of each pixel are sorted
+    with the nans last, and the interpolation positions are taken from the number
+    of valid values of that pixel, `n`. The result matches
+    numpy.nanpercentile(data, q, axis=0) without looping over the pixels.
+    """
+    data = np.sort(data, axis=0)
+    position = (np.maximum(n, 1) - 1) * (q / 100)
+    lower = np.floor(position).astype(int)
+    upper = np.ceil(position).astype(int)
+    fraction = position - lower
+
+    below = np.take_along_axis(data, lower[np.newaxis], axis=0)[0]
+    above = np.take_along_axis(data, upper[np.newaxis], axis=0)[0]
+    result = below + (above - below) * fraction
+
+    return np.where(n > 0, result, np.nan)
+
+
+def _reduce(arr, statistic, q=None, times=None):
+    """Calculate a nodata-aware statistic along the time axis of a 4d masked
+    array.
+
+    The 'median' and 'percentile' statistics sort all of the observations of each
+    pixel. The other statistics are accumulated one time step at a time, so that
+    only a single time step is converted to a floating point type at once.
+
+    Parameters
+    ----------
+    arr : numpy.ma.MaskedArray
+        Array of (time, band, row, col).
+
+    statistic : str
+        Name of the statistic.
+
+    q : float (optional)
+        Percentile to calculate, which is required for the 'percentile' statistic.
+
+    times : ndarray (optional)
+        Numeric time coordinate, which is required for the 'trend' statistic.
+
+    Returns
+    -------
+    numpy.ma.MaskedArray
+        Array of (band, row, col) that is masked where there are no valid
+        observations.
+    """
+    if statistic not in _statistics:
+        raise ValueError(
+            "statistic must be one of {0} or a callable".format(_statistics)
+        )
+
+    arr = np.ma.asarray(arr)
+
+    # float32 is used for integer data of up to 16 bits and for float32 data
+    dtype = np.result_type(arr.dtype, np.float32)
+
+    if statistic in ("median", "percentile"):
+        return _reduce_sorted(arr, statistic, q, dtype)
+
+    # accumulators hold a single value per pixel, so they use float64 to avoid
+    # losing precision over long time series
+    shape = arr.shape[1:]
+    n = np.zeros(shape, dtype="int32")
+    result = np.zeros(
+        shape, dtype=arr.dtype if statistic in ("min", "max") else "float64"
+    )
+    m2 = np.zeros(shape, dtype="float64")
+
+    if statistic == "trend":
+        t = np.asarray(times, dtype="float64")
+        t = t - t.mean()
+        sum_t = np.zeros(shape, dtype="float64")
+        sum_tt = np.zeros(shape, dtype="float64")
+        sum_ty = np.zeros(shape, dtype="float64")
+
+    for i in range(arr.shape[0]):
+        valid = ~np.ma.getmaskarray(arr[i])
+        n += valid
+
+        if statistic == "count":
+            continue
+
+        values = np.ma.getdata(arr[i])
+
+        if statistic in ("min", "max"):
+            first = valid & (n == 1)
+            update = np.minimum if statistic == "min" else np.maximum
+            result = np.where(
+                first, values, np.where(valid, update(result, values), result)
+            )
+            continue
+
+        values = values.astype(dtype)
+
+        if statistic in ("mean", "std"):
+            # Welford's algorithm for the running mean and sum of squared
+            # deviations
+            delta = np.where(valid, values - result, 0)
+            result += delta / np.maximum(n, 1)
+            m2 += delta * np.where(valid, values - result, 0)
+
+        elif statistic == "trend":
+            y = np.where(valid, values, 0)
+            tv = np.where(valid, t[i], 0)
+            sum_t += tv
+            sum_tt += tv * t[i]
+            result += y
+            sum_ty += tv * y
+
+    if statistic == "count":
+        return np.ma.asarray(n)
+
+    if statistic in ("min", "max"):
+        return np.ma.masked_where(n == 0, result)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if statistic == "std":
+            result = np.sqrt(m2 / n)
+
+        elif statistic == "trend":
+            # least squares slope of each pixel using its valid observations
+            covariance = sum_ty - sum_t * result / n
+            variance = sum_tt - sum_t ** 2 / n
+            result = covariance / np.where(variance > 0, variance, np.nan)
+            result[n < 2] = np.nan
+
+    result[n == 0] = np.nan
+
+    return np.ma.masked_invalid(result)
+
+
+def _reduce_sorted(arr, statistic, q, dtype):
+    """Calculate the 'median' or 'percentile' statistic of a 4d masked array.
+    """
+    valid = ~np.ma.getmaskarray(arr)
+    n = valid.sum(axis=0)
+    data = np.ma.filled(arr.astype(dtype), np.nan)
+
+    with warnings.catch_warnings():
+        # pixels without any valid observations are masked in the result
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+
+        if statistic == "median":
+            result = np.nanmedian(data, axis=0)
+        else:
+            result = _percentile(data, n, q)
+
+    return np.ma.masked_invalid(result)
+
+
+class RasterCube:
+    """Multi-temporal stack of Rasters that share the same grid and layers, where
+    each Raster represents a point along a time coordinate.
+
+    The layers of all of the Rasters are held in a single flattened Raster, so that
+    windows of the cube are read with the same methods as a Raster. Windows are
+    returned as 4d arrays of (time, band, row, col), and statistics along the time
+    axis are calculated in windows, in parallel, and ignore nodata pixels.
+
+    Parameters
+    ----------
+    rasters : list
+        List of pyspatialml.Raster objects, or of file paths or lists of file paths
+        that are used to create each Raster. Each Raster must have the same number
+        of layers and be on the same grid.
+
+    times : list (optional, default None)
+        Time coordinate of each Raster, for example as dates or numpy.datetime64
+        values. The Rasters are sorted along the time coordinate. If not specified
+        then the Rasters are numbered in the order that they are supplied.
+
+    Attributes
+    ----------
+    times : ndarray
+        Time coordinate of the cube.
+
+    names : list
+        Names of the layers, which are taken from the first Raster.
+
+    raster : pyspatialml.Raster
+        Flattened Raster that contains the layers of each Raster in time order.
+
+    count : int
+        Number of layers at each time.
+
+    crs, transform, width, height, shape, bounds, res : properties of the grid
+        shared by the Rasters.
+    """
+
+    def __init__(self, rasters, times=None):
+        rasters = [r if isinstance(r, Raster) else Raster(r) for r in rasters]
+
+        if len(rasters) == 0:
+            raise ValueError("A RasterCube requires at least one Raster")
+
+        if times is None:
+            times = np.arange(len(rasters))
+        else:
+            times = np.asarray(times)
+
+            # dates and date strings
+            if times.dtype.kind in ("O", "U", "S"):
+                times = times.astype("datetime64[ns]")
+
+        if len(times) != len(rasters):
+            raise ValueError("The number of times must match the number of Rasters")
+
+        counts = set(r.count for r in rasters)
+
+        if len(counts) > 1:
+            raise ValueError("The Rasters must all have the same number of layers")
+
+        order = np.argsort(times, kind="stable")
+        self.times = times[order]
+        self.names = list(rasters[0].names)
+        self.count = rasters[0].count
+
+        layers = [layer._copy() for i in order for layer in rasters[i].iloc]
+        self.raster = Raster(layers)
+
+        if self.raster._check_alignment(list(self.raster.iloc)) is False:
+            raise ValueError(
+                "Raster datasets do not all have the same dimensions or transform"
+            )
+
+        for attr in ("crs", "transform", "width", "height", "shape", "bounds", "res"):
+            setattr(self, attr, getattr(self.raster, attr))
+
+    def __len__(self):
+        return len(self.times)
+
+    def __getitem__(self, key):
+        """Select the Raster at a time index, or a RasterCube of a slice of the
+        times.
+        """
+        layers = list(self.raster.iloc)
+        n = self.count
+
+        if isinstance(key, slice):
+            indexes = range(*key.indices(len(self)))
+            rasters = [
+                Raster([layer._copy() for layer in layers[i * n : (i + 1) * n]])
+                for i in indexes
+            ]
+            cube = RasterCube(rasters, self.times[key])
+            cube.names = list(self.names)
+            return cube
+
+        if key < 0:
+            key += len(self)
+
+        if not 0 <= key < len(self):
+            raise IndexError("time index out of range")
+
+        raster = Raster([layer._copy() for layer in layers[key * n : (key + 1) * n]])
+        raster.rename(dict(zip(raster.names, self.names)))
+
+        return raster
+
+    def __repr__(self):
+        return "<RasterCube times={0} layers={1} shape={2}>".format(
+            len(self), self.count, self.shape
+        )
+
+    @property
+    def block_shape(self):
+        """Shape of the windows of a single time step. The windows of the
+        calculations are reduced in size by the number of times, so that they hold
+        about as many values of the cube as a window of this shape holds of a
+        single time step.
+        """
+        return self.raster.block_shape
+
+    @block_shape.setter
+    def block_shape(self, value):
+        self.raster.block_shape = value
+
+    def _block_options(self, kwargs):
+        """Add driver options to the arguments of Raster.apply so that the blocks
+        of the result, which are the windows of the calculations, hold about as many
+        values of the cube as a window of `block_shape` holds of a single time
+        step.
+
+        Options are only added for GeoTIFF strips and Zarr chunks, and not if the
+        block size of the result is already specified.
+        """
+        driver = kwargs.get("driver", "GTiff")
+        rows, cols = self.block_shape
+        pixels = max(rows * cols // len(self), 1)
+
+        if kwargs.get("cog") or any(
+            key in kwargs for key in ("tiled", "blockxsize", "blockysize")
+        ):
+            return kwargs
+
+        kwargs = dict(kwargs)
+
+        if driver == "GTiff":
+            kwargs["blockysize"] = max(pixels // self.width, 1)
+
+        elif driver == "Zarr":
+            size = max(int(np.sqrt(pixels)), 1)
+            kwargs["blockysize"] = min(size, rows)
+            kwargs["blockxsize"] = min(size, cols)
+
+        return kwargs
+
+    def read(self, window=None, masked=True, **kwargs):
+        """Read a window of the cube into a 4d array.
+
+        Parameters
+        ----------
+        window : rasterio.windows.Window (optional, default None)
+            Window to read. Defaults to the whole extent.
+
+        masked : bool (default True)
+            Read data into a masked array.
+
+        **kwargs : dict
+            Other arguments to pass to pyspatialml.Raster.read.
+
+        Returns
+        -------
+        ndarray
+            Array of (time, band, row, col).
+        """
+        arr = self.raster.read(masked=masked, window=window, **kwargs)
+        return _to_cube(arr, len(self))
+
+    def apply(self, function, file_path=None, names=None, **kwargs):
+        """Apply a function to windows of the cube.
+
+        Parameters
+        ----------
+        function : callable
+            Function that takes a 4d masked array of (time, band, row, col) and
+            returns a 3d array of (band, row, col) or a 2d array of (row, col), for
+            example the predictions of an estimator. If
+            `backend='multiprocessing'` then the function needs to be picklable.
+
+        file_path : str (optional, default None)
+            Optional path to save the result. If not specified then a tempfile is
+            used.
+
+        names : list (optional, default None)
+            Names of the layers of the result.
+
+        **kwargs : dict
+            Other arguments that are passed to pyspatialml.Raster.apply, such as
+            `n_jobs`, `backend`, `dtype`, `nodata` and `progress`.
+
+        Returns
+        -------
+        pyspatialml.Raster
+        """
+        function = partial(_apply_cube, function=function, n_times=len(self))
+        kwargs = self._block_options(kwargs)
+        result = self.raster.apply(function, file_path=file_path, **kwargs)
+
+        if names is not None:
+            result.rename(dict(zip(result.names, names)))
+
+        return result
+
+    def reduce(self, statistic="median", q=None, file_path=None, dtype=None, **kwargs):
+        """Calculate a statistic of each pixel and layer along the time axis.
+
+        The statistics are calculated in windows and ignore nodata pixels. Pixels
+        without valid observations are nodata in the result.
+
+        Parameters
+        ----------
+        statistic : str or callable (default 'median')
+            Statistic to calculate, one of 'mean', 'median', 'min', 'max', 'std',
+            'count' (number of valid observations), 'percentile' or 'trend' (least
+            squares slope per unit of time, which is per year for dates). A
+            callable is passed a 4d masked array of (time, band, row, col) and
+            must return an array of (band, row, col).
+
+        q : float (optional, default None)
+            Percentile to calculate, in the range 0-100. Required when
+            `statistic='percentile'`.
+
+        file_path : str (optional, default None)
+            Optional path to save the result. If not specified then a tempfile is
+            used.
+
+        dtype : str (optional, default None)
+            Data type of the result. Defaults to the data type of the cube for the
+            'min' and 'max' statistics, 'int32' for 'count' and a floating point
+            type otherwise.
+
+        **kwargs : dict
+            Other arguments that are passed to pyspatialml.Raster.apply, such as
+            `n_jobs`, `backend`, `nodata` and `progress`.
+
+        Returns
+        -------
+        pyspatialml.Raster
+            Raster with a layer for each layer of the cube, named by the layer and
+            the statistic.
+        """
+        if callable(statistic):
+            function = statistic
+            label = getattr(statistic, "__name__", "statistic")
+
+        elif statistic in _statistics:
+            if statistic == "percentile" and q is None:
+                raise ValueError("q must be supplied for the 'percentile' statistic")
+
+            function = partial(
+                _reduce, statistic=statistic, q=q, times=_time_values(self.times)
+            )
+            label = "p{0:g}".format(q) if statistic == "percentile" else statistic
+
+        else:
+            raise ValueError(
+                "statistic must be one of {0} or a callable".format(_statistics)
+            )
+
+        if dtype is None:
+            if statistic in ("min", "max"):
+                dtype = self.raster.meta["dtype"]
+            elif statistic == "count":
+                dtype = "int32"
+            else:
+                dtype = np.result_type(self.raster.meta["dtype"], np.float32)
+
+        names = ["_".join([name, label]) for name in self.names]
+
+        return self.apply(
+            function,
+            file_path=file_path,
+            names=names,
+            dtype=np.dtype(dtype).name,
+            count=self.count,
+            **kwargs
+        )
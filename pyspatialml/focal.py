@@ -0,0 +1,136 @@
+import numpy as np
+from scipy import ndimage
+
+try:
+    from numpy.lib.stride_tricks import sliding_window_view
+except ImportError:
+    sliding_window_view = None
+
+
+def _valid_counts(mask, size):
+    """Number of valid (non-masked) pixels within each neighbourhood.
+    """
+    valid = (~mask).astype(np.float64)
+    return ndimage.correlate(valid, np.ones(size), mode="constant", cval=0)
+
+
+def _focal_sum(arr, size):
+    counts = _valid_counts(np.ma.getmaskarray(arr), size)
+    data = arr.filled(0).astype(np.float64)
+    result = ndimage.correlate(data, np.ones(size), mode="constant", cval=0)
+    return np.ma.MaskedArray(result, mask=counts == 0)
+
+
+def _focal_mean(arr, size):
+    counts = _valid_counts(np.ma.getmaskarray(arr), size)
+    data = arr.filled(0).astype(np.float64)
+    sums = ndimage.correlate(data, np.ones(size), mode="constant", cval=0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = sums / counts
+
+    return np.ma.MaskedArray(result, mask=counts == 0)
+
+
+def _focal_std(arr, size):
+    counts = _valid_counts(np.ma.getmaskarray(arr), size)
+    data = arr.filled(0).astype(np.float64)
+    sums = ndimage.correlate(data, np.ones(size), mode="constant", cval=0)
+    sums_sq = ndimage.correlate(data ** 2, np.ones(size), mode="constant", cval=0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = sums / counts
+        variance = np.maximum(sums_sq / counts - mean ** 2, 0)
+
+    return np.ma.MaskedArray(np.sqrt(variance), mask=counts == 0)
+
+
+def _focal_min(arr, size):
+    data = arr.astype(np.float64).filled(np.inf)
+    result = ndimage.minimum_filter(data, size=size, mode="constant", cval=np.inf)
+    return np.ma.masked_invalid(result)
+
+
+def _focal_max(arr, size):
+    data = arr.astype(np.float64).filled(-np.inf)
+    result = ndimage.maximum_filter(data, size=size, mode="constant", cval=-np.inf)
+    return np.ma.masked_invalid(result)
+
+
+def _focal_median(arr, size):
+    if sliding_window_view is None:
+        raise ImportError("focal median requires numpy >= 1.20")
+
+    pad = ((size[0] // 2, (size[0] - 1) // 2), (size[1] // 2, (size[1] - 1) // 2))
+    data = np.pad(arr.astype(np.float64).filled(np.nan), pad, constant_values=np.nan)
+    windows = sliding_window_view(data, size)
+
+    with np.errstate(all="ignore"):
+        result = np.nanmedian(windows, axis=(2, 3))
+
+    return np.ma.masked_invalid(result)
+
+
+def _convolve(arr, kernel):
+    counts = _valid_counts(np.ma.getmaskarray(arr), kernel.shape)
+    data = arr.filled(0).astype(np.float64)
+    result = ndimage.convolve(data, kernel, mode="constant", cval=0)
+    return np.ma.MaskedArray(result, mask=counts == 0)
+
+
+kernels = {
+    "mean": _focal_mean,
+    "sum": _focal_sum,
+    "min": _focal_min,
+    "max": _focal_max,
+    "std": _focal_std,
+    "median": _focal_median,
+}
+
+
+def _focal(arr, function, size, halo):
+    """Applies a focal function to a window of data that includes a halo of
+    surrounding pixels and returns the result for the interior of the window.
+
+    Parameters
+    ----------
+    arr : numpy.ma.MaskedArray
+        3d masked array (band, rows, cols) of data including the halo.
+
+    function : str, numpy.ndarray or callable
+        Name of a focal statistic, a kernel to convolve each band with, or a
+        function that takes the 3d masked array as its argument.
+
+    size : tuple
+        Size of the neighbourhood (rows, cols) used by the named focal statistics.
+
+    halo : tuple
+        Number of (rows, cols) surrounding the interior of the window.
+
+    Returns
+    -------
+    numpy.ma.MaskedArray
+        3d masked array of the result for the interior of the window. Pixels are
+        masked if they are masked in the input data.
+    """
+    if isinstance(function, str):
+        result = np.ma.stack([kernels[function](band, size) for band in arr])
+    elif isinstance(function, np.ndarray):
+        result = np.ma.stack([_convolve(band, function) for band in arr])
+    else:
+        result = np.ma.asarray(function(arr))
+
+    if result.ndim == 2:
+        result = result[np.newaxis, :, :]
+
+    row_halo, col_halo = halo
+    rows = slice(row_halo, result.shape[1] - row_halo)
+    cols = slice(col_halo, result.shape[2] - col_halo)
+    result = result[:, rows, cols]
+
+    # named statistics and kernels retain the nodata pixels of the input
+    if isinstance(function, (str, np.ndarray)):
+        interior = np.ma.getmaskarray(arr)[:, rows, cols]
+        result = np.ma.MaskedArray(result, mask=np.ma.getmaskarray(result) | interior)
+
+    return result
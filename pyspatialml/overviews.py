@@ -0,0 +1,319 @@
+import math
+import os
+import shutil
+import threading
+import warnings
+import weakref
+from contextlib import contextmanager
+
+import numpy as np
+import rasterio
+import rasterio.shutil
+from rasterio.enums import Resampling
+from rasterio.errors import NotGeoreferencedWarning
+
+from .backends import _is_virtual
+from .temporary_files import workspace
+
+# Options for the overview pyramids that are used by decimated reads:
+#   enabled : build overviews on demand for datasets that do not have overviews.
+#       Disabled by default because the pyramid of a large dataset is about a third
+#       of its size.
+#   min_pixels : datasets with fewer pixels than this are always read at full
+#       resolution.
+#   min_size : overview levels are added until the smallest level is not larger
+#       than this number of pixels along each side.
+#   sidecar : store the overviews in .ovr files next to the datasets, so that they
+#       are reused by later sessions and by other software. If the directory of a
+#       dataset is not writable, or it already has a .ovr file that was not written
+#       by pyspatialml, then the overviews are kept in the workspace.
+#   resampling : resampling method that is used to build the overviews.
+options = {
+    "enabled": False,
+    "min_pixels": 2 ** 22,
+    "min_size": 256,
+    "sidecar": False,
+    "resampling": "nearest",
+}
+
+# tag that marks the .ovr files that were written by this module
+_TAG = "PYSPATIALML_OVERVIEWS"
+
+# guards _pyramids, _locks and _handles and the reader counts of the pyramids
+_lock = threading.Lock()
+
+# dict of file paths and the locks that serialize building their pyramids
+_locks = {}
+
+# dict of file paths and their current _Pyramid
+_pyramids = {}
+
+# datasets that are read and the (_Pyramid, dataset) that each of them reads its
+# overviews from, so that every dataset handle has its own pyramid handle
+_handles = weakref.WeakKeyDictionary()
+
+
+class _Pyramid:
+    """Overviews of a dataset, which are stored in the VRT of a TempFile, or in a
+    .ovr file next to the dataset if `tfile` is None.
+    """
+
+    def __init__(self, identity, path, tfile):
+        self.identity = identity
+        self.path = path
+        self.tfile = tfile
+        self.readers = 0
+        self.retired = False
+
+    def retire(self):
+        """Stop using the pyramid for new reads and remove it once the reads that
+        are in progress are finished.
+        """
+        self.retired = True
+
+        if self.readers == 0:
+            self._close()
+
+    def _close(self):
+        for dataset, (pyramid, src) in list(_handles.items()):
+            if pyramid is self:
+                src.close()
+                del _handles[dataset]
+
+        if self.tfile is not None:
+            self.tfile.close()
+
+
+def _overview_factors(width, height, min_size):
+    """Decimation factors of the overview levels of a dataset.
+    """
+    factors = []
+    factor = 2
+
+    while max(width, height) / (factor // 2) > min_size:
+        factors.append(factor)
+        factor *= 2
+
+    return factors
+
+
+def _identity(file_path):
+    """Tuple of the modification time and size of a file, or None if the path is
+    not a regular file.
+    """
+    if not os.path.isfile(file_path):
+        return None
+
+    stat = os.stat(file_path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _stale_sidecar(file_path):
+    """Whether the .ovr file of a dataset is older than the dataset.
+    """
+    sidecar = file_path + ".ovr"
+
+    return (
+        os.path.isfile(sidecar)
+        and os.path.getmtime(sidecar) < os.path.getmtime(file_path)
+    )
+
+
+def _own_sidecar(file_path):
+    """Whether the .ovr file of a dataset was written by this module.
+    """
+    sidecar = file_path + ".ovr"
+
+    if not os.path.isfile(sidecar):
+        return False
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", NotGeoreferencedWarning)
+
+        try:
+            with rasterio.open(sidecar) as src:
+                return _TAG in src.tags()
+        except rasterio.errors.RasterioIOError:
+            return False
+
+
+def _build_pyramid(dataset, identity):
+    """Build the overviews of a dataset.
+
+    The overviews are built for a VRT of the dataset in the workspace, so that the
+    dataset itself is not modified. GDAL stores them in a .ovr file next to the
+    VRT, which is moved next to the dataset if `options["sidecar"]` is set and the
+    dataset does not have a .ovr file, or has a stale .ovr file that was written by
+    this module.
+
+    Returns
+    -------
+    _Pyramid
+    """
+    file_path = dataset.name
+    factors = _overview_factors(dataset.width, dataset.height, options["min_size"])
+    nbytes = sum(
+        math.ceil(dataset.width / f) * math.ceil(dataset.height / f) for f in factors
+    )
+    nbytes *= dataset.count * np.dtype(dataset.dtypes[0]).itemsize
+    tfile = workspace.create(".vrt", nbytes)
+
+    rasterio.shutil.copy(file_path, tfile.name, driver="VRT")
+
+    with rasterio.open(tfile.name, "r+") as vrt:
+        vrt.build_overviews(factors, Resampling[options["resampling"]])
+
+    sidecar = file_path + ".ovr"
+    replace = not os.path.exists(sidecar) or _own_sidecar(file_path)
+
+    if (
+        options["sidecar"]
+        and replace
+        and os.access(os.path.dirname(sidecar) or ".", os.W_OK)
+    ):
+        shutil.move(tfile.name + ".ovr", sidecar)
+        tfile.close()
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", NotGeoreferencedWarning)
+
+            with rasterio.open(sidecar, "r+") as ovr:
+                ovr.update_tags(**{_TAG: "1"})
+
+        return _Pyramid(identity, file_path, None)
+
+    return _Pyramid(identity, tfile.name, tfile)
+
+
+def _path_lock(file_path):
+    with _lock:
+        return _locks.setdefault(file_path, threading.Lock())
+
+
+def _current_pyramid(dataset, identity):
+    """The _Pyramid of a dataset, which is built if the dataset does not have a
+    pyramid or if its file has changed.
+    """
+    file_path = dataset.name
+
+    # only reads of the same file wait for the pyramid to be built
+    with _path_lock(file_path):
+        with _lock:
+            pyramid = _pyramids.get(file_path)
+
+            if pyramid is not None and pyramid.identity == identity:
+                pyramid.readers += 1
+                return pyramid
+
+        pyramid = _build_pyramid(dataset, identity)
+
+        with _lock:
+            previous = _pyramids.get(file_path)
+
+            if previous is not None:
+                previous.retire()
+
+            _pyramids[file_path] = pyramid
+            pyramid.readers += 1
+
+    return pyramid
+
+
+def _release(pyramid):
+    with _lock:
+        pyramid.readers -= 1
+
+        if pyramid.retired and pyramid.readers == 0:
+            pyramid._close()
+
+
+@contextmanager
+def _overview_dataset(dataset, out_shape, window=None):
+    """Context manager that yields the dataset to use for a decimated read of a
+    dataset.
+
+    GDAL reads decimated data from the closest overview level of a dataset. For
+    datasets that are stored in files without overviews, a pyramid of overviews is
+    built on the first decimated read and is cached for the following reads, so that
+    later reads do not decode the full resolution data. The pyramid is rebuilt if the
+    file changes.
+
+    The pyramid is opened separately for every dataset handle that reads from it,
+    so it can be read by the same threads as the handles. A pyramid that is rebuilt
+    or cleared is only removed once the reads that are in progress are finished.
+
+    Parameters
+    ----------
+    dataset : rasterio.io.DatasetReader or VirtualDataset
+        Dataset that is read.
+
+    out_shape : tuple
+        Shape of the (rows, cols) of the decimated read.
+
+    window : rasterio.windows.Window (optional)
+        Window that is read.
+
+    Yields
+    ------
+    rasterio.io.DatasetReader or VirtualDataset
+        A dataset with the same grid and bands as the dataset.
+    """
+    if not options["enabled"] or _is_virtual(dataset) or out_shape is None:
+        yield dataset
+        return
+
+    if window is None:
+        height, width = dataset.height, dataset.width
+    else:
+        height, width = window.height, window.width
+
+    # the data is read at full resolution without decimation
+    if max(height / out_shape[-2], width / out_shape[-1]) < 2:
+        yield dataset
+        return
+
+    if dataset.width * dataset.height < options["min_pixels"]:
+        yield dataset
+        return
+
+    file_path = dataset.name
+    identity = _identity(file_path)
+
+    if identity is None or (dataset.overviews(1) and not _stale_sidecar(file_path)):
+        yield dataset
+        return
+
+    pyramid = _current_pyramid(dataset, identity)
+
+    try:
+        with _lock:
+            handle = _handles.get(dataset)
+
+            if handle is not None and handle[0] is not pyramid:
+                handle[1].close()
+                handle = None
+
+        if handle is None:
+            src = rasterio.open(pyramid.path)
+
+            with _lock:
+                _handles[dataset] = (pyramid, src)
+
+            weakref.finalize(dataset, src.close)
+        else:
+            src = handle[1]
+
+        yield src
+    finally:
+        _release(pyramid)
+
+
+def clear():
+    """Remove the overviews that were built in the workspace and close the cached
+    datasets. Pyramids that are being read are removed once the reads are finished.
+    """
+    with _lock:
+        for pyramid in _pyramids.values():
+            pyramid.retire()
+
+        _pyramids.clear()
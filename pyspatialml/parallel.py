@@ -0,0 +1,473 @@
+import concurrent.futures
+import queue
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import rasterio
+
+from .backends import ArrayDataset, LazyDataset, ZarrDataset, _is_virtual
+from .temporary_files import _borrowed
+
+# per-process state that is populated by the worker initializers
+_worker = {}
+
+
+def _get_executor(backend, n_jobs, initializer=None, initargs=()):
+    """Returns a concurrent.futures executor for the selected backend.
+
+    Parameters
+    ----------
+    backend : str
+        Either 'threading' or 'multiprocessing'.
+
+    n_jobs : int
+        Number of workers.
+
+    initializer : callable (opt)
+        Function that is called once when each worker is started.
+
+    initargs : tuple
+        Arguments passed to the initializer.
+
+    Returns
+    -------
+    concurrent.futures.Executor
+    """
+    if backend == "threading":
+        return concurrent.futures.ThreadPoolExecutor(
+            max_workers=n_jobs, initializer=initializer, initargs=initargs
+        )
+
+    elif backend == "multiprocessing":
+        return concurrent.futures.ProcessPoolExecutor(
+            max_workers=n_jobs, initializer=initializer, initargs=initargs
+        )
+
+    raise ValueError("backend must be one of 'threading' or 'multiprocessing'")
+
+
+def _acquire(slots, stop):
+    """Acquire a slot for a window unless the pipeline has been stopped.
+    """
+    while not stop.is_set():
+        if slots.acquire(timeout=0.1):
+            return True
+
+    return False
+
+
+def _pipeline(windows, function, readers=None, executor=None, max_pending=4):
+    """Pipeline that overlaps the reading, calculation and writing of windows.
+
+    Reader threads read the data of the windows in advance and submit the
+    calculations to the executor. The results are passed back through a bounded
+    queue and are yielded in the order of the windows, so that the calling thread
+    acts as the writer of the results while the following windows are read and
+    calculated.
+
+    Parameters
+    ----------
+    windows : list
+        Windows to process.
+
+    function : callable
+        Function that is applied to the data of each window.
+
+    readers : list of callables (opt)
+        One reader for each reader thread, which takes a window and returns its
+        data. Readers that run concurrently must not share dataset handles. If
+        not supplied then the windows themselves are passed to the function, for
+        example for workers that read their own data.
+
+    executor : concurrent.futures.Executor (opt)
+        Executor that runs the calculations. If not supplied then the function is
+        called by the reader threads.
+
+    max_pending : int, default=4
+        Maximum number of windows that are read ahead of the writer.
+
+    Yields
+    ------
+    tuple
+        (window, result) tuples in the order of the windows.
+    """
+    windows = list(windows)
+
+    if readers is None:
+        readers = [None]
+
+    tasks = queue.Queue()
+    results = queue.Queue()
+    stop = threading.Event()
+
+    # limits the number of windows that are read ahead of the writer
+    slots = threading.Semaphore(max_pending)
+
+    for item in enumerate(windows):
+        tasks.put(item)
+
+    def read_windows(read):
+        while _acquire(slots, stop):
+            try:
+                i, window = tasks.get_nowait()
+            except queue.Empty:
+                return
+
+            # errors are raised by the writer when the window is reached
+            try:
+                data = window if read is None else read(window)
+
+                if executor is not None:
+                    future = executor.submit(function, data)
+                else:
+                    future = concurrent.futures.Future()
+                    future.set_result(function(data))
+
+            except BaseException as e:
+                future = concurrent.futures.Future()
+                future.set_exception(e)
+
+            results.put((i, window, future))
+
+    threads = [
+        threading.Thread(target=read_windows, args=(read,), daemon=True)
+        for read in readers
+    ]
+
+    for thread in threads:
+        thread.start()
+
+    ready = {}
+
+    try:
+        for i in range(len(windows)):
+            while i not in ready:
+                j, window, future = results.get()
+                ready[j] = (window, future)
+
+            window, future = ready.pop(i)
+            slots.release()
+            yield window, future.result()
+
+    finally:
+        stop.set()
+
+        for thread in threads:
+            thread.join()
+
+
+def _num_readers(n_jobs, n_windows):
+    """Number of reader threads of a pipeline. Small jobs use a single reader
+    rather than opening additional dataset handles.
+    """
+    return max(min(n_jobs, 4, n_windows // 8), 1)
+
+
+@contextmanager
+def _reader_rasters(raster, n_readers):
+    """Context manager that provides the Rasters that are used by the reader
+    threads of a pipeline, each with its own dataset handles. The copies of the
+    Raster are closed on exit, so the pipeline must be closed before then.
+
+    Datasets that are not opened by rasterio, such as virtual datasets, cannot be
+    reopened, in which case the Raster is used by a single reader.
+
+    Yields
+    ------
+    list
+        List of pyspatialml.Raster objects, where the first is the Raster itself.
+    """
+    if n_readers <= 1 or _has_virtual_layers(raster):
+        yield [raster]
+        return
+
+    copies = []
+
+    try:
+        for _ in range(n_readers - 1):
+            copies.append(_reopen(raster))
+
+        yield [raster] + copies
+
+    finally:
+        for copy in copies:
+            copy.close()
+
+
+def _has_virtual_layers(raster):
+    return any(_is_virtual(layer.ds) for layer in raster.iloc)
+
+
+def _reopen(raster):
+    """Copy of a Raster with layers that are read using new dataset handles.
+
+    The copies are LazyDatasets that are created from the headers of the existing
+    datasets, so that each file is only opened if the copy of the layer is read.
+    """
+    from .raster import Raster
+    from .rasterlayer import RasterLayer
+
+    datasets = {}
+    copies = []
+
+    for layer in raster.iloc:
+        # evicted temporary files are restored before they are reopened
+        dataset = layer.ds if layer._tempfile is not None else layer._ds
+
+        if id(dataset) not in datasets:
+            file_path = getattr(dataset, "file_path", dataset.name)
+            datasets[id(dataset)] = LazyDataset(file_path, header=dataset)
+
+        copy = RasterLayer(rasterio.band(datasets[id(dataset)], layer.bidx))
+        copy.names = list(layer.names)
+        copies.append(copy)
+
+    return Raster(copies)
+
+
+def _layer_signature(raster):
+    return tuple((id(layer.ds), layer.bidx) for layer in raster.iloc)
+
+
+class _HandlePool(object):
+    """Pool of copies of a Raster with their own dataset handles, which are shared
+    by concurrent requests.
+
+    GDAL dataset handles cannot be read by several threads at the same time. A
+    request borrows a copy of the Raster for the duration of a read, and copies are
+    only opened when all of the existing copies are in use, up to `max_handles`.
+    Rasters with virtual layers cannot be reopened and are read using a single
+    handle.
+    """
+
+    def __init__(self, raster, max_handles):
+        self.raster = raster
+        self.signature = _layer_signature(raster)
+        self.max_handles = 1 if _has_virtual_layers(raster) else max(max_handles, 1)
+        self.handles = [raster]
+        self._free = queue.LifoQueue()
+        self._free.put(raster)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def borrow(self):
+        """Context manager that borrows a Raster from the pool, waiting for a
+        Raster to be returned if all of the handles are in use.
+        """
+        try:
+            raster = self._free.get_nowait()
+        except queue.Empty:
+            raster = None
+
+            with self._lock:
+                if len(self.handles) < self.max_handles:
+                    raster = _reopen(self.raster)
+                    self.handles.append(raster)
+
+            if raster is None:
+                raster = self._free.get()
+
+        try:
+            with _borrowed(self.raster.iloc):
+                yield raster
+        finally:
+            self._free.put(raster)
+
+    def close(self):
+        """Close the handles that were opened by the pool.
+        """
+        with self._lock:
+            for raster in self.handles[1:]:
+                raster.close()
+
+            self.handles = self.handles[:1]
+            self._free = queue.LifoQueue()
+            self._free.put(self.raster)
+
+
+_pools_lock = threading.Lock()
+
+
+def _handle_pool(raster, max_handles):
+    """The _HandlePool of a Raster, which is created on first use and is replaced
+    if the layers of the Raster change.
+    """
+    with _pools_lock:
+        pool = raster._pool
+
+        if pool is None or pool.signature != _layer_signature(raster):
+            pool = _HandlePool(raster, max_handles)
+            raster._pool = pool
+
+    return pool
+
+
+def _open_layers(layers):
+    """Open a list of (source, bidx) tuples as RasterLayers. File paths that occur
+    more than once are opened as a single dataset.
+    """
+    from .rasterlayer import RasterLayer
+
+    datasets = {}
+    src_layers = []
+
+    for source, bidx in layers:
+        key = source if isinstance(source, str) else id(source)
+
+        if key not in datasets:
+            if isinstance(source, str):
+                datasets[key] = rasterio.open(source)
+            else:
+                datasets[key] = source
+
+        band = rasterio.band(datasets[key], bidx)
+        src_layers.append(RasterLayer(band))
+
+    return src_layers
+
+
+def _concurrent_writes(dst):
+    """Whether windows of the results can be written to a dataset by the workers
+    rather than by a single writer.
+    """
+    return isinstance(dst, ZarrDataset)
+
+
+def _write_window(dst, window, result, dtype, nodata, bands=None):
+    """Write the result of a window to a dataset, filling masked pixels with the
+    nodata value.
+
+    Parameters
+    ----------
+    bands : list (opt)
+        Indexes of the bands of the result to write. Defaults to all of the bands.
+    """
+    result = np.ma.filled(result, fill_value=nodata)
+
+    if result.ndim == 2:
+        result = result[np.newaxis, :, :]
+
+    if bands is not None:
+        result = result[bands, :, :]
+
+    indexes = list(range(1, result.shape[0] + 1))
+    dst.write(result.astype(dtype), window=window, indexes=indexes)
+
+
+def _write_result(item, function, dst, dtype, nodata, bands=None):
+    """Apply a function to the data of a (window, data) tuple and write the result
+    within the worker.
+    """
+    window, data = item
+    _write_window(dst, window, function(data), dtype, nodata, bands)
+
+
+def _layer_sources(raster):
+    """List of (source, bidx) tuples describing each RasterLayer in a Raster,
+    which can be passed to process-based workers. The source is the file path of
+    the layer, or the dataset itself for virtual datasets.
+
+    Files in GDAL's /vsimem/ file system are not visible to other processes, so
+    these layers are passed as an in-memory copy of the band.
+    """
+    sources = []
+
+    for layer in raster.iloc:
+        if _is_virtual(layer.ds):
+            sources.append((layer.ds, layer.bidx))
+
+        elif layer.file.startswith("/vsimem/"):
+            dataset = ArrayDataset(
+                layer.read(), layer.crs, layer.transform, layer.nodata
+            )
+            sources.append((dataset, 1))
+
+        else:
+            sources.append((layer.file, layer.bidx))
+
+    return sources
+
+
+def _read_window(raster, window):
+    """Default reader used by the workers.
+    """
+    return raster.read(window=window, masked=True)
+
+
+def _read_item(raster, window, as_df=False):
+    """Reader that returns a (window, data) tuple.
+    """
+    return window, raster.read(window=window, masked=True, as_df=as_df)
+
+
+def _with_window(read, window):
+    """Reader that returns a (window, data) tuple from another reader.
+    """
+    return window, read(window)
+
+
+def _read_layers(raster, window):
+    """Reader that returns a list of the data of each layer, keeping the data type
+    of each layer.
+    """
+    return [layer.read(window=window, masked=True) for layer in raster.iloc]
+
+
+def _init_raster_worker(
+    layers, function, initializer=None, initargs=(), reader=None, writer=None
+):
+    """Initializer for process-based workers.
+
+    Opens the datasets of the Raster within the worker process so that windows
+    of data can be read by the workers rather than being pickled and sent from
+    the parent process.
+
+    Parameters
+    ----------
+    layers : list of tuples
+        List of (source, bidx) tuples describing each RasterLayer, where the
+        source is a file path or a virtual dataset.
+
+    function : callable
+        Function to apply to each window of data.
+
+    initializer : callable (opt)
+        Optional user-supplied function to call once per worker, for example to
+        load expensive state such as lookup tables.
+
+    initargs : tuple
+        Arguments to pass to the user-supplied initializer.
+
+    reader : callable (opt)
+        Function that takes the Raster and a window and returns the data that is
+        passed to `function`. Defaults to reading the window as a masked array.
+
+    writer : tuple (opt)
+        Tuple of (dataset, dtype, nodata). If supplied then the workers write the
+        results of each window to the dataset, which must support concurrent
+        writes, instead of returning them.
+    """
+    from .raster import Raster
+
+    _worker["raster"] = Raster(_open_layers(layers))
+    _worker["function"] = function
+    _worker["reader"] = reader if reader is not None else _read_window
+    _worker["writer"] = writer
+
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def _apply_window(window):
+    """Reads a window of data within a worker and applies the worker's function.
+    """
+    arr = _worker["reader"](_worker["raster"], window)
+    result = _worker["function"](arr)
+
+    if _worker["writer"] is not None:
+        dst, dtype, nodata = _worker["writer"]
+        _write_window(dst, window, result, dtype, nodata)
+        return None
+
+    return result
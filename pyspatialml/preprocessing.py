@@ -1,16 +1,29 @@
+from contextlib import closing
 from copy import deepcopy
+from functools import partial
 
 import numpy as np
-import rasterio
-from scipy import ndimage
 
+from .backends import FunctionDataset, _open_dataset, _virtual_layers
+from .cache import cached
+from .parallel import _get_executor, _pipeline
 from .raster import Raster
 from .temporary_files import _file_path_tempfile
+from .utils import _block_windows, _get_num_workers
 
 
-def one_hot_encode(layer, categories=None, file_path=None, driver='GTiff'):
+@cached("one_hot_encode")
+def one_hot_encode(
+    layer, categories=None, file_path=None, driver='GTiff', dtype='uint8',
+    nodata=None, **kwargs
+):
     """One-hot encoding of a RasterLayer.
 
+    The RasterLayer is processed window-by-window. If the categories are not
+    supplied, then a first pass over the windows is used to find the unique
+    categorical values. A second pass writes all of the encoded layers for each
+    window at once.
+
     Parameters
     ----------
     layer : pyspatialml.RasterLayer
@@ -27,54 +40,72 @@ def one_hot_encode(layer, categories=None, file_path=None, driver='GTiff'):
     driver : str, options. Default is 'GTiff'
         GDAL-compatible driver.
 
+    dtype : str, optional. Default is 'uint8'
+        Data type of the encoded layers.
+
+    nodata : any number, optional. Default is None
+        Value that is used to encode the nodata pixels of the input layer. If not
+        supplied then nodata pixels are encoded as zeros in all of the layers.
+
+    kwargs : opt
+        Optional named arguments to pass to the format drivers. For example
+        `compress="deflate"` can be used to add compression, or `nbits=1` to store
+        the encoded layers as 1-bit data using the GTiff driver.
+
     Returns
     -------
     pyspatialml.Raster
         Each categorical value is encoded as a layer with a Raster object.
     """
-    arr = layer.read(masked=True)
+    windows = list(_block_windows(layer.height, layer.width, (512, 512)))
 
     if categories is None:
-        categories = np.unique(arr)
-        categories = categories[~categories.mask]
-        categories = categories.data.astype('int32')
+        categories = np.zeros(0, dtype='int32')
 
-    arr_ohe = np.ma.zeros(
-        (len(categories), arr.shape[0], arr.shape[1]), dtype='int32')
-    names = []
-    prefix = layer.names[0]
+        for window in windows:
+            arr = layer.read(window=window, masked=True)
+            categories = np.union1d(categories, np.unique(arr.compressed()))
 
-    for i, cat in enumerate(categories):
-        enc = deepcopy(arr)
-        enc[enc != cat] = 0
-        enc[enc == cat] = 1
-        arr_ohe[i, :, :] = enc
+        categories = categories.astype('int32')
 
-        names.append('_'.join([prefix, 'cat',  str(cat)]))
+    categories = np.asarray(categories)
+    prefix = layer.names[0]
+    names = ['_'.join([prefix, 'cat', str(cat)]) for cat in categories]
 
     # create new stack
-    file_path, tfile = _file_path_tempfile(file_path)
-
     meta = deepcopy(layer.ds.meta)
     meta['driver'] = driver
-    meta['nodata'] = -99999
-    meta['count'] = arr_ohe.shape[0]
-    meta['dtype'] = 'int32'
+    meta['nodata'] = nodata
+    meta['count'] = len(categories)
+    meta['dtype'] = dtype
+    meta.update(kwargs)
+    file_path, tfile = _file_path_tempfile(file_path, meta)
 
-    with rasterio.open(file_path, mode='w', **meta) as dst:
-        dst.write(arr_ohe)
+    with _open_dataset(file_path, "w", **meta) as dst:
+        for window in windows:
+            arr = layer.read(window=window, masked=True)
+            mask = np.ma.getmaskarray(arr)
+            arr_ohe = arr.data[np.newaxis, :, :] == categories[:, np.newaxis, np.newaxis]
+            arr_ohe[:, mask] = False
+            arr_ohe = arr_ohe.astype(dtype)
+
+            if nodata is not None:
+                arr_ohe[:, mask] = nodata
+
+            dst.write(arr_ohe, window=window)
 
     new_raster = Raster(file_path)
     new_raster.rename({old: new for old, new in zip(new_raster.names, names)})
 
     if tfile is not None:
         for layer in new_raster.iloc:
-            layer.close = tfile.close
+            tfile.attach(layer)
 
     return new_raster
 
 
-def xy_coordinates(layer, file_path=None, driver='GTiff'):
+@cached("xy_coordinates")
+def xy_coordinates(layer, file_path=None, driver='GTiff', lazy=False):
     """
     Fill 2d arrays with their x,y indices.
 
@@ -90,41 +121,28 @@ def xy_coordinates(layer, file_path=None, driver='GTiff'):
     driver : str, options. Default is 'GTiff'
         GDAL driver to use to save raster.
 
+    lazy : bool, optional. Default is False
+        Whether to return virtual layers that are calculated on demand for each
+        window that is read, rather than writing the layers to a file.
+
     Returns
     -------
     pyspatialml.Raster object
     """
-
-    arr = np.zeros(layer.shape, dtype=np.float32)
-    arr = arr[np.newaxis, :, :]
-    xyarrays = np.repeat(arr[0:1, :, :], 2, axis=0)
-    xx, xy = np.meshgrid(np.arange(arr.shape[2]), np.arange(arr.shape[1]))
-    xyarrays[0, :, :] = xx
-    xyarrays[1, :, :] = xy
-
-    # create new stack
-    file_path, tfile = _file_path_tempfile(file_path)
-
-    meta = deepcopy(layer.meta)
-    meta['driver'] = driver
-    meta['count'] = 2
-    meta['dtype'] = xyarrays.dtype
-
-    with rasterio.open(file_path, 'w', **meta) as dst:
-        dst.write(xyarrays)
-    
-    new_raster = Raster(file_path)
     names = ['x_coordinates', 'y_coordinates']
-    new_raster.rename({old: new for old, new in zip(new_raster.names, names)})
+    dataset = _template_dataset(
+        layer, _xy_indices, len(names), 'float32', 'xy_coordinates')
 
-    if tfile is not None:
-        for layer in new_raster.iloc:
-            layer.close = tfile.close
+    if lazy is True:
+        return Raster(_virtual_layers(dataset, names))
 
-    return new_raster
+    return _write_dataset(dataset, names, file_path, driver, n_jobs=-1)
 
 
-def rotated_coordinates(layer, n_angles=8, file_path=None, driver='GTiff'):
+@cached("rotated_coordinates")
+def rotated_coordinates(
+    layer, n_angles=8, file_path=None, driver='GTiff', dtype='float64', lazy=False
+):
     """Generate 2d arrays with n_angles rotated coordinates.
 
     Parameters
@@ -142,45 +160,31 @@ def rotated_coordinates(layer, n_angles=8, file_path=None, driver='GTiff'):
     driver : str, optional. Default is 'GTiff'
         GDAL driver to use to save raster.
 
+    dtype : str, optional. Default is 'float64'
+        Data type of the rotated coordinates.
+
+    lazy : bool, optional. Default is False
+        Whether to return virtual layers that are calculated on demand for each
+        window that is read, rather than writing the layers to a file.
+
     Returns
     -------
     pyspatialml.Raster
     """
-
-    # define x and y grid dimensions
-    xmin, ymin, xmax, ymax = 0, 0, layer.shape[1], layer.shape[0]
-    x_range = np.arange(start=xmin, stop=xmax, step=1)
-    y_range = np.arange(start=ymin, stop=ymax, step=1, dtype=np.float32)
-
-    X_var, Y_var, _ = np.meshgrid(x_range, y_range, n_angles)
     angles = np.deg2rad(np.linspace(0, 180, n_angles, endpoint=False))
-    grids_directional = X_var + np.tan(angles) * Y_var
-
-    # reorder to band, row, col order
-    grids_directional = grids_directional.transpose((2, 0, 1))
-
-    # create new stack
-    file_path, tfile = _file_path_tempfile(file_path)
-
-    meta = deepcopy(layer.meta)
-    meta['driver'] = driver
-    meta['count'] = n_angles
-    meta['dtype'] = grids_directional.dtype
-    with rasterio.open(file_path, 'w', **meta) as dst:
-        dst.write(grids_directional)
-    
-    new_raster = Raster(file_path)
+    function = partial(_rotated_indices, angles=angles)
     names = ['angle_' + str(i+1) for i in range(n_angles)]
-    new_raster.rename({old: new for old, new in zip(new_raster.names, names)})
+    dataset = _template_dataset(
+        layer, function, n_angles, dtype, 'rotated_coordinates')
 
-    if tfile is not None:
-        for layer in new_raster.iloc:
-            layer.close = tfile.close
+    if lazy is True:
+        return Raster(_virtual_layers(dataset, names))
 
-    return new_raster
+    return _write_dataset(dataset, names, file_path, driver, n_jobs=-1)
 
 
-def distance_to_corners(layer, file_path=None, driver='GTiff'):
+@cached("distance_to_corners")
+def distance_to_corners(layer, file_path=None, driver='GTiff', lazy=False):
     """Generate buffer distances to corner and centre coordinates of raster extent.
 
     Parameters
@@ -194,6 +198,10 @@ def distance_to_corners(layer, file_path=None, driver='GTiff'):
     driver : str, optional. Default is 'GTiff'
         GDAL driver to use to save raster.
 
+    lazy : bool, optional. Default is False
+        Whether to return virtual layers that are calculated on demand for each
+        window that is read, rather than writing the layers to a file.
+
     Returns
     -------
     pyspatialml.Raster object
@@ -213,43 +221,170 @@ def distance_to_corners(layer, file_path=None, driver='GTiff'):
         [0, layer.shape[1]-1, 0, layer.shape[1]-1, int(layer.shape[1]/2)])
 
     # euclidean distances
-    arr = _grid_distance(layer.shape, rows, cols)
+    function = partial(
+        _grid_distance, sample_rows=rows, sample_cols=cols, dtype='float32')
+    dataset = _template_dataset(
+        layer, function, len(names), 'float32', 'distance_to_corners')
 
-    # create new stack
-    file_path, tfile = _file_path_tempfile(file_path)
+    if lazy is True:
+        return Raster(_virtual_layers(dataset, names))
+
+    return _write_dataset(dataset, names, file_path, driver, n_jobs=-1)
+
+
+def _template_dataset(layer, function, count, dtype, name):
+    """Create a FunctionDataset with the same dimensions and transform as a
+    template RasterLayer or rasterio dataset.
+    """
+    height, width = layer.shape
+
+    return FunctionDataset(
+        function=function,
+        count=count,
+        dtype=dtype,
+        width=width,
+        height=height,
+        crs=layer.meta['crs'],
+        transform=layer.meta['transform'],
+        name=name,
+    )
+
+
+def _write_dataset(dataset, names, file_path, driver, n_jobs, **kwargs):
+    """Write a virtual dataset to a file window-by-window.
+
+    Parameters
+    ----------
+    dataset : pyspatialml.backends.VirtualDataset
+        Dataset to write.
 
-    meta = deepcopy(layer.meta)
+    names : list
+        Names of the resulting layers.
+
+    Returns
+    -------
+    pyspatialml.Raster
+    """
+    n_jobs = _get_num_workers(n_jobs)
+
+    meta = dataset.meta
     meta['driver'] = driver
-    meta['count'] = 5
-    meta['dtype'] = arr.dtype
 
-    with rasterio.open(file_path, 'w', **meta) as dst:
-        dst.write(arr)
-        
+    # limit the size of each block to approximately 16 million pixels. The data is
+    # written in the blocks of the output so that each block is only written once
+    block = int(np.clip(np.sqrt(2 ** 24 / dataset.count), 16, 1024)) // 16 * 16
+    block_options = ('tiled', 'blockxsize', 'blockysize', 'cog')
+
+    if driver in ('GTiff', 'Zarr') and not any(k in kwargs for k in block_options):
+        meta.update(blockxsize=block, blockysize=block)
+
+        if driver == 'GTiff':
+            meta['tiled'] = True
+
+    meta.update(kwargs)
+    file_path, tfile = _file_path_tempfile(file_path, meta)
+    function = partial(_read_dataset_window, dataset)
+
+    with _open_dataset(file_path, "w", **meta) as dst:
+        windows = [window for ij, window in dst.block_windows()]
+
+        # the virtual dataset does not read any files, so the windows are
+        # calculated by the workers and written as they are completed
+        executor = _get_executor('threading', n_jobs)
+        pipeline = _pipeline(windows, function, None, executor, n_jobs)
+
+        with executor, closing(pipeline) as results:
+            for window, arr in results:
+                dst.write(arr, window=window)
+
     new_raster = Raster(file_path)
-    new_raster.rename({
-        old: new for old, new in zip(new_raster.names, names)})
+    new_raster.rename({old: new for old, new in zip(new_raster.names, names)})
 
     if tfile is not None:
+        tfile.recompute = partial(
+            _write_dataset, dataset, names, file_path, driver, n_jobs, **kwargs
+        )
+
         for layer in new_raster.iloc:
-            layer.close = tfile.close
+            tfile.attach(layer)
 
     return new_raster
 
 
-def _grid_distance(shape, rows, cols):
-    """Generate buffer distances to x,y coordinates.
+def _read_dataset_window(dataset, window):
+    """Read all bands of a window from a dataset.
+    """
+    return dataset.read(window=window)
+
+
+def _xy_indices(indexes, rows, cols):
+    """Column and row indices of pixels.
 
     Parameters
     ----------
-    shape : tuple
-        shape of numpy array (rows, cols) to create buffer distances within.
+    indexes : list
+        Band indexes to calculate. Band 1 is the column indices and band 2 is the
+        row indices.
 
-    rows : 1d numpy array
-        array of row indexes.
+    rows, cols : 1d numpy array
+        Arrays of the row and column indices of the pixels.
 
-    cols : 1d numpy array
-        array of column indexes.
+    Returns
+    -------
+    ndarray
+        3d numpy array of [band, row, col].
+    """
+    xx, yy = np.broadcast_arrays(cols[np.newaxis, :], rows[:, np.newaxis])
+    grids = {1: xx, 2: yy}
+    return np.stack([grids[i] for i in indexes])
+
+
+def _rotated_indices(indexes, rows, cols, angles):
+    """Column indices of pixels after rotating the row and column indices.
+
+    Parameters
+    ----------
+    indexes : list
+        Band indexes to calculate, one for each angle.
+
+    rows, cols : 1d numpy array
+        Arrays of the row and column indices of the pixels.
+
+    angles : 1d numpy array
+        Angles of rotation in radians.
+
+    Returns
+    -------
+    ndarray
+        3d numpy array of [band, row, col].
+    """
+    tan = np.tan(angles[np.asarray(indexes) - 1])
+    return (
+        cols[np.newaxis, np.newaxis, :]
+        + tan[:, np.newaxis, np.newaxis] * rows[np.newaxis, :, np.newaxis]
+    )
+
+
+def _grid_distance(indexes, rows, cols, sample_rows, sample_cols, dtype=np.float32):
+    """Generate buffer distances from pixels to x,y coordinates.
+
+    Parameters
+    ----------
+    indexes : list
+        Band indexes to calculate, one for each x,y coordinate.
+
+    rows, cols : 1d numpy array
+        Arrays of the row and column indices of the pixels.
+
+    sample_rows : 1d numpy array
+        array of row indexes of the x,y coordinates.
+
+    sample_cols : 1d numpy array
+        array of column indexes of the x,y coordinates.
+
+    dtype : str or numpy.dtype (default np.float32)
+        Data type of the distances. Distances are rounded and clipped to the
+        range of integer data types.
 
     Returns
     -------
@@ -257,27 +392,32 @@ def _grid_distance(shape, rows, cols):
         3d numpy array of euclidean grid distances to each x,y coordinate pair
         [band, row, col].
     """
+    idx = np.asarray(indexes) - 1
+    sample_rows, sample_cols = sample_rows[idx], sample_cols[idx]
 
-    # create buffer distances
-    grids_buffers = np.zeros((shape[0], shape[1], rows.shape[0]),
-                             dtype=np.float32)
-
-    for i, (y, x) in enumerate(zip(rows, cols)):
-        # create 2d array (image) with pick indexes set to z
-        point_arr = np.zeros((shape[0], shape[1]))
-        point_arr[y, x] = 1
-        buffer = ndimage.morphology.distance_transform_edt(1 - point_arr)
-        grids_buffers[:, :, i] = buffer
+    # broadcast to (samples, rows, cols)
+    row_dist = (rows[np.newaxis, :] - sample_rows[:, np.newaxis]).astype(np.float32)
+    col_dist = (cols[np.newaxis, :] - sample_cols[:, np.newaxis]).astype(np.float32)
+    grids_buffers = np.hypot(row_dist[:, :, np.newaxis], col_dist[:, np.newaxis, :])
 
-    # reorder to band, row, column
-    grids_buffers = grids_buffers.transpose((2, 0, 1))
+    if np.issubdtype(dtype, np.integer):
+        info = np.iinfo(dtype)
+        grids_buffers = np.clip(np.rint(grids_buffers), info.min, info.max)
 
-    return grids_buffers
+    return grids_buffers.astype(dtype)
 
 
-def distance_to_samples(layer, rows, cols, file_path=None, driver='GTiff'):
+@cached("distance_to_samples")
+def distance_to_samples(
+    layer, rows, cols, file_path=None, driver='GTiff', dtype='float32', n_jobs=-1,
+    lazy=False, **kwargs
+):
     """Generate buffer distances to x,y coordinates.
 
+    The distances are calculated directly from the row and column indexes and are
+    written window-by-window so that the distances to all of the samples are not
+    held in memory.
+
     Parameters
     ----------
     layer : pyspatialml.RasterLayer, or rasterio.DatasetReader
@@ -295,6 +435,21 @@ def distance_to_samples(layer, rows, cols, file_path=None, driver='GTiff'):
     driver : str, default='GTiff'
         GDAL driver to use to save raster.
 
+    dtype : str, default='float32'
+        Data type of the distances. Integer data types such as 'uint16' can be used
+        to reduce the size of the output, in which case the distances are rounded.
+
+    n_jobs : int, default=-1
+        Number of windows to process in parallel.
+
+    lazy : bool, default=False
+        Whether to return virtual layers that are calculated on demand for each
+        window that is read, rather than writing the layers to a file.
+
+    kwargs : opt
+        Optional named arguments to pass to the format drivers. For example can be
+        `compress="deflate"` to add compression.
+
     Returns
     -------
     pyspatialml.Raster object
@@ -309,27 +464,13 @@ def distance_to_samples(layer, rows, cols, file_path=None, driver='GTiff'):
     if rows.shape != cols.shape:
         raise ValueError('rows and cols must have same dimensions')
 
-    shape = layer.shape
-    arr = _grid_distance(shape, rows, cols)
-
-    # create new stack
-    file_path, tfile = _file_path_tempfile(file_path)
-
-    meta = deepcopy(layer.meta)
-    meta['driver'] = driver
-    meta['count'] = arr.shape[0]
-    meta['dtype'] = arr.dtype
-
-    with rasterio.open(file_path, 'w', **meta) as dst:
-        dst.write(arr)
-        
     names = ['dist_sample' + str(i+1) for i in range(len(rows))]
-    new_raster = Raster(file_path)
-    new_raster.rename(
-        {old: new for old, new in zip(new_raster.names, names)})
+    function = partial(
+        _grid_distance, sample_rows=rows, sample_cols=cols, dtype=dtype)
+    dataset = _template_dataset(
+        layer, function, len(names), dtype, 'distance_to_samples')
 
-    if tfile is not None:
-        for layer in new_raster.iloc:
-            layer.close = tfile.close
+    if lazy is True:
+        return Raster(_virtual_layers(dataset, names))
 
-    return new_raster
+    return _write_dataset(dataset, names, file_path, driver, n_jobs, **kwargs)
@@ -1,10 +1,10 @@
 from __future__ import print_function
 
-import concurrent.futures
+import bisect
 import math
-import tempfile
 from collections import Counter, OrderedDict, namedtuple
 from collections.abc import Mapping
+from contextlib import closing
 from copy import deepcopy
 from functools import partial
 
@@ -13,18 +13,57 @@ import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 import rasterio
+import rasterio.features
 import rasterio.mask
 import rasterio.plot
+import rasterio.shutil
 from mpl_toolkits.axes_grid1 import make_axes_locatable
 from rasterio.transform import Affine
-from rasterio.warp import calculate_default_transform, reproject
+from rasterio.warp import reproject
 from rasterio.windows import Window
 from tqdm import tqdm
 
+from . import aio
+from .aio import _run
 from .base import BaseRaster
+from .cache import cached
+from .focal import _focal
+from .focal import kernels as focal_kernels
+from .overviews import _overview_dataset
+from .backends import (
+    ArrayDataset,
+    WarpedDataset,
+    WindowDataset,
+    _is_virtual,
+    _open_dataset,
+    _open_datasets,
+    _vrt_xml,
+)
+from .parallel import (
+    _apply_window,
+    _concurrent_writes,
+    _get_executor,
+    _handle_pool,
+    _init_raster_worker,
+    _layer_sources,
+    _num_readers,
+    _pipeline,
+    _read_item,
+    _read_window,
+    _reader_rasters,
+    _with_window,
+    _write_result,
+    _write_window,
+)
 from .rasterlayer import RasterLayer
-from .temporary_files import _file_path_tempfile
-from .utils import _get_nodata, _get_num_workers
+from .temporary_files import (
+    _borrowed,
+    _file_path_tempfile,
+    _in_memory,
+    workspace,
+)
+from .utils import _block_windows, _get_nodata, _get_num_workers, _read_halo
+from .warp import _read_tile, _target_grid, _tile_windows, _warp_tile
 
 
 class _LocIndexer(Mapping):
@@ -70,12 +109,18 @@ class _LocIndexer(Mapping):
         delattr(self.parent, key)
         return pop
 
-    def rename(self, old, new):
+    def rename(self, names):
+        """Rename keys using a dict of old : new names in a single pass.
+        """
         self._dict = OrderedDict(
-            [(new, v) if k == old else (k, v) for k, v in self._dict.items()]
+            [(names.get(k, k), v) for k, v in self._dict.items()]
         )
-        delattr(self.parent, old)
-        setattr(self.parent, new, self._dict[new])
+
+        for old in names:
+            delattr(self.parent, old)
+
+        for new in names.values():
+            setattr(self.parent, new, self._dict[new])
 
 
 class _iLocIndexer(object):
@@ -100,6 +145,12 @@ class _iLocIndexer(object):
         self.parent = parent
         self._index = loc_indexer
 
+    def __iter__(self):
+        return iter(self._index._dict.values())
+
+    def __len__(self):
+        return len(self._index)
+
     def __setitem__(self, index, value):
         if isinstance(index, int):
             key = list(self._index.keys())[index]
@@ -142,6 +193,49 @@ class _iLocIndexer(object):
         return selected
 
 
+class _WindowIndexer(object):
+    """Create views of a spatial subset of a Raster using slices of rows and columns.
+
+    `raster.window[row_slice, col_slice]` returns a new Raster that references the
+    datasets of the parent Raster, with reads translated by the offset of the
+    window, so that no data is copied.
+
+    Parameters
+    ----------
+    parent : pyspatialml.Raster
+        The parent Raster object.
+    """
+
+    def __init__(self, parent):
+        self.parent = parent
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple) or len(key) != 2:
+            raise IndexError("windows are selected using [row_slice, col_slice]")
+
+        slices = []
+
+        for index, size in zip(key, self.parent.shape):
+            if isinstance(index, (int, np.integer)):
+                index = int(index) % size
+                index = slice(index, index + 1)
+
+            if not isinstance(index, slice):
+                raise IndexError("windows are selected using integers or slices")
+
+            start, stop, step = index.indices(size)
+
+            if step != 1:
+                raise IndexError("slices with steps are not supported")
+
+            if stop <= start:
+                raise IndexError("window does not contain any pixels")
+
+            slices.append((start, stop))
+
+        return self.parent._view(Window.from_slices(*slices))
+
+
 class Raster(BaseRaster):
     """Flexible class that represents a collection of file-based GDAL-supported raster
     datasets which share a common coordinate reference system and geometry.
@@ -165,6 +259,7 @@ class Raster(BaseRaster):
         nodata=None,
         mode="r",
         file_path=None,
+        align=None,
     ):
         """Initiate a new Raster object
 
@@ -199,6 +294,12 @@ class Raster(BaseRaster):
 
         file_path : str (optional, default None)
             Path to save new Raster object if created from `arr`.
+
+        align : bool, Raster, RasterLayer or rasterio dataset (optional, default None)
+            Align layers that are not on the same grid onto a reference grid. If True
+            then the grid of the first layer is used as the reference. Misaligned
+            layers are reprojected lazily using nearest neighbour resampling when they
+            are read. Use the `align` method to choose a different resampling method.
         
         Attributes
         ----------
@@ -212,6 +313,10 @@ class Raster(BaseRaster):
             OrderedDict. Setting and getting items can occur using a single index
             position, a list or tuple of positions, or a slice of positions.
 
+        window : pyspatialml.raster._WindowIndexer
+            Select a view of a spatial subset of the Raster using slices of rows
+            and columns, i.e. `raster.window[0:100, 50:150]`.
+
         files : list
             A list of the raster dataset files that are used in the Raster. This does
             not have to be the same length as the number of RasterLayers because some
@@ -257,6 +362,7 @@ class Raster(BaseRaster):
         # class attributes
         self.loc = _LocIndexer(self)
         self.iloc = _iLocIndexer(self, self.loc)
+        self.window = _WindowIndexer(self)
         self.files = []
         self.dtypes = []
         self.nodatavals = []
@@ -264,6 +370,7 @@ class Raster(BaseRaster):
         self.res = None
         self.meta = None
         self._block_shape = (256, 256)
+        self._pool = None
 
         # some checks
         if src and arr:
@@ -272,11 +379,18 @@ class Raster(BaseRaster):
         if mode not in ["r", "r+", "w"]:
             raise ValueError("mode must be one of 'r', 'r+', or 'w'")
 
-        # initiate from array
-        if arr is not None:
+        tfile = None
+
+        # initiate from array, which is used directly if it is small
+        if arr is not None and file_path is None and _in_memory(arr.nbytes):
+            if np.ma.isMaskedArray(arr) and nodata is not None:
+                arr = arr.filled(nodata)
+
+            src = [ArrayDataset(arr, crs=crs, transform=transform, nodata=nodata)]
+
+        elif arr is not None:
 
-            if file_path is None:
-                file_path = tempfile.NamedTemporaryFile().name
+            file_path, tfile = _file_path_tempfile(file_path)
 
             with rasterio.open(
                 fp=file_path,
@@ -299,14 +413,19 @@ class Raster(BaseRaster):
 
         src_layers = []
 
-        # initiated from file paths
+        # initiated from file paths, which are opened when they are first read
         if all(isinstance(x, str) for x in src):
-            for f in src:
-                r = rasterio.open(f, mode=mode)
-
+            for r in _open_datasets(src, mode=mode):
                 for i in range(r.count):
                     band = rasterio.band(r, i + 1)
-                    src_layers.append(RasterLayer(band))
+                    layer = RasterLayer(band)
+
+                    # variables of NetCDF files or Zarr groups are named after the
+                    # variable rather than the file
+                    if r.variable is not None:
+                        layer.names = [layer._make_name(r.variable)]
+
+                    src_layers.append(layer)
 
         # initiate from RasterLayer objects
         elif all(isinstance(x, RasterLayer) for x in src):
@@ -319,6 +438,12 @@ class Raster(BaseRaster):
                     band = rasterio.band(r, i + 1)
                     src_layers.append(RasterLayer(band))
 
+        # initiate from virtual datasets
+        elif all(_is_virtual(x) for x in src):
+            for r in src:
+                for i in r.indexes:
+                    src_layers.append(RasterLayer(rasterio.band(r, i)))
+
         # initiate from rasterio.band objects
         elif all(isinstance(x, rasterio.Band) for x in src):
             for band in src:
@@ -330,6 +455,16 @@ class Raster(BaseRaster):
                 "Cannot initiated a Raster from a list of different type " "objects"
             )
 
+        if tfile is not None:
+            for layer in src_layers:
+                tfile.attach(layer)
+
+        if align is True:
+            align = src_layers[0]
+
+        if align is not None and align is not False:
+            src_layers = self._align_layers(src_layers, align)
+
         # call property with a list of rasterio.band objects
         self._layers = src_layers
 
@@ -399,6 +534,9 @@ class Raster(BaseRaster):
         This is intended as a method of clearing temporary files that may have
         accumulated during an analysis session.
         """
+        if self._pool is not None:
+            self._pool.close()
+
         for layer in self.iloc:
             layer.close()
 
@@ -419,9 +557,15 @@ class Raster(BaseRaster):
             returns False.
         """
 
-        src_meta = []
-        for layer in layers:
-            src_meta.append(layer.ds.meta.copy())
+        src_meta = [
+            dict(
+                crs=layer.crs,
+                transform=layer.transform,
+                width=layer.width,
+                height=layer.height,
+            )
+            for layer in layers
+        ]
 
         if not all(i["crs"] == src_meta[0]["crs"] for i in src_meta):
             Warning(
@@ -441,6 +585,92 @@ class Raster(BaseRaster):
         else:
             return src_meta[0]
 
+    @staticmethod
+    def _align_layers(layers, reference, resampling="nearest"):
+        """Align a list of RasterLayers onto the grid of a reference.
+
+        Layers that are already on the reference grid are returned unchanged,
+        otherwise a new RasterLayer is created from a WarpedDataset that warps the
+        layer's dataset onto the grid when it is read.
+
+        Parameters
+        ----------
+        layers : list
+            List of pyspatialml.RasterLayer objects.
+
+        reference : Raster, RasterLayer or rasterio dataset
+            Object with the crs, transform, width and height of the reference grid.
+
+        resampling : str (default 'nearest')
+            Resampling method.
+
+        Returns
+        -------
+        list
+            List of pyspatialml.RasterLayer objects.
+        """
+        grid = (reference.crs, reference.transform, reference.width, reference.height)
+        warped = {}
+        aligned = []
+
+        for layer in layers:
+            if (layer.crs, layer.transform, layer.width, layer.height) == grid:
+                aligned.append(layer)
+                continue
+
+            # layers from the same dataset share the warped dataset
+            key = id(layer.ds)
+
+            if key not in warped:
+                warped[key] = WarpedDataset(layer.ds, *grid, resampling=resampling)
+
+            aligned.append(Raster._derived_layer(layer, warped[key]))
+
+        return aligned
+
+    @staticmethod
+    def _window_layers(layers, window):
+        """Create RasterLayers that are views of a window of a list of RasterLayers.
+
+        Parameters
+        ----------
+        layers : list
+            List of pyspatialml.RasterLayer objects.
+
+        window : rasterio.windows.Window
+            Window of the layers, which must be within their extent.
+
+        Returns
+        -------
+        list
+            List of pyspatialml.RasterLayer objects.
+        """
+        views = {}
+        windowed = []
+
+        for layer in layers:
+            key = id(layer.ds)
+
+            if key not in views:
+                views[key] = WindowDataset(layer.ds, window)
+
+            windowed.append(Raster._derived_layer(layer, views[key]))
+
+        return windowed
+
+    @staticmethod
+    def _derived_layer(layer, dataset):
+        """Create a RasterLayer from the band of a dataset that is derived from the
+        dataset of an existing layer, keeping the layer's name and display settings.
+        """
+        new_layer = RasterLayer(rasterio.band(dataset, layer.bidx))
+        new_layer.names = layer.names
+        new_layer.cmap = layer.cmap
+        new_layer.norm = layer.norm
+        new_layer.categorical = layer.categorical
+
+        return new_layer
+
     @staticmethod
     def _fix_names(combined_names):
         """Adjusts the names of pyspatialml.RasterLayer objects within the Raster when
@@ -466,16 +696,30 @@ class Raster(BaseRaster):
 
         counts = Counter(combined_names)
 
+        # current number of occurrences and positions of each name in the list
+        current = Counter(combined_names)
+        positions = {}
+
+        for i, name in enumerate(combined_names):
+            positions.setdefault(name, []).append(i)
+
         for s, num in counts.items():
             if num > 1:
                 for suffix in range(1, num + 1):
-                    if s + "_" + str(suffix) not in combined_names:
-                        combined_names[combined_names.index(s)] = s + "_" + str(suffix)
-                    else:
+                    new = s + "_" + str(suffix)
+
+                    if current[new] > 0:
                         i = 1
-                        while s + "_" + str(i) in combined_names:
+                        while current[s + "_" + str(i)] > 0:
                             i += 1
-                        combined_names[combined_names.index(s)] = s + "_" + str(i)
+                        new = s + "_" + str(i)
+
+                    # replace the first remaining occurrence of the name
+                    position = positions[s].pop(0)
+                    combined_names[position] = new
+                    current[s] -= 1
+                    current[new] += 1
+                    bisect.insort(positions.setdefault(new, []), position)
 
         return combined_names
 
@@ -577,7 +821,6 @@ class Raster(BaseRaster):
         self.nodatavals = []
 
         # update global Raster object attributes with new values
-        self.count = len(layers)
         self.width = meta["width"]
         self.height = meta["height"]
         self.shape = (self.height, self.width)
@@ -591,27 +834,60 @@ class Raster(BaseRaster):
         BoundingBox = namedtuple("BoundingBox", ["left", "bottom", "right", "top"])
         self.bounds = BoundingBox(bounds[0], bounds[1], bounds[2], bounds[3])
 
-        names = [i.names[0] for i in layers]
-        names = self._fix_names(names)
+        self._insert_layers(layers)
+
+    def _insert_layers(self, layers):
+        """Add RasterLayers to the end of the Raster without rebuilding the existing
+        layers.
+
+        Duplicated names are given a numbered suffix, which can also rename
+        existing layers.
+
+        Parameters
+        ----------
+        layers : list
+            List of pyspatialml.RasterLayer objects that are aligned with the
+            Raster.
+        """
+        existing = self.names
+        names = self._fix_names(existing + [layer.names[0] for layer in layers])
+
+        renamed = {
+            old: new for old, new in zip(existing, names[: len(existing)]) if old != new
+        }
+
+        if renamed:
+            self.rename(renamed)
 
         # update attributes per dataset
-        for layer, name in zip(layers, names):
+        for layer, name in zip(layers, names[len(existing):]):
             self.dtypes.append(layer.dtype)
             self.nodatavals.append(layer.nodata)
             self.files.append(layer.file)
             layer.names = [name]
             self.loc[name] = layer
-            setattr(self, name, self.loc[name])
 
+        self._update_meta()
+
+    def _update_meta(self):
+        self.count = len(self.loc)
         self.meta = dict(
             crs=self.crs,
             transform=self.transform,
             width=self.width,
             height=self.height,
             count=self.count,
-            dtype=np.find_common_type(self.dtypes, []),
+            dtype=np.result_type(*set(self.dtypes)) if self.dtypes else None,
         )
-    
+
+    def _copy(self):
+        """Copy of the Raster with RasterLayers that share the existing datasets.
+        """
+        raster = Raster([layer._copy() for layer in self.iloc])
+        raster.block_shape = self.block_shape
+
+        return raster
+
     def _check_supported_dtype(self, dtype):
         if dtype is None:
             dtype = self.meta["dtype"]
@@ -688,20 +964,44 @@ class Raster(BaseRaster):
         else:
             arr = np.zeros((self.count, height, width), dtype=dtype)
 
-        for i, layer in enumerate(self.iloc):
-            arr[i, :, :] = layer.read(
-                masked=masked,
-                window=window,
-                out_shape=out_shape,
-                resampling=resampling,
-                **kwargs
+        resampling_methods = [i.name for i in rasterio.enums.Resampling]
+
+        if resampling not in resampling_methods:
+            raise ValueError(
+                "Invalid resampling method."
+                + "Resampling method must be one of {0}:".format(resampling_methods)
             )
 
-            if masked is True:
-                arr[i, :, :] = np.ma.MaskedArray(
-                    data=arr[i, :, :], mask=np.isfinite(arr[i, :, :]).mask
+        # consecutive layers that are bands of the same dataset, such as a
+        # multi-band file or a VRT, and have the same data type are read using a
+        # single call
+        layers = list(self.iloc)
+        start = 0
+
+        while start < len(layers):
+            ds = layers[start].ds
+            stop = start + 1
+
+            while (
+                stop < len(layers)
+                and layers[stop].ds is ds
+                and layers[stop].dtype == layers[start].dtype
+            ):
+                stop += 1
+
+            # decimated reads use the closest level of the overviews of the dataset
+            with _overview_dataset(ds, out_shape or None, window) as src:
+                arr[start:stop, :, :] = src.read(
+                    indexes=[layer.bidx for layer in layers[start:stop]],
+                    masked=masked,
+                    window=window,
+                    out_shape=(stop - start, height, width) if out_shape else None,
+                    resampling=rasterio.enums.Resampling[resampling],
+                    **kwargs
                 )
 
+            start = stop
+
         if as_df is True:
             arr = arr.transpose(1, 2, 0) # rehape to rows, cols, bands
             arr_flat = arr.reshape((arr.shape[0] * arr.shape[1], arr.shape[2]))
@@ -739,7 +1039,9 @@ class Raster(BaseRaster):
         
         kwargs : opt
             Optional named arguments to pass to the format drivers. For example can be
-            `compress="deflate"` to add compression.
+            `compress="deflate"` to add compression, or `cog=True` to write a
+            cloud-optimized GeoTIFF with internal overviews that are calculated while
+            the result is written.
 
         Returns
         -------
@@ -750,23 +1052,81 @@ class Raster(BaseRaster):
         if nodata is None:
             nodata = _get_nodata(dtype)
 
-        meta = self.meta
+        # VRTs refer to the files of the RasterLayers instead of copying the data
+        if driver == "VRT":
+            return self._write_vrt(file_path, dtype, nodata)
+
+        meta = deepcopy(self.meta)
         meta["driver"] = driver
         meta["nodata"] = nodata
         meta["dtype"] = dtype
         meta.update(kwargs)
 
-        with rasterio.open(file_path, mode="w", **meta) as dst:
+        with _open_dataset(file_path, "w", **meta) as dst:
 
             for i, layer in enumerate(self.iloc):
                 arr = layer.read()
-                arr[arr == layer.nodata] = nodata
+                arr = np.where(arr == layer.nodata, nodata, arr)
                 dst.write(arr.astype(dtype), i + 1)
 
         raster = self._new_raster(file_path, self.names)
 
         return raster
 
+    def to_vrt(self, file_path=None):
+        """Stack the RasterLayers of the Raster into a single GDAL VRT.
+
+        The VRT refers to the files of the RasterLayers so that no data is copied,
+        and the RasterLayers of the returned Raster are bands of the same dataset.
+        Reading a window of the Raster then requires a single read of a
+        multi-band dataset rather than one read per RasterLayer, which allows
+        GDAL to use its block cache and multithreading for all of the files.
+
+        Parameters
+        ----------
+        file_path : str (optional, default None)
+            Path to save the VRT. If not specified then the VRT is created in
+            memory.
+
+        Returns
+        -------
+        Raster
+            Raster object that is backed by the VRT.
+
+        Notes
+        -----
+        All of the RasterLayers must be stored in files that GDAL can open, not in
+        virtual datasets. A VRT that is saved to a file remains valid only as long
+        as the files of the RasterLayers exist, which does not include temporary
+        files once the Python session ends.
+        """
+        return self._write_vrt(file_path)
+
+    def _write_vrt(self, file_path=None, dtype=None, nodata=None):
+        xml = _vrt_xml(list(self.iloc), dtype, nodata)
+        tfile = None
+
+        if file_path is None:
+            tfile = workspace.create(".vrt", in_memory=True)
+            file_path = tfile.name
+
+        with rasterio.open(xml) as src:
+            rasterio.shutil.copy(src, file_path, driver="VRT")
+
+        raster = self._new_raster(file_path, self.names)
+        raster.block_shape = self.block_shape
+
+        # temporary files that are referenced by the VRT are kept with its layers
+        sources = [layer._copy() for layer in self.iloc if layer._tempfile is not None]
+
+        for layer in raster.iloc:
+            layer._sources = sources
+
+            if tfile is not None:
+                tfile.attach(layer)
+
+        return raster
+
     def predict_proba(
         self,
         estimator,
@@ -777,6 +1137,7 @@ class Raster(BaseRaster):
         nodata=None,
         as_df=False,
         progress=False,
+        n_jobs=-1,
         **kwargs,
     ):
         """Apply class probability prediction of a scikit learn model to a Raster.
@@ -797,7 +1158,8 @@ class Raster(BaseRaster):
             be desired.
 
         driver : str (default 'GTiff')
-            Named of GDAL-supported driver for file export.
+            Named of GDAL-supported driver for file export. Use 'NPY' to write the
+            result to an uncompressed, memory-mapped .npy file.
 
         dtype : str (optional, default None)
             Optionally specify a GDAL compatible data type when saving to file. If not
@@ -815,9 +1177,15 @@ class Raster(BaseRaster):
         progress : bool (default False)
             Show progress bar for prediction.
 
+        n_jobs : int (default -1)
+            Number of threads that are used for the prediction. -1 is all cores;
+            -2 is all cores -1.
+
         kwargs : opt
             Optional named arguments to pass to the format drivers. For example can be
-            `compress="deflate"` to add compression.
+            `compress="deflate"` to add compression, or `cog=True` to write a
+            cloud-optimized GeoTIFF with internal overviews that are calculated while
+            the result is written.
 
         Returns
         -------
@@ -831,8 +1199,8 @@ class Raster(BaseRaster):
             of 1, 3, and 5 would result in three RasterLayers named prob_1, prob_2 and
             prob_3.
         """
-        file_path, tfile = _file_path_tempfile(file_path)
-        predfun = self._probfun
+        n_jobs = _get_num_workers(n_jobs)
+        predfun = partial(self._probfun, estimator=estimator)
 
         # determine output count
         if isinstance(indexes, int):
@@ -862,16 +1230,43 @@ class Raster(BaseRaster):
         meta.update(driver=driver, count=len(indexes), dtype=dtype, nodata=nodata)
         meta.update(kwargs)
 
-        with rasterio.open(file_path, "w", **meta) as dst:
+        file_path, tfile = _file_path_tempfile(file_path, meta)
+
+        with _open_dataset(file_path, "w", **meta) as dst, _borrowed(self.iloc):
             windows = [window for ij, window in dst.block_windows()]
 
-            # generator gets raster arrays for each window
-            data_gen = ((window, self.read(window=window, masked=True, as_df=as_df)) for window in windows)
+            # datasets such as Zarr stores are written to by the workers
+            concurrent_writes = _concurrent_writes(dst)
 
-            for window, arr, pbar in zip(windows, data_gen, tqdm(windows, disable=disable_tqdm)):
-                result = predfun(arr, estimator)
-                result = np.ma.filled(result, fill_value=nodata)
-                dst.write(result[indexes, :, :].astype(dtype), window=window)
+            if concurrent_writes:
+                # the prediction function also takes the window of the data
+                predfun = partial(
+                    _write_result, function=predfun, dst=dst, dtype=dtype,
+                    nodata=nodata, bands=indexes
+                )
+
+            # windows are read ahead by reader threads with their own datasets
+            n_readers = _num_readers(n_jobs, len(windows))
+
+            with _reader_rasters(self, n_readers) as rasters:
+                readers = [
+                    partial(_read_item, raster, as_df=as_df) for raster in rasters
+                ]
+
+                if concurrent_writes:
+                    readers = [partial(_with_window, read) for read in readers]
+
+                executor = _get_executor("threading", n_jobs)
+                pipeline = _pipeline(windows, predfun, readers, executor, n_jobs * 2)
+
+                with executor, closing(pipeline) as results:
+                    for window, result in tqdm(
+                        results, total=len(windows), disable=disable_tqdm
+                    ):
+                        if not concurrent_writes:
+                            result = np.ma.filled(result, fill_value=nodata)
+                            result = result[indexes, :, :].astype(dtype)
+                            dst.write(result, window=window)
 
         # generate layer names
         prefix = "prob_"
@@ -881,8 +1276,13 @@ class Raster(BaseRaster):
         new_raster = self._new_raster(file_path, names)
 
         if tfile is not None:
+            tfile.recompute = partial(
+                self.predict_proba, estimator, file_path, indexes, driver, dtype,
+                nodata, as_df, progress, n_jobs, **kwargs
+            )
+
             for layer in new_raster.iloc:
-                layer._close = tfile.close
+                tfile.attach(layer)
 
         return new_raster
 
@@ -914,7 +1314,8 @@ class Raster(BaseRaster):
             the output is written to a temporary file.
 
         driver : str (default 'GTiff')
-            Named of GDAL-supported driver for file export
+            Named of GDAL-supported driver for file export. Use 'NPY' to write the
+            result to an uncompressed, memory-mapped .npy file.
 
         dtype : str (optional, default None)
             Optionally specify a GDAL compatible data type when saving to file. If not
@@ -938,7 +1339,9 @@ class Raster(BaseRaster):
 
         kwargs : opt
             Optional named arguments to pass to the format drivers. For example can be
-            `compress="deflate"` to add compression.
+            `compress="deflate"` to add compression, or `cog=True` to write a
+            cloud-optimized GeoTIFF with internal overviews that are calculated while
+            the result is written.
 
         Returns
         -------
@@ -948,7 +1351,6 @@ class Raster(BaseRaster):
             RasterLayer, unless the model is multi-class or multi-target. Layers
             are named automatically as `pred_raw_n` with n = 1, 2, 3 ..n.
         """
-        file_path, tfile = _file_path_tempfile(file_path)
         n_jobs = _get_num_workers(n_jobs)
 
         # determine output count for multi output cases
@@ -981,16 +1383,47 @@ class Raster(BaseRaster):
         meta.update(driver=driver, count=len(indexes), dtype=dtype, nodata=nodata)
         meta.update(kwargs)
 
-        with rasterio.open(file_path, "w", **meta) as dst:
-            windows = [window for window in self.block_shapes(*self._block_shape)]
+        file_path, tfile = _file_path_tempfile(file_path, meta)
+
+        with _open_dataset(file_path, "w", **meta) as dst, _borrowed(self.iloc):
+            # datasets such as Zarr stores are written to by the workers, using
+            # windows that match the chunks of the store
+            concurrent_writes = _concurrent_writes(dst)
+
+            if concurrent_writes:
+                windows = [window for ij, window in dst.block_windows()]
+            else:
+                windows = [window for window in self.block_shapes(*self._block_shape)]
+
+            if concurrent_writes:
+                # the prediction function also takes the window of the data
+                predfun = partial(
+                    _write_result, function=predfun, dst=dst, dtype=dtype,
+                    nodata=nodata, bands=indexes
+                )
+
+            # windows are read ahead by reader threads with their own datasets
+            n_readers = _num_readers(n_jobs, len(windows))
 
-            # generator gets raster arrays for each window
-            data_gen = ((window, self.read(window=window, masked=True, as_df=as_df)) for window in windows)
+            with _reader_rasters(self, n_readers) as rasters:
+                readers = [
+                    partial(_read_item, raster, as_df=as_df) for raster in rasters
+                ]
 
-            with concurrent.futures.ThreadPoolExecutor(max_workers=n_jobs) as executor:
-                for window, result, pbar in zip(windows, executor.map(predfun, data_gen), tqdm(windows, disable=disable_tqdm)):
-                    result = np.ma.filled(result, fill_value=nodata)
-                    dst.write(result[indexes, :, :].astype(dtype), window=window)
+                if concurrent_writes:
+                    readers = [partial(_with_window, read) for read in readers]
+
+                executor = _get_executor("threading", n_jobs)
+                pipeline = _pipeline(windows, predfun, readers, executor, n_jobs * 2)
+
+                with executor, closing(pipeline) as results:
+                    for window, result in tqdm(
+                        results, total=len(windows), disable=disable_tqdm
+                    ):
+                        if not concurrent_writes:
+                            result = np.ma.filled(result, fill_value=nodata)
+                            result = result[indexes, :, :].astype(dtype)
+                            dst.write(result, window=window)
         
         # generate layer names
         prefix = "pred_raw_"
@@ -1000,11 +1433,63 @@ class Raster(BaseRaster):
         new_raster = self._new_raster(file_path, names)
 
         if tfile is not None:
+            tfile.recompute = partial(
+                self.predict, estimator, file_path, driver, dtype, nodata, as_df,
+                n_jobs, progress, **kwargs
+            )
+
             for layer in new_raster.iloc:
-                layer._close = tfile.close
+                tfile.attach(layer)
 
         return new_raster
 
+    def predict_window(
+        self, estimator, window=None, bounds=None, geometry=None, as_df=False
+    ):
+        """Apply prediction of a scikit learn model to a window, bounding box or
+        geometry of the Raster, returning the result as an in-memory array.
+
+        Unlike the predict method, the result is not written to a file. Only the
+        blocks of the datasets that intersect the window are read, and pixels that
+        are nodata or are outside of the geometry are not passed to the estimator.
+        The datasets are read using the handles that are pooled for the Raster,
+        which are shared with the asyncio methods, so that concurrent requests do
+        not each open the datasets.
+
+        Parameters
+        ----------
+        estimator : estimator object implementing 'fit'
+            The object to use to fit the data.
+
+        window : rasterio.window.Window (optional, default None)
+            Window of data to predict.
+
+        bounds : tuple (optional, default None)
+            Bounding box of the data to predict in the form of (xmin, ymin, xmax,
+            ymax).
+
+        geometry : shapely geometry or geopandas.GeoDataFrame (optional, default None)
+            Geometry of the data to predict. The result covers the bounding box of
+            the geometry, and pixels outside of the geometry are masked. Only one
+            of window, bounds or geometry can be specified. If none are specified
+            then the full extent of the Raster is predicted.
+
+        as_df : bool (default is False)
+            Whether to pass the data to the estimator as a pandas.DataFrame with
+            columns named by the RasterLayer names.
+
+        Returns
+        -------
+        numpy.ma.MaskedArray
+            3d masked array of the prediction with the dimensions in the order of
+            (target, row, column).
+        """
+        window, outside = self._request_window(window, bounds, geometry)
+        pool = _handle_pool(self, aio.options["max_workers"])
+
+        with pool.borrow() as raster:
+            return raster._predict_window(estimator, window, as_df, outside)
+
     def _predfun(self, img, estimator):
         """Prediction function for classification or regression response.
 
@@ -1169,106 +1654,287 @@ class Raster(BaseRaster):
 
         return result
 
-    def append(self, other, in_place=True):
-        """Method to add new RasterLayers to a Raster object.
-        
-        Note that this modifies the Raster object in-place by default.
-
-        Parameters
-        ----------
-        other : Raster object, or list of Raster objects
-            Object to append to the Raster.
-        
-        in_place : bool (default True)
-            Whether to change the Raster object in-place or leave original and return
-            a new Raster object.
+    def _request_window(self, window=None, bounds=None, geometry=None):
+        """Window of a request that is specified using either a window, bounds or a
+        geometry, or the full extent of the Raster if none are specified.
 
         Returns
         -------
-        pyspatialml.Raster
-            Returned only if `in_place` is True
+        tuple
+            The window, and a boolean array that is True for the pixels of the
+            window that are outside of the geometry, or None.
         """
+        if sum(x is not None for x in (window, bounds, geometry)) > 1:
+            raise ValueError(
+                "Arguments window, bounds and geometry are mutually exclusive"
+            )
 
-        if isinstance(other, Raster):
-            other = [other]
+        if geometry is not None:
+            return self._geometry_window(geometry)
 
-        for new_raster in other:
+        if bounds is not None:
+            return self._bounds_window(bounds), None
 
-            if not isinstance(new_raster, Raster):
-                raise AttributeError(new_raster + " is not a pyspatialml.Raster object")
+        if window is None:
+            return Window(0, 0, self.width, self.height), None
 
-            # check that other raster does not result in duplicated names
-            combined_names = self.names + new_raster.names
-            combined_names = self._fix_names(combined_names)
+        return window, None
 
-            # update layers and names
-            combined_layers = list(self.loc.values()) + list(new_raster.loc.values())
+    def _geometry_window(self, geometry):
+        """Window that covers a geometry, and a boolean array that is True for the
+        pixels of the window that are outside of the geometry.
+        """
+        if hasattr(geometry, "geometry"):
+            geometry = geometry.geometry.unary_union
+
+        window = self._bounds_window(geometry.bounds)
+        outside = rasterio.features.geometry_mask(
+            [geometry],
+            out_shape=(window.height, window.width),
+            transform=rasterio.windows.transform(window, self.transform),
+        )
 
-            for layer, name in zip(combined_layers, combined_names):
-                layer.names = [name]
+        return window, outside
 
-            if in_place is True:
-                self._layers = combined_layers
-            else:
-                new_raster = self._new_raster(self.files, self.names)
-                new_raster._layers = combined_layers
+    def _predict_window(self, estimator, window, as_df=False, outside=None):
+        """Prediction of a window of the Raster as a masked array.
 
-                return new_raster
+        Only the pixels that are not masked are passed to the estimator, so that
+        pixels that are nodata or are outside of a geometry are not predicted.
+        """
+        img = self.read(masked=True, window=window)
+        n_features, rows, cols = img.shape
 
-    def drop(self, labels, in_place=True):
-        """Drop individual RasterLayers from a Raster object
-        
-        Note that this modifies the Raster object in-place by default.
-        
-        Parameters
-        ---------
-        labels : single label or list-like
-            Index (int) or layer name to drop. Can be a single integer or label, or a
-            list of integers or labels.
-        
-        in_place : bool (default True)
-            Whether to change the Raster object in-place or leave original and return
-            a new Raster object.
+        invalid = np.ma.getmaskarray(img).any(axis=0)
 
-        Returns
-        -------
-        pyspatialml.Raster
-            Returned only if `in_place` is True
-        """
+        if outside is not None:
+            invalid |= outside
 
-        # convert single label to list
-        if isinstance(labels, (str, int)):
-            labels = [labels]
+        valid = ~invalid.ravel()
+        flat_pixels = img.data.reshape((n_features, rows * cols)).T[valid]
 
-        # numerical index based subsetting
-        if len([i for i in labels if isinstance(i, int)]) == len(labels):
+        if as_df is True:
+            flat_pixels = pd.DataFrame(flat_pixels, columns=self.names)
 
-            subset_layers = [
-                v for (i, v) in enumerate(list(self.loc.values())) if i not in labels
-            ]
+        n_outputs = estimator.n_outputs_
 
-        # str label based subsetting
-        elif len([i for i in labels if isinstance(i, str)]) == len(labels):
+        if flat_pixels.shape[0] == 0:
+            return np.ma.masked_all((n_outputs, rows, cols), dtype=np.float32)
 
-            subset_layers = [
-                v
-                for (i, v) in enumerate(list(self.loc.values()))
-                if self.names[i] not in labels
-            ]
+        result = estimator.predict(flat_pixels).reshape((-1, n_outputs))
 
-        else:
+        arr = np.ma.masked_all((rows * cols, n_outputs), dtype=result.dtype)
+        arr[valid] = result
+
+        return arr.T.reshape((n_outputs, rows, cols))
+
+    async def read_async(self, window=None, bounds=None, masked=False, **kwargs):
+        """Asyncio variant of the read method for a window or bounds.
+
+        The data is read in a thread pool that is shared by the asyncio methods,
+        using dataset handles that are pooled for each Raster, so that many
+        concurrent requests do not each open the datasets. The number of threads and
+        handles is set by `pyspatialml.aio.options["max_workers"]`.
+
+        Parameters
+        ----------
+        window : rasterio.window.Window (optional, default None)
+            Window of data to read.
+
+        bounds : tuple (optional, default None)
+            Bounding box of the data to read in the form of (xmin, ymin, xmax,
+            ymax). Mutually exclusive with window. If neither is specified then the
+            full extent of the Raster is read.
+
+        masked : bool (default False)
+            Read data into a masked array.
+
+        **kwargs : dict
+            Other arguments to pass to the read method.
+
+        Returns
+        -------
+        ndarray
+            Raster values in 3d ndarray with the dimensions in order of (band, row,
+            and column).
+        """
+        window, _ = self._request_window(window, bounds)
+
+        return await _run(
+            self, partial(Raster.read, masked=masked, window=window, **kwargs)
+        )
+
+    async def extract_xy_async(self, xys, return_array=False):
+        """Asyncio variant of the extract_xy method.
+
+        Parameters
+        ----------
+        xys : 2d array-like
+            x and y coordinates from which to sample the raster (n_samples, xys).
+
+        return_array : bool (opt), default=False
+            Whether to return the extracted pixel values as a numpy.ndarray rather
+            than a geopandas.GeoDataFrame.
+
+        Returns
+        -------
+        geopandas.GeoDataframe or numpy.ndarray
+            Extracted pixel values.
+        """
+        return await _run(
+            self, partial(Raster.extract_xy, xys=xys, return_array=return_array)
+        )
+
+    async def predict_async(
+        self, estimator, window=None, bounds=None, geometry=None, as_df=False
+    ):
+        """Asyncio variant of the predict_window method.
+
+        The reads and the prediction run in the thread pool that is shared by the
+        asyncio methods.
+
+        Parameters
+        ----------
+        estimator : estimator object implementing 'fit'
+            The object to use to fit the data.
+
+        window : rasterio.window.Window (optional, default None)
+            Window of data to predict.
+
+        bounds : tuple (optional, default None)
+            Bounding box of the data to predict in the form of (xmin, ymin, xmax,
+            ymax).
+
+        geometry : shapely geometry or geopandas.GeoDataFrame (optional, default None)
+            Geometry of the data to predict. Pixels outside of the geometry are
+            masked.
+
+        as_df : bool (default is False)
+            Whether to pass the data to the estimator as a pandas.DataFrame.
+
+        Returns
+        -------
+        numpy.ma.MaskedArray
+            3d masked array of the prediction with the dimensions in the order of
+            (target, row, column).
+        """
+        window, outside = self._request_window(window, bounds, geometry)
+
+        return await _run(
+            self,
+            partial(
+                Raster._predict_window, estimator=estimator, window=window,
+                as_df=as_df, outside=outside
+            )
+        )
+
+    def append(self, other, in_place=True):
+        """Method to add new RasterLayers to a Raster object.
+        
+        Note that this modifies the Raster object in-place by default.
+
+        Parameters
+        ----------
+        other : Raster object, or list of Raster objects
+            Object to append to the Raster.
+        
+        in_place : bool (default True)
+            Whether to change the Raster object in-place or leave original and return
+            a new Raster object.
+
+        Returns
+        -------
+        pyspatialml.Raster
+            Returned only if `in_place` is True
+        """
+
+        if isinstance(other, Raster):
+            other = [other]
+
+        if in_place is False:
+            new_raster = self._copy()
+            new_raster.append(other, in_place=True)
+
+            return new_raster
+
+        for new_raster in other:
+
+            if not isinstance(new_raster, Raster):
+                raise AttributeError(new_raster + " is not a pyspatialml.Raster object")
+
+            layers = [layer._copy() for layer in new_raster.iloc]
+
+            if self._check_alignment(list(self.iloc)[:1] + layers) is False:
+                raise ValueError(
+                    "Raster datasets do not all have the same dimensions or "
+                    "transform"
+                )
+
+            self._insert_layers(layers)
+
+    def drop(self, labels, in_place=True):
+        """Drop individual RasterLayers from a Raster object
+        
+        Note that this modifies the Raster object in-place by default.
+        
+        Parameters
+        ---------
+        labels : single label or list-like
+            Index (int) or layer name to drop. Can be a single integer or label, or a
+            list of integers or labels.
+        
+        in_place : bool (default True)
+            Whether to change the Raster object in-place or leave original and return
+            a new Raster object.
+
+        Returns
+        -------
+        pyspatialml.Raster
+            Returned only if `in_place` is True
+        """
+
+        # convert single label to list
+        if isinstance(labels, (str, int)):
+            labels = [labels]
+
+        # numerical index based subsetting
+        if len([i for i in labels if isinstance(i, int)]) == len(labels):
+
+            subset_layers = [
+                v for (i, v) in enumerate(list(self.loc.values())) if i not in labels
+            ]
+
+        # str label based subsetting
+        elif len([i for i in labels if isinstance(i, str)]) == len(labels):
+
+            subset_layers = [
+                v
+                for (i, v) in enumerate(list(self.loc.values()))
+                if self.names[i] not in labels
+            ]
+
+        else:
             raise ValueError(
                 "Cannot drop layers based on mixture of indexes and labels"
             )
 
-        if in_place is True:
-            self._layers = subset_layers
-        else:
-            new_raster = self._new_raster(self.files, self.names)
-            new_raster._layers = subset_layers
+        if in_place is False:
+            new_raster = self._copy()
+            new_raster.drop(labels, in_place=True)
 
             return new_raster
 
+        keep = set(id(layer) for layer in subset_layers)
+
+        for name, layer in list(self.loc.items()):
+            if id(layer) not in keep:
+                self.loc.pop(name)
+
+        self.dtypes = [layer.dtype for layer in subset_layers]
+        self.nodatavals = [layer.nodata for layer in subset_layers]
+        self.files = [layer.file for layer in subset_layers]
+        self._update_meta()
+
     def rename(self, names, in_place=True):
         """Rename a RasterLayer within the Raster object.
         
@@ -1289,23 +1955,18 @@ class Raster(BaseRaster):
             Returned only if `in_place` is True
         """
 
-        if in_place is True:
-            for old_name, new_name in names.items():
-                # change internal name of RasterLayer
-                self.loc[old_name].names = [new_name]
+        if in_place is False:
+            new_raster = self._copy()
+            new_raster.rename(names, in_place=True)
 
-                # change name of layer in stack
-                self.loc.rename(old_name, new_name)
-        else:
-            new_raster = self._new_raster(self.files, self.names)
-            for old_name, new_name in names.items():
-                # change internal name of RasterLayer
-                new_raster.loc[old_name].names = [new_name]
+            return new_raster
 
-                # change name of layer in stack
-                new_raster.loc.rename(old_name, new_name)
+        for old_name, new_name in names.items():
+            # change internal name of RasterLayer
+            self.loc[old_name].names = [new_name]
 
-            return new_raster
+        # change names of layers in stack
+        self.loc.rename(names)
 
     def plot(
         self,
@@ -1320,9 +1981,14 @@ class Raster(BaseRaster):
         fig_kwds=None,
         legend_kwds=None,
         subplots_kwds=None,
+        n_jobs=-1,
     ):
         """Plot a Raster object as a raster matrix
 
+        The decimated data of the RasterLayers is read in parallel and is cached, so
+        that plotting the Raster again with the same `out_shape` does not read the
+        data again unless the files have changed.
+
         Parameters
         ----------
         cmap : str (opt), default=None
@@ -1366,6 +2032,10 @@ class Raster(BaseRaster):
             subplot, and can include
             {left=None, bottom=None, right=None, top=None, wspace=None, hspace=None}.
 
+        n_jobs : int (default -1)
+            Number of threads that are used to read the RasterLayers. -1 is all
+            cores; -2 is all cores -1.
+
         Returns
         -------
         axs : numpy.ndarray
@@ -1430,14 +2100,13 @@ class Raster(BaseRaster):
             rows += 1
 
         fig, axs = plt.subplots(rows, cols, **fig_kwds)
+        thumbnails = self._thumbnails(out_shape, n_jobs)
 
         # axs.flat is an iterator over the row-order flattened axs array
-        for ax, n, cmap, norm, name in zip(
-            axs.flat, range(self.count), cmaps, norms, names
+        for ax, n, cmap, norm, name, arr in zip(
+            axs.flat, range(self.count), cmaps, norms, names, thumbnails
         ):
 
-            arr = self.iloc[n].read(masked=True, out_shape=out_shape)
-
             ax.set_title(name, fontsize=title_fontsize, y=1.00)
 
             im = ax.imshow(
@@ -1495,6 +2164,39 @@ class Raster(BaseRaster):
 
         return axs
 
+    def _thumbnails(self, out_shape, n_jobs=-1):
+        """Decimated masked arrays of each RasterLayer that are used for plotting.
+
+        The layers of different datasets are read in parallel by threads. Layers
+        that share a dataset are read by the same thread, because a dataset cannot
+        be read by several threads at the same time.
+
+        Returns
+        -------
+        list
+            List of 2d masked arrays.
+        """
+        groups = OrderedDict()
+
+        for layer in self.iloc:
+            groups.setdefault(id(layer.ds), []).append(layer)
+
+        def read_group(layers):
+            return [layer._thumbnail(out_shape) for layer in layers]
+
+        n_jobs = max(min(_get_num_workers(n_jobs), len(groups)), 1)
+
+        with _get_executor("threading", n_jobs) as executor:
+            results = list(executor.map(read_group, groups.values()))
+
+        thumbnails = {
+            id(layer): arr
+            for layers, arrs in zip(groups.values(), results)
+            for layer, arr in zip(layers, arrs)
+        }
+
+        return [thumbnails[id(layer)] for layer in self.iloc]
+
     def _new_raster(self, file_path, names=None):
         """Return a new Raster object
 
@@ -1529,6 +2231,7 @@ class Raster(BaseRaster):
 
         return raster
 
+    @cached("mask")
     def mask(
         self,
         shapes,
@@ -1580,14 +2283,15 @@ class Raster(BaseRaster):
         
         kwargs : opt
             Optional named arguments to pass to the format drivers. For example can be
-            `compress="deflate"` to add compression.
+            `compress="deflate"` to add compression, or `cog=True` to write a
+            cloud-optimized GeoTIFF with internal overviews that are calculated while
+            the result is written.
         """
 
         # some checks
         if invert is True:
             crop = False
 
-        file_path, tfile = _file_path_tempfile(file_path)
         meta = deepcopy(self.meta)
 
         dtype = self._check_supported_dtype(dtype)
@@ -1630,14 +2334,21 @@ class Raster(BaseRaster):
 
         masked_ndarrays = masked_ndarrays.filled(fill_value=nodata)
 
-        with rasterio.open(file_path, "w", **meta) as dst:
+        file_path, tfile = _file_path_tempfile(file_path, meta)
+
+        with _open_dataset(file_path, "w", **meta) as dst:
             dst.write(masked_ndarrays.astype(dtype))
 
         new_raster = self._new_raster(file_path, self.names)
 
         if tfile is not None:
+            tfile.recompute = partial(
+                self.mask, shapes, invert, crop, pad, file_path, driver, dtype,
+                nodata, **kwargs
+            )
+
             for layer in new_raster.iloc:
-                layer._close = tfile.close
+                tfile.attach(layer)
 
         return new_raster
 
@@ -1679,7 +2390,6 @@ class Raster(BaseRaster):
             Raster with layers that are masked based on a union of all masks in the
             suite of RasterLayers.
         """
-        file_path, tfile = _file_path_tempfile(file_path)
         meta = deepcopy(self.meta)
 
         dtype = self._check_supported_dtype(dtype)
@@ -1702,18 +2412,85 @@ class Raster(BaseRaster):
         meta["dtype"] = dtype
         meta.update(kwargs)
 
-        with rasterio.open(file_path, "w", **meta) as dst:
+        file_path, tfile = _file_path_tempfile(file_path, meta)
+
+        with _open_dataset(file_path, "w", **meta) as dst:
             dst.write(intersected_arr.astype(dtype))
 
         new_raster = self._new_raster(file_path, self.names)
 
         if tfile is not None:
+            tfile.recompute = partial(
+                self.intersect, file_path, driver, dtype, nodata, **kwargs
+            )
+
             for layer in new_raster.iloc:
-                layer._close = tfile.close
+                tfile.attach(layer)
 
         return new_raster
 
-    def crop(self, bounds, file_path=None, driver="GTiff", dtype=None, nodata=None, **kwargs):
+    def _bounds_window(self, bounds):
+        """Window of pixels that covers a bounding box, clipped to the extent of the
+        Raster.
+        """
+        # get row, col positions for bounds
+        xmin, ymin, xmax, ymax = bounds
+        rows, cols = rasterio.transform.rowcol(
+            transform=self.transform, xs=(xmin, xmax), ys=(ymin, ymax)
+        )
+
+        # create window covering the min/max rows and cols
+        window = Window(
+            col_off=min(cols),
+            row_off=min(rows),
+            width=max(cols) - min(cols),
+            height=max(rows) - min(rows),
+        )
+
+        return window.intersection(Window(0, 0, self.width, self.height))
+
+    def _view(self, window):
+        """Raster that is a view of a window of the Raster.
+        """
+        raster = Raster(self._window_layers(list(self.iloc), window))
+        raster.block_shape = self.block_shape
+
+        return raster
+
+    def sel(self, bounds):
+        """Select a spatial subset of the Raster as a view.
+
+        The view references the datasets of the Raster and reads are translated by
+        the offset of the window of pixels that covers the bounds, so no data is
+        read or written until the view is used. Views can be used like any other
+        Raster, for example with the predict, apply, extract and plot methods. Use
+        `raster.window[row_slice, col_slice]` to select a view using pixel
+        positions.
+
+        Parameters
+        ----------
+        bounds : tuple
+            A tuple containing the bounding box in the form of (xmin, ymin, xmax,
+            ymax).
+
+        Returns
+        -------
+        pyspatialml.Raster
+            Raster that is a view of the subset.
+        """
+        return self._view(self._bounds_window(bounds))
+
+    @cached("crop")
+    def crop(
+        self,
+        bounds,
+        file_path=None,
+        driver="GTiff",
+        dtype=None,
+        nodata=None,
+        view=False,
+        **kwargs,
+    ):
         """Crops a Raster object by the supplied bounds.
 
         Parameters
@@ -1740,7 +2517,14 @@ class Raster(BaseRaster):
             based on the minimum permissible value of the Raster's data type. Note that
             this does not change the pixel nodata values of the raster, it only changes
             the metadata of what value represents a nodata pixel.
-        
+
+        view : bool (default False)
+            Return a view of the window of pixels that covers the bounds instead of
+            writing the cropped data to a new file. The view references the
+            datasets of the existing Raster and reads are translated by the offset
+            of the window, so no data is copied. The file_path, driver, dtype,
+            nodata and kwargs arguments are ignored for views.
+
         kwargs : opt
             Optional named arguments to pass to the format drivers. For example can be
             `compress="deflate"` to add compression.
@@ -1751,61 +2535,58 @@ class Raster(BaseRaster):
             Raster cropped to new extent.
         """
 
-        file_path, tfile = _file_path_tempfile(file_path)
+        window = self._bounds_window(bounds)
+
+        if view is True:
+            return self._view(window)
+
         dtype = self._check_supported_dtype(dtype)
         if nodata is None:
             nodata = _get_nodata(dtype)
 
-        # get row, col positions for bounds
-        xmin, ymin, xmax, ymax = bounds
-        rows, cols = rasterio.transform.rowcol(
-            transform=self.transform, xs=(xmin, xmax), ys=(ymin, ymax)
-        )
-
-        # create window covering the min/max rows and cols
-        window = Window(
-            col_off=min(cols),
-            row_off=min(rows),
-            width=max(cols) - min(cols),
-            height=max(rows) - min(rows),
-        )
-        cropped_arr = self.read(masked=True, window=window)
-
-        # calculate the new transform
-        new_transform = rasterio.transform.from_bounds(
-            west=xmin, 
-            south=ymin, 
-            east=xmax, 
-            north=ymax, 
-            width=cropped_arr.shape[2], 
-            height=cropped_arr.shape[1]
-        )
+        # calculate the new transform from the window, which is clipped to the
+        # extent of the Raster and snapped to its pixels
+        new_transform = rasterio.windows.transform(window, self.transform)
 
         # update the destination meta
         meta = self.meta.copy()
         meta.update(
             transform=new_transform,
-            width=cropped_arr.shape[2], 
-            height=cropped_arr.shape[1],
+            width=window.width,
+            height=window.height,
             driver=driver,
             nodata=nodata,
             dtype=dtype
         )
         meta.update(kwargs)
 
-        cropped_arr = cropped_arr.filled(fill_value=nodata)
+        file_path, tfile = _file_path_tempfile(file_path, meta)
 
-        with rasterio.open(file_path, "w", **meta) as dst:
-            dst.write(cropped_arr.astype(dtype))
+        # copy the cropped data block-by-block
+        with _open_dataset(file_path, "w", **meta) as dst:
+            for block in _block_windows(window.height, window.width, self.block_shape):
+                src_window = Window(
+                    window.col_off + block.col_off,
+                    window.row_off + block.row_off,
+                    block.width,
+                    block.height,
+                )
+                arr = self.read(masked=True, window=src_window)
+                dst.write(arr.filled(fill_value=nodata).astype(dtype), window=block)
 
         new_raster = self._new_raster(file_path, self.names)
 
         if tfile is not None:
+            tfile.recompute = partial(
+                self.crop, bounds, file_path, driver, dtype, nodata, **kwargs
+            )
+
             for layer in new_raster.iloc:
-                layer._close = tfile.close
+                tfile.attach(layer)
 
         return new_raster
 
+    @cached("to_crs")
     def to_crs(
         self,
         crs,
@@ -1816,6 +2597,11 @@ class Raster(BaseRaster):
         n_jobs=1,
         warp_mem_lim=0,
         progress=False,
+        transform=None,
+        shape=None,
+        res=None,
+        tiled=False,
+        backend="threading",
         **kwargs,
     ):
         """Reprojects a Raster object to a different crs.
@@ -1853,7 +2639,9 @@ class Raster(BaseRaster):
             individual layers in the Raster.
 
         n_jobs : int (default 1)
-            The number of warp worker threads.
+            The number of warp worker threads. If `tiled=True` then this is the
+            number of workers that reproject tiles in parallel, and -1 uses all
+            cores.
 
         warp_mem_lim : int (default 0)
             The warp operation memory limit in MB. Larger values allow the warp
@@ -1864,6 +2652,31 @@ class Raster(BaseRaster):
         progress : bool (default False)
             Optionally show progress of transform operations.
 
+        transform : affine.Affine (optional, default None)
+            Transform of a target grid to reproject onto. Requires `shape` to also
+            be supplied.
+
+        shape : tuple (optional, default None)
+            Shape (rows, cols) of the target grid. If supplied without a transform
+            then the grid covers the extent of the Raster using these dimensions.
+
+        res : float or tuple (optional, default None)
+            Resolution of the target grid. The bounds of the grid are snapped to
+            multiples of the resolution so that reprojected rasters line up with
+            each other.
+
+        tiled : bool (default False)
+            Whether to reproject the Raster tile-by-tile. The target grid is split
+            into tiles and the window of source data covering each tile is read for
+            all of the layers at once before it is reprojected. Tiles are
+            distributed across `n_jobs` workers and written to the output as they
+            are completed. This is much faster for rasters with many layers than
+            reprojecting each layer separately.
+
+        backend : str (default 'threading')
+            Parallel backend used when `tiled=True`, either 'threading' or
+            'multiprocessing'.
+
         kwargs : opt
             Optional named arguments to pass to the format drivers. For example can be
             `compress="deflate"` to add compression.
@@ -1873,9 +2686,6 @@ class Raster(BaseRaster):
         pyspatialml.Raster
             Raster following reprojection.
         """
-
-        file_path, tfile = _file_path_tempfile(file_path)
-
         if nodata is None:
             nodata = _get_nodata(self.meta["dtype"])
 
@@ -1886,15 +2696,8 @@ class Raster(BaseRaster):
                 + "Resampling method must be one of {0}:".format(resampling_methods)
             )
 
-        dst_transform, dst_width, dst_height = calculate_default_transform(
-            src_crs=self.crs,
-            dst_crs=crs,
-            width=self.width,
-            height=self.height,
-            left=self.bounds.left,
-            right=self.bounds.right,
-            bottom=self.bounds.bottom,
-            top=self.bounds.top,
+        dst_transform, dst_width, dst_height = _target_grid(
+            self, crs, transform, shape, res
         )
 
         meta = deepcopy(self.meta)
@@ -1905,31 +2708,161 @@ class Raster(BaseRaster):
         meta["crs"] = crs
         meta.update(kwargs)
 
+        file_path, tfile = _file_path_tempfile(file_path, meta)
+
+        if tiled is True:
+            self._to_crs_tiled(
+                crs, resampling, file_path, driver, meta, n_jobs, backend, progress
+            )
+        else:
+            self._to_crs_layers(
+                resampling, file_path, driver, meta, n_jobs, warp_mem_lim, progress
+            )
+
+        new_raster = self._new_raster(file_path, self.names)
+
+        if tfile is not None:
+            tfile.recompute = partial(
+                self.to_crs, crs, resampling, file_path, driver, nodata, n_jobs,
+                warp_mem_lim, progress, transform, shape, res, tiled, backend,
+                **kwargs
+            )
+
+            for layer in new_raster.iloc:
+                tfile.attach(layer)
+
+        return new_raster
+
+    def _to_crs_layers(
+        self, resampling, file_path, driver, meta, n_jobs, warp_mem_lim, progress
+    ):
+        """Reprojects each layer of the Raster separately using GDAL's warper.
+        """
         if progress is True:
             t = tqdm(total=self.count)
 
         with rasterio.open(file_path, "w", driver=driver, **meta) as dst:
 
             for i, layer in enumerate(self.iloc):
+                if _is_virtual(layer.ds):
+                    # virtual datasets are not readable by gdal
+                    source = dict(
+                        source=layer.read(),
+                        src_transform=layer.transform,
+                        src_crs=layer.crs,
+                        src_nodata=layer.nodata,
+                    )
+                else:
+                    source = dict(source=rasterio.band(layer.ds, layer.bidx))
+
                 reproject(
-                    source=rasterio.band(layer.ds, layer.bidx),
                     destination=rasterio.band(dst, i + 1),
                     resampling=rasterio.enums.Resampling[resampling],
                     num_threads=n_jobs,
                     warp_mem_lim=warp_mem_lim,
+                    **source
                 )
 
                 if progress is True:
                     t.update()
 
-        new_raster = self._new_raster(file_path, self.names)
+    def _to_crs_tiled(
+        self, crs, resampling, file_path, driver, meta, n_jobs, backend, progress
+    ):
+        """Reprojects all of the layers of the Raster tile-by-tile in parallel.
+        """
+        n_jobs = _get_num_workers(n_jobs)
 
-        if tfile is not None:
-            for layer in new_raster.iloc:
-                layer._close = tfile.close
+        # square tiles that hold roughly 16 MB of source data for all layers
+        itemsize = np.dtype(meta["dtype"]).itemsize
+        size = int(np.sqrt(2 ** 24 / (self.count * itemsize)))
+        size = int(np.clip(size // 256 * 256, 256, 2048))
 
-        return new_raster
+        with rasterio.open(
+            file_path, "w", driver=driver, **meta
+        ) as dst, _borrowed(self.iloc):
+            tiles = _tile_windows(
+                self, crs, dst.transform, dst.width, dst.height, (size, size)
+            )
+            function = partial(
+                _warp_tile,
+                src_transform=self.transform,
+                src_crs=self.crs,
+                dst_transform=dst.transform,
+                dst_crs=dst.crs,
+                count=self.count,
+                dtype=meta["dtype"],
+                nodata=meta["nodata"],
+                resampling=resampling,
+            )
+
+            if backend == "multiprocessing":
+                # workers open the datasets and read their own source windows
+                executor = _get_executor(
+                    backend,
+                    n_jobs,
+                    initializer=_init_raster_worker,
+                    initargs=(_layer_sources(self), function, None, (), _read_tile),
+                )
+                n_readers = 1
+                worker_function = _apply_window
+            else:
+                # tiles are read ahead by reader threads with their own datasets
+                executor = _get_executor(backend, n_jobs)
+                n_readers = _num_readers(n_jobs, len(tiles))
+                worker_function = function
+
+            with _reader_rasters(self, n_readers) as rasters:
+                if backend == "multiprocessing":
+                    readers = None
+                else:
+                    readers = [partial(_read_tile, raster) for raster in rasters]
+
+                pipeline = _pipeline(
+                    tiles, worker_function, readers, executor, n_jobs * 2
+                )
+
+                with executor, closing(pipeline) as results:
+                    for (dst_window, _), result in tqdm(
+                        results, total=len(tiles), disable=not progress
+                    ):
+                        dst.write(result, window=dst_window)
 
+    def align(self, reference, resampling="nearest"):
+        """Align the RasterLayers onto the grid of a reference raster.
+
+        The alignment is lazy and no data is written. Each window of data that is
+        read from a misaligned layer is reprojected or resampled from the window
+        of the layer that covers it, similar to a GDAL WarpedVRT. Layers that are
+        already aligned with the reference are unchanged.
+
+        Parameters
+        ----------
+        reference : Raster, RasterLayer or rasterio dataset
+            Raster that defines the crs, transform and dimensions of the grid.
+
+        resampling : str (default 'nearest')
+            Resampling method to use. One of the methods in
+            rasterio.enums.Resampling, for example 'nearest', 'bilinear' or
+            'average'.
+
+        Returns
+        -------
+        pyspatialml.Raster
+            Raster with all of the layers aligned to the reference grid.
+        """
+        resampling_methods = [i.name for i in rasterio.enums.Resampling]
+        if resampling not in resampling_methods:
+            raise ValueError(
+                "Invalid resampling method."
+                + "Resampling method must be one of {0}:".format(resampling_methods)
+            )
+
+        layers = self._align_layers(list(self.iloc), reference, resampling)
+
+        return Raster(layers)
+
+    @cached("aggregate")
     def aggregate(
         self,
         out_shape,
@@ -1981,7 +2914,6 @@ class Raster(BaseRaster):
             Raster object aggregated to a new pixel size.
         """
 
-        file_path, tfile = _file_path_tempfile(file_path)
 
         rows, cols = out_shape
 
@@ -2012,14 +2944,21 @@ class Raster(BaseRaster):
         )
         meta.update(kwargs)
 
-        with rasterio.open(file_path, "w", **meta) as dst:
+        file_path, tfile = _file_path_tempfile(file_path, meta)
+
+        with _open_dataset(file_path, "w", **meta) as dst:
             dst.write(arr.astype(dtype))
 
         new_raster = self._new_raster(file_path, self.names)
 
         if tfile is not None:
+            tfile.recompute = partial(
+                self.aggregate, out_shape, resampling, file_path, driver, dtype,
+                nodata, **kwargs
+            )
+
             for layer in new_raster.iloc:
-                layer._close = tfile.close
+                tfile.attach(layer)
 
         return new_raster
 
@@ -2032,6 +2971,10 @@ class Raster(BaseRaster):
         nodata=None,
         progress=False,
         n_jobs=-1,
+        backend="threading",
+        count=None,
+        initializer=None,
+        initargs=(),
         **kwargs,
     ):
         """Apply user-supplied function to a Raster object.
@@ -2039,7 +2982,10 @@ class Raster(BaseRaster):
         Parameters
         ----------
         function : function
-            Function that takes an numpy array as a single argument.
+            Function that takes an numpy array as a single argument. If
+            `backend='multiprocessing'` then the function needs to be picklable,
+            i.e. defined at the top level of a module rather than a lambda or a
+            nested function.
 
         file_path : str (optional, default None)
             Optional path to save calculated Raster object. If not specified then a
@@ -2060,12 +3006,35 @@ class Raster(BaseRaster):
         n_jobs : int (default -1)
             Number of processing cores to use for parallel execution. Default of -1 is all cores.
 
+        backend : str (default 'threading')
+            Parallel backend to use, either 'threading' or 'multiprocessing'. The
+            'threading' backend reads the windows of data in advance using reader
+            threads with their own dataset handles, while the main thread writes
+            the results, and is suitable for functions that release the GIL, such
+            as most numpy operations. The 'multiprocessing' backend opens the datasets within each
+            worker process, which read their own windows of data, and is suitable
+            for functions that are dominated by pure-Python code.
+
+        count : int (optional, default None)
+            Number of layers that are returned by the function. If not specified
+            then this is determined by running the function on a small window of
+            data. Supplying the count avoids this test calculation.
+
+        initializer : callable (optional, default None)
+            Function that is called once when each worker is started, for example
+            to load expensive state such as lookup tables.
+
+        initargs : tuple (default ())
+            Arguments to pass to the initializer.
+
         progress : bool (default False)
             Optionally show progress of transform operations.
 
         kwargs : opt
             Optional named arguments to pass to the format drivers. For example can be
-            `compress="deflate"` to add compression.
+            `compress="deflate"` to add compression, or `cog=True` to write a
+            cloud-optimized GeoTIFF with internal overviews that are calculated while
+            the result is written.
 
         Returns
         -------
@@ -2073,59 +3042,285 @@ class Raster(BaseRaster):
             Raster containing the calculated result.
         """
 
-        file_path, tfile = _file_path_tempfile(file_path)
         n_jobs = _get_num_workers(n_jobs)
 
-        # perform test calculation determine dimensions, dtype, nodata
-        window = Window(0, 0, self.width, 1)
-        img = self.read(masked=True, window=window)
-        arr = function(img)
+        # perform test calculation determine dimensions
+        if count is None:
+            if initializer is not None:
+                initializer(*initargs)
 
-        if np.ndim(arr) > 2:
-            indexes = np.arange(1, arr.shape[0] + 1)
-            count = len(indexes)
-        else:
-            indexes = 1
-            count = 1
+            window = Window(0, 0, min(self.width, self._block_shape[1]), 1)
+            img = self.read(masked=True, window=window)
+            arr = function(img)
+
+            if np.ndim(arr) > 2:
+                count = arr.shape[0]
+            else:
+                count = 1
 
         dtype = self._check_supported_dtype(dtype)
         if nodata is None:
             nodata = _get_nodata(dtype)
 
+        if progress is True:
+            disable_tqdm = False
+        else:
+            disable_tqdm = True
+
         # open output file with updated metadata
         meta = deepcopy(self.meta)
         meta.update(driver=driver, count=count, dtype=dtype, nodata=nodata)
         meta.update(kwargs)
 
-        with rasterio.open(file_path, "w", **meta) as dst:
+        file_path, tfile = _file_path_tempfile(file_path, meta)
+
+        with _open_dataset(file_path, "w", **meta) as dst, _borrowed(self.iloc):
 
             # define windows
             windows = [window for ij, window in dst.block_windows()]
 
-            # generator gets raster arrays for each window
-            data_gen = (self.read(window=window, masked=True) for window in windows)
+            # datasets such as Zarr stores are written to by the workers
+            concurrent_writes = _concurrent_writes(dst)
+
+            if backend == "multiprocessing":
+                # workers open the datasets and read their own windows
+                layers = _layer_sources(self)
+                writer = (dst, dtype, nodata) if concurrent_writes else None
+                executor = _get_executor(
+                    backend,
+                    n_jobs,
+                    initializer=_init_raster_worker,
+                    initargs=(layers, function, initializer, initargs, None, writer),
+                )
+                n_readers = 1
+                worker_function = _apply_window
+            else:
+                # windows are read ahead by reader threads with their own datasets
+                executor = _get_executor(backend, n_jobs, initializer, initargs)
+                n_readers = _num_readers(n_jobs, len(windows))
+
+                if concurrent_writes:
+                    worker_function = partial(
+                        _write_result, function=function, dst=dst, dtype=dtype,
+                        nodata=nodata
+                    )
+                else:
+                    worker_function = function
 
-            with concurrent.futures.ThreadPoolExecutor(max_workers=n_jobs) as executor:
-                if progress is True:
-                    for window, result, pbar in zip(
-                        windows, executor.map(function, data_gen), tqdm(windows)
+            with _reader_rasters(self, n_readers) as rasters:
+                if backend == "multiprocessing":
+                    readers = None
+                elif concurrent_writes:
+                    readers = [partial(_read_item, raster) for raster in rasters]
+                else:
+                    readers = [partial(_read_window, raster) for raster in rasters]
+
+                pipeline = _pipeline(
+                    windows, worker_function, readers, executor, n_jobs * 2
+                )
+
+                with executor, closing(pipeline) as results:
+                    for window, result in tqdm(
+                        results, total=len(windows), disable=disable_tqdm
                     ):
+                        if not concurrent_writes:
+                            _write_window(dst, window, result, dtype, nodata)
 
-                        result = np.ma.filled(result, fill_value=nodata)
-                        dst.write(result.astype(dtype), window=window, indexes=indexes)
+        new_raster = self._new_raster(file_path)
+
+        if tfile is not None:
+            tfile.recompute = partial(
+                self.apply, function, file_path, driver, dtype, nodata, progress,
+                n_jobs, backend, count, initializer, initargs, **kwargs
+            )
+
+            for layer in new_raster.iloc:
+                tfile.attach(layer)
+
+        return new_raster
+
+    def focal(
+        self,
+        function,
+        size=3,
+        halo=None,
+        file_path=None,
+        driver="GTiff",
+        dtype=None,
+        nodata=None,
+        progress=False,
+        n_jobs=-1,
+        backend="threading",
+        count=None,
+        **kwargs,
+    ):
+        """Apply a focal (moving window) operation to a Raster object.
+
+        Windows of data are read with a halo of surrounding pixels so that the
+        results do not contain artefacts at the edges of the windows. Only the
+        interior of each window is written to the output.
+
+        Parameters
+        ----------
+        function : str, numpy.ndarray or function
+            The focal operation to apply. Can be the name of a focal statistic that
+            is calculated separately for each RasterLayer, one of 'mean', 'sum',
+            'min', 'max', 'std' or 'median'. Nodata pixels are ignored when
+            calculating the statistics. Alternatively a 2d numpy.ndarray can be
+            supplied as a kernel to convolve each RasterLayer with. Otherwise, a
+            function that takes a 3d masked array (band, rows, cols) of data that
+            includes the halo, and returns a 2d or 3d array with the same number of
+            rows and cols, such as a slope calculation.
+
+        size : int or tuple (default 3)
+            Size of the neighbourhood in (rows, cols) used by the named focal
+            statistics. Ignored if `function` is a kernel.
+
+        halo : int or tuple (optional, default None)
+            Number of (rows, cols) of surrounding pixels that are read with each
+            window. If not specified then the halo is half of the size of the
+            neighbourhood or of the kernel.
+
+        file_path : str (optional, default None)
+            Optional path to save calculated Raster object. If not specified then a
+            tempfile is used.
+
+        driver : str (default 'GTiff')
+            Named of GDAL-supported driver for file export. Use 'NPY' to write the
+            result to an uncompressed, memory-mapped .npy file.
+
+        dtype : str (optional, default None)
+            Optionally specify a numpy compatible data type when saving to file. If
+            not specified then np.float32 is used.
+
+        nodata : any number (optional, default None)
+            Nodata value for new dataset. If not specified then a nodata value is set
+            based on the minimum permissible value of the data type.
+
+        progress : bool (default False)
+            Optionally show progress of the focal operation.
+
+        n_jobs : int (default -1)
+            Number of processing cores to use for parallel execution. Default of -1
+            is all cores.
+
+        backend : str (default 'threading')
+            Parallel backend to use, either 'threading' or 'multiprocessing'. See
+            `Raster.apply`.
+
+        count : int (optional, default None)
+            Number of layers returned by a user-supplied function. If not specified
+            then this is determined by a test calculation on the first window.
+
+        kwargs : opt
+            Optional named arguments to pass to the format drivers. For example can be
+            `compress="deflate"` to add compression.
+
+        Returns
+        -------
+        pyspatialml.Raster
+            Raster containing the result of the focal operation.
+        """
+
+        # some checks
+        if isinstance(size, int):
+            size = (size, size)
+
+        if isinstance(function, str):
+            if function not in focal_kernels.keys():
+                raise ValueError(
+                    "function must be one of {0}".format(list(focal_kernels.keys()))
+                )
+            count = self.count
+            names = ["_".join([name, function]) for name in self.names]
+
+        elif isinstance(function, np.ndarray):
+            size = function.shape
+            count = self.count
+            names = ["_".join([name, "convolve"]) for name in self.names]
+
+        else:
+            names = None
+
+        if halo is None:
+            halo = (size[0] // 2, size[1] // 2)
+        elif isinstance(halo, int):
+            halo = (halo, halo)
+
+        n_jobs = _get_num_workers(n_jobs)
+        worker_function = partial(_focal, function=function, size=size, halo=halo)
+        reader = partial(_read_halo, halo=halo)
+
+        windows = [window for window in self.block_shapes(*self._block_shape)]
+
+        # perform test calculation on the first window to determine dimensions
+        if count is None:
+            count = worker_function(reader(self, windows[0])).shape[0]
+
+        indexes = np.arange(1, count + 1)
+
+        if dtype is None:
+            dtype = np.float32
+
+        dtype = self._check_supported_dtype(dtype)
+        if nodata is None:
+            nodata = _get_nodata(dtype)
+
+        if progress is True:
+            disable_tqdm = False
+        else:
+            disable_tqdm = True
+
+        # open output file with updated metadata
+        meta = deepcopy(self.meta)
+        meta.update(driver=driver, count=count, dtype=dtype, nodata=nodata)
+        meta.update(kwargs)
+
+        file_path, tfile = _file_path_tempfile(file_path, meta)
+
+        with _open_dataset(file_path, "w", **meta) as dst, _borrowed(self.iloc):
+
+            if backend == "multiprocessing":
+                layers = _layer_sources(self)
+                executor = _get_executor(
+                    backend,
+                    n_jobs,
+                    initializer=_init_raster_worker,
+                    initargs=(layers, worker_function, None, (), reader),
+                )
+                n_readers = 1
+                task = _apply_window
+            else:
+                # windows are read ahead by reader threads with their own datasets
+                executor = _get_executor(backend, n_jobs)
+                n_readers = _num_readers(n_jobs, len(windows))
+                task = worker_function
+
+            with _reader_rasters(self, n_readers) as rasters:
+                if backend == "multiprocessing":
+                    readers = None
                 else:
-                    for window, result in zip(
-                        windows, executor.map(function, data_gen)
-                    ):
+                    readers = [partial(reader, raster) for raster in rasters]
 
+                pipeline = _pipeline(windows, task, readers, executor, n_jobs * 2)
+
+                with executor, closing(pipeline) as results:
+                    for window, result in tqdm(
+                        results, total=len(windows), disable=disable_tqdm
+                    ):
                         result = np.ma.filled(result, fill_value=nodata)
                         dst.write(result.astype(dtype), window=window, indexes=indexes)
 
-        new_raster = self._new_raster(file_path)
+        new_raster = self._new_raster(file_path, names)
 
         if tfile is not None:
+            tfile.recompute = partial(
+                self.focal, function, size, halo, file_path, driver, dtype, nodata,
+                progress, n_jobs, backend, count, **kwargs
+            )
+
             for layer in new_raster.iloc:
-                layer._close = tfile.close
+                tfile.attach(layer)
 
         return new_raster
 
@@ -1,3 +1,7 @@
+import math
+import threading
+from contextlib import closing
+from copy import copy
 from functools import partial
 
 import matplotlib.pyplot as plt
@@ -8,12 +12,232 @@ from rasterio.features import sieve
 from rasterio.fill import fillnodata
 from rasterio.windows import Window
 from scipy import ndimage
+from scipy.spatial import cKDTree
 
 import pyspatialml.base
 
-from .utils import _get_nodata
+from .backends import (
+    ArrayDataset,
+    LazyDataset,
+    _dataset_file,
+    _open_dataset,
+    _output_driver,
+)
+from .overviews import _identity, _overview_dataset
+from .parallel import (
+    _get_executor,
+    _num_readers,
+    _pipeline,
+    _read_layers,
+    _reader_rasters,
+)
+from .utils import (
+    _block_windows,
+    _expand_window,
+    _get_nodata,
+    _get_num_workers,
+    _read_halo,
+    _slice_halo,
+)
 from .plotting import discrete_cmap
-from .temporary_files import _file_path_tempfile
+from .temporary_files import (
+    _borrowed,
+    _file_path_tempfile,
+    _in_memory,
+    _meta_nbytes,
+)
+
+
+def _mask_nodata(arr, nodata):
+    """Mask the nodata values of an array, or the invalid values if the nodata value
+    is not set.
+    """
+    if nodata is not None:
+        return np.ma.masked_equal(arr, nodata)
+
+    return np.ma.masked_invalid(arr)
+
+
+def _fill_tile(arr, mask, inside, max_search_distance, smoothing_iterations):
+    """Fill a tile of data that includes its halo.
+    """
+    if mask is None:
+        mask = ~np.ma.getmaskarray(arr)
+
+    return rasterio.fill.fillnodata(
+        image=arr.data,
+        mask=mask,
+        max_search_distance=max_search_distance,
+        smoothing_iterations=smoothing_iterations,
+    )
+
+
+def _sieve_tile(arr, mask, inside, size, connectivity):
+    """Sieve a tile of data that includes its halo. Parts of the halo that are
+    outside of the raster are excluded from the sieving.
+    """
+    if mask is not None:
+        inside = inside & (mask != 0)
+
+    return sieve(source=arr.data, size=size, mask=inside, connectivity=connectivity)
+
+
+def _pixel_sampling(layer, units):
+    """Size of the pixels in (rows, cols) for distance calculations.
+
+    For map units in a geographic crs the size of the pixels is approximated in
+    metres at the latitude of the centre of the layer, so that the same sampling
+    is used for every tile.
+    """
+    if units == "pixels":
+        return 1.0, 1.0
+
+    xres, yres = abs(layer.transform.a), abs(layer.transform.e)
+
+    if layer.crs is not None and layer.crs.is_geographic:
+        _, lat = layer.transform * (0, layer.height / 2)
+        lat = np.deg2rad(np.clip(lat, -89.9, 89.9))
+        xres = xres * 111320 * np.cos(lat)
+        yres = yres * 110574
+
+    return yres, xres
+
+
+def _distance_tile(
+    read_features, shape, window, sampling, max_distance=None, nearest_feature=None
+):
+    """Exact euclidean distances to features for a window.
+
+    The window is expanded by an overlap and the distance transform of the
+    expanded window is calculated. If `max_distance` is specified then the overlap
+    is `max_distance`. Otherwise the overlap is the size of the window, and the
+    distances of the pixels that are further from a feature than from the edge of
+    the overlap are replaced using `nearest_feature`.
+
+    Parameters
+    ----------
+    read_features : function
+        Function that takes a window and returns a 2d boolean array that is True
+        for feature pixels.
+
+    shape : tuple
+        Shape of the raster in (rows, cols).
+
+    window : rasterio.windows.Window
+        The window to calculate the distances for.
+
+    sampling : tuple
+        Size of the pixels in (rows, cols).
+
+    max_distance : any number (opt)
+        Maximum distance to calculate.
+
+    nearest_feature : function (opt)
+        Function that takes arrays of the row and column indices of pixels and the
+        sampling, and returns the distances of the pixels to the nearest feature
+        of the raster. Required if `max_distance` is None and the window does not
+        cover the raster.
+
+    Returns
+    -------
+    numpy.ma.MaskedArray
+        2d masked array of distances for the window. Pixels without a feature
+        within `max_distance` are masked.
+    """
+    height, width = shape
+    row_res, col_res = sampling
+    rows, cols = int(window.height), int(window.width)
+
+    if max_distance is not None:
+        halo = (
+            int(math.ceil(max_distance / row_res)),
+            int(math.ceil(max_distance / col_res)),
+        )
+    else:
+        halo = (rows, cols)
+
+    expanded, _ = _expand_window(window, halo, height, width)
+    features = read_features(expanded)
+
+    if features.any():
+        dist = ndimage.distance_transform_edt(~features, sampling=sampling)
+    else:
+        dist = np.full(features.shape, np.inf)
+
+    row_start = int(window.row_off - expanded.row_off)
+    col_start = int(window.col_off - expanded.col_off)
+    dist = dist[row_start : row_start + rows, col_start : col_start + cols]
+
+    if max_distance is not None:
+        return np.ma.masked_where(~(dist <= max_distance), dist)
+
+    # distance from each pixel to the nearest pixel outside of the expanded window
+    row_idx = np.arange(row_start, row_start + rows)[:, np.newaxis]
+    col_idx = np.arange(col_start, col_start + cols)[np.newaxis, :]
+    gap = np.full((rows, cols), np.inf)
+
+    if expanded.row_off > 0:
+        gap = np.minimum(gap, (row_idx + 1) * row_res)
+    if expanded.row_off + expanded.height < height:
+        gap = np.minimum(gap, (expanded.height - row_idx) * row_res)
+    if expanded.col_off > 0:
+        gap = np.minimum(gap, (col_idx + 1) * col_res)
+    if expanded.col_off + expanded.width < width:
+        gap = np.minimum(gap, (expanded.width - col_idx) * col_res)
+
+    # a feature outside of the expanded window can be nearer to these pixels
+    outside = dist > gap
+
+    if outside.any():
+        out_rows, out_cols = np.nonzero(outside)
+        dist[outside] = nearest_feature(
+            out_rows + int(window.row_off), out_cols + int(window.col_off), sampling
+        )
+
+    return np.ma.masked_invalid(dist)
+
+
+def _read_features(layer, window):
+    """Boolean array that is True for the pixels of a window of a RasterLayer that
+    are not nodata.
+    """
+    arr = layer.read(window=window, masked=True)
+    return ~np.ma.getmaskarray(arr)
+
+
+def _feature_edges(read_features, shape, block_shape):
+    """Row and column indices of the feature pixels that have a 4-connected
+    neighbour which is not a feature.
+
+    The nearest feature to any pixel of a raster is always one of these pixels,
+    because a feature pixel whose neighbours are all features has a neighbour that
+    is nearer.
+
+    Returns
+    -------
+    ndarray
+        Array of (n, 2) row and column indices.
+    """
+    height, width = shape
+    edges = []
+
+    for window in _block_windows(height, width, block_shape):
+        expanded, pad = _expand_window(window, (1, 1), height, width)
+        features = np.pad(read_features(expanded), pad, constant_values=True)
+
+        interior = (
+            features[1:-1, 1:-1]
+            & features[:-2, 1:-1]
+            & features[2:, 1:-1]
+            & features[1:-1, :-2]
+            & features[1:-1, 2:]
+        )
+        rows, cols = np.nonzero(features[1:-1, 1:-1] & ~interior)
+        edges.append(
+            np.column_stack([rows + int(window.row_off), cols + int(window.col_off)])
+        )
+
+    return np.concatenate(edges)
 
 
 class RasterLayer(pyspatialml.base.BaseRaster):
@@ -74,25 +298,89 @@ class RasterLayer(pyspatialml.base.BaseRaster):
 
         # rasterlayer specific attributes
         self.bidx = band.bidx
-        self.dtype = band.dtype
+        self.dtype = band.ds.dtypes[band.bidx - 1]
         self.nodata = band.ds.nodata
-        self.file = band.ds.files[0]
-        self.ds = band.ds
+        self.file = _dataset_file(band.ds)
+        self._ds = band.ds
+        self._tempfile = None
+        # layers whose files are referenced by the dataset, such as the sources of
+        # a VRT, which are kept for as long as the layer exists
+        self._sources = []
+        # decimated arrays of the layer that are used for plotting
+        self._thumbnails = {}
         self.driver = band.ds.meta["driver"]
         self.meta = band.ds.meta
         self.cmap = "viridis"
         self.norm = None
         self.categorical = False
-        self.names = [self._make_name(band.ds.files[0])]
+        self.names = [self._make_name(self.file)]
         self.count = 1
         self._close = band.ds.close
-    
+
+    @property
+    def ds(self):
+        """The underlying dataset of the RasterLayer. Temporary files that were
+        evicted from the workspace are recomputed, and lazily opened datasets are
+        opened, when the dataset is accessed.
+        """
+        if self._tempfile is not None:
+            if self._tempfile.evicted:
+                self._tempfile.restore()
+
+            self._tempfile.workspace.touch(self._tempfile)
+
+        # datasets are opened when they are first used
+        if isinstance(self._ds, LazyDataset):
+            self._ds = self._ds.open()
+
+        return self._ds
+
+    @ds.setter
+    def ds(self, value):
+        self._ds = value
+
     def close(self):
-        """Close the RasterLayer for reading/writing
+        """Close the RasterLayer for reading/writing. Temporary files are removed
+        once all of the RasterLayers that use them are closed.
+        """
+        self._close()
+
+    def _copy(self):
+        """Copy of the RasterLayer that shares the underlying dataset, so that no
+        files are reopened. Closing the copy does not close the shared dataset,
+        but temporary files are kept until the copy is also closed.
+        """
+        layer = copy(self)
+        layer.names = list(self.names)
+        layer._close = lambda: None
+
+        if self._tempfile is not None:
+            self._tempfile.attach(layer)
+
+        return layer
+
+    def _thumbnail(self, out_shape):
+        """Decimated masked array of the layer that is used for plotting.
+
+        Thumbnails are cached for each shape. They are read again if the file of
+        the layer changes or the dataset of the layer is replaced, for example when
+        an evicted temporary file is recomputed.
         """
-        self._close
+        ds = self.ds
+        version = (id(ds), _identity(self.file))
+        key = (tuple(out_shape),) + version
+
+        if key not in self._thumbnails:
+            arr = self.read(masked=True, out_shape=tuple(out_shape))
+
+            for stale in [k for k in self._thumbnails if k[1:] != version]:
+                self._thumbnails.pop(stale, None)
+
+            self._thumbnails[key] = arr
 
-    def _arith(self, function, other=None):
+        return self._thumbnails[key].copy()
+
+    def _arith(self, function, other=None, file_path=None):
         """General method for performing arithmetic operations on RasterLayer objects
 
         Parameters
@@ -107,14 +395,17 @@ class RasterLayer(pyspatialml.base.BaseRaster):
             then a `function` should be supplied that takes to ndarrays as arguments
             and performs a calculation using both layers, i.e. layer1 - layer2.
 
+        file_path : str (optional, default None)
+            File path to save the result. If not supplied then the result is written
+            to a temporary file.
+
         Returns
         -------
         pyspatialml.RasterLayer
             Returns a single RasterLayer containing the calculated result.
         """
 
-        _, tfile = _file_path_tempfile(None)
-        driver = self.driver
+        driver = _output_driver(self.ds)
 
         # determine dtype of result based on calc on single pixel
         if other is not None:
@@ -133,39 +424,55 @@ class RasterLayer(pyspatialml.base.BaseRaster):
         nodata = _get_nodata(dtype)
 
         # open output file with updated metadata
-        meta = self.meta
+        meta = self.meta.copy()
         meta.update(driver=driver, count=1, dtype=dtype, nodata=nodata)
+        file_path, tfile = _file_path_tempfile(file_path, meta)
+
+        def calculate(arrs):
+            if isinstance(other, RasterLayer):
+                result = function(*arrs)
+            elif other is not None:
+                result = function(arrs[0], other)
+            else:
+                result = function(arrs[0])
 
-        with rasterio.open(tfile.name, "w", **meta) as dst:
+            return np.ma.filled(result, fill_value=nodata).astype(dtype)
+
+        # the layers are read by each reader thread using its own datasets
+        if isinstance(other, RasterLayer):
+            stack = pyspatialml.Raster([self._copy(), other._copy()])
+        else:
+            stack = pyspatialml.Raster([self._copy()])
+
+        with _open_dataset(file_path, "w", **meta) as dst, _borrowed(stack.iloc):
 
             # define windows
             windows = [window for ij, window in dst.block_windows()]
 
-            # generator gets raster arrays for each window
-            self_gen = (self.read(window=w, masked=True) for w in windows)
-
-            if isinstance(other, RasterLayer):
-                other_gen = (other.read(window=w, masked=True) for w in windows)
-            else:
-                other_gen = (other for w in windows)
+            n_jobs = _get_num_workers(-1)
+            n_readers = _num_readers(n_jobs, len(windows))
 
-            for window, arr1, arr2 in zip(windows, self_gen, other_gen):
+            with _reader_rasters(stack, n_readers) as rasters:
+                readers = [partial(_read_layers, raster) for raster in rasters]
+                executor = _get_executor("threading", n_jobs)
+                pipeline = _pipeline(windows, calculate, readers, executor, n_jobs * 2)
 
-                if other is not None:
-                    result = function(arr1, arr2)
-                else:
-                    result = function(arr1)
+                with executor, closing(pipeline) as results:
+                    for window, result in results:
+                        dst.write(result, window=window, indexes=1)
 
-                result = np.ma.filled(result, fill_value=nodata)
-                dst.write(result.astype(dtype), window=window, indexes=1)
+        # the copies of the layers do not close the shared datasets
+        stack.close()
 
         # create RasterLayer from result
-        src = rasterio.open(tfile.name)
+        src = _open_dataset(file_path)
         band = rasterio.band(src, 1)
         layer = pyspatialml.RasterLayer(band)
 
-        # overwrite close attribute with close method from temporaryfilewrapper
-        layer.close = tfile.close
+        # remove the temporary file when the layer is closed
+        if tfile is not None:
+            tfile.recompute = partial(self._arith, function, other, file_path)
+            tfile.attach(layer)
 
         return layer
 
@@ -341,15 +648,19 @@ class RasterLayer(pyspatialml.base.BaseRaster):
 
             kwargs["resampling"] = rasterio.enums.Resampling[kwargs["resampling"]]
 
+        # decimated reads use the closest level of the overviews of the dataset
+        if kwargs.get("out_shape") is not None:
+            with _overview_dataset(
+                self.ds, kwargs["out_shape"], kwargs.get("window")
+            ) as ds:
+                return ds.read(indexes=self.bidx, **kwargs)
+
         return self.ds.read(indexes=self.bidx, **kwargs)
 
     def _write(self, arr, file_path=None, driver="GTiff", dtype=None, nodata=None, **kwargs):
         """Internal function to write processed results to a file, usually a tempfile
         """
 
-        # generate a file path to a temporary file is file_path is None
-        file_path, tfile = _file_path_tempfile(file_path)
-
         if dtype is None:
             dtype = self.dtype
 
@@ -363,22 +674,32 @@ class RasterLayer(pyspatialml.base.BaseRaster):
         meta.update(kwargs)
 
         # mask any nodata values
-        arr = np.ma.masked_equal(arr, self.nodata)
+        arr = _mask_nodata(arr, self.nodata)
         
         # replace masked values with the user-specified nodata value
         arr = arr.filled(fill_value=nodata)
 
+        # small temporary results are kept in memory
+        if file_path is None and driver != "NPY" and _in_memory(_meta_nbytes(meta)):
+            dataset = ArrayDataset(
+                arr.astype(dtype), meta["crs"], meta["transform"], nodata
+            )
+            return pyspatialml.RasterLayer(rasterio.band(dataset, 1))
+
+        # generate a file path to a temporary file is file_path is None
+        file_path, tfile = _file_path_tempfile(file_path, meta)
+
         # write to file
-        with rasterio.open(file_path, mode="w", **meta) as dst:
+        with _open_dataset(file_path, "w", **meta) as dst:
             dst.write(arr.astype(dtype), 1)
 
-        src = rasterio.open(file_path)
+        src = _open_dataset(file_path)
         band = rasterio.band(src, 1)
         layer = pyspatialml.RasterLayer(band)
 
-        # override RasterLayer close method if temp file is used
+        # remove the temporary file when the layer is closed
         if tfile is not None:
-            layer.close = tfile.close
+            tfile.attach(layer)
 
         return layer
 
@@ -413,6 +734,113 @@ class RasterLayer(pyspatialml.base.BaseRaster):
         layer = self._write(arr, file_path, driver, dtype, nodata, **kwargs)
         return layer
 
+    def _write_tiles(
+        self,
+        function,
+        halo,
+        mask,
+        block_shape,
+        n_jobs,
+        file_path=None,
+        driver="GTiff",
+        dtype=None,
+        nodata=None,
+        **kwargs
+    ):
+        """Internal function to process a RasterLayer in overlapping tiles and write
+        the interior of each processed tile to a file, usually a tempfile.
+
+        Parameters
+        ----------
+        function : function
+            Function that takes a 2d masked array of a tile including its halo, a 2d
+            mask array for the tile (or None), and a 2d boolean array that is False
+            for the parts of the halo that are outside of the raster, and returns a
+            2d array of the same shape.
+
+        halo : int
+            Number of pixels of overlap that are read on each side of the tiles.
+
+        mask : numpy.ndarray (optional)
+            Mask array covering the whole RasterLayer, which is tiled in the same
+            way as the data.
+
+        block_shape : tuple
+            Shape of the tiles in (rows, cols).
+
+        n_jobs : int
+            Number of tiles to process in parallel.
+        """
+        n_jobs = _get_num_workers(n_jobs)
+
+        if dtype is None:
+            dtype = self.dtype
+
+        if nodata is None:
+            nodata = _get_nodata(dtype)
+
+        meta = self.ds.meta
+        meta["driver"] = driver
+        meta["nodata"] = nodata
+        meta["dtype"] = dtype
+        meta["count"] = 1
+        meta.update(kwargs)
+        file_path, tfile = _file_path_tempfile(file_path, meta)
+
+        windows = list(_block_windows(self.height, self.width, block_shape))
+
+        def read_tile(raster, window):
+            arr = _read_halo(raster.iloc[0], window, halo)
+            expanded, pad = _expand_window(window, (halo, halo), *self.shape)
+            inside = np.pad(
+                np.ones((expanded.height, expanded.width), dtype=bool),
+                pad,
+                mode="constant",
+            )
+
+            if mask is not None:
+                mask_tile = _slice_halo(mask, window, halo)
+            else:
+                mask_tile = None
+
+            return arr, mask_tile, inside
+
+        def process(tile):
+            return function(*tile)
+
+        # the layer is read by each reader thread using its own datasets
+        stack = pyspatialml.Raster([self._copy()])
+
+        with _open_dataset(file_path, "w", **meta) as dst, _borrowed(stack.iloc):
+            n_readers = _num_readers(n_jobs, len(windows))
+
+            with _reader_rasters(stack, n_readers) as rasters:
+                readers = [partial(read_tile, raster) for raster in rasters]
+                executor = _get_executor("threading", n_jobs)
+                pipeline = _pipeline(windows, process, readers, executor, n_jobs * 2)
+
+                with executor, closing(pipeline) as results:
+                    for window, arr in results:
+                        arr = arr[
+                            halo : halo + int(window.height),
+                            halo : halo + int(window.width),
+                        ]
+                        arr = _mask_nodata(arr, self.nodata)
+                        arr = arr.filled(fill_value=nodata)
+                        dst.write(arr.astype(dtype), window=window, indexes=1)
+
+        stack.close()
+
+        src = _open_dataset(file_path)
+        band = rasterio.band(src, 1)
+        layer = pyspatialml.RasterLayer(band)
+
+        # remove the temporary file when the layer is closed
+        if tfile is not None:
+            tfile.attach(layer)
+
+        return layer
+
     def fill(
         self,
         mask=None,
@@ -422,12 +850,19 @@ class RasterLayer(pyspatialml.base.BaseRaster):
         driver="GTiff",
         dtype=None,
         nodata=None,
+        block_shape=None,
+        n_jobs=-1,
         **kwargs
     ):
         """Fill nodata gaps in a RasterLayer
 
         Thin wrapper around the rasterio.fill.fillnodata method.
 
+        If `block_shape` is specified then the RasterLayer is filled in tiles that
+        overlap by `max_search_distance` pixels (plus the number of smoothing
+        iterations), so that the whole RasterLayer does not need to be read into
+        memory.
+
         Parameters
         ----------
         mask : numpy.ndarray (optional, default None)
@@ -456,6 +891,13 @@ class RasterLayer(pyspatialml.base.BaseRaster):
             Optionally specify a numpy compatible data type when saving to file. If not
             specified, a data type is set based on the data type of the RasterLayer.
 
+        block_shape : tuple (optional, default None)
+            Shape of the tiles in (rows, cols) used to process the RasterLayer. If not
+            specified then the whole RasterLayer is filled in a single operation.
+
+        n_jobs : int (default -1)
+            Number of tiles to process in parallel. Ignored if `block_shape` is None.
+
         kwargs : opt
             Optional named arguments to pass to the format drivers. For example can be
             `compress="deflate"` to add compression.
@@ -466,9 +908,23 @@ class RasterLayer(pyspatialml.base.BaseRaster):
             Filled RasterLayer
         """
 
-        arr = rasterio.fill.fillnodata(
-            image=self.read(masked=True),
-            mask=mask,
+        if block_shape is not None:
+            function = partial(
+                _fill_tile,
+                max_search_distance=max_search_distance,
+                smoothing_iterations=smoothing_iterations,
+            )
+            halo = int(math.ceil(max_search_distance)) + smoothing_iterations
+            layer = self._write_tiles(
+                function, halo, mask, block_shape, n_jobs, file_path, driver, dtype,
+                nodata, **kwargs
+            )
+            return layer
+
+        arr = _fill_tile(
+            self.read(masked=True),
+            mask,
+            None,
             max_search_distance=max_search_distance,
             smoothing_iterations=smoothing_iterations,
         )
@@ -486,12 +942,23 @@ class RasterLayer(pyspatialml.base.BaseRaster):
         driver="GTiff",
         nodata=None,
         dtype=None,
+        block_shape=None,
+        n_jobs=-1,
         **kwargs,
     ):
         """Replace pixels with their largest neighbor
 
         Thin wrapper around the rasterio.features.sieve method.
 
+        If `block_shape` is specified then the RasterLayer is sieved in tiles that
+        overlap by `size` pixels, so that the whole RasterLayer does not need to be
+        read into memory. Any feature that is smaller than `size` and that touches
+        the interior of a tile is contained within the overlap, so the same
+        features are removed as when sieving the whole RasterLayer. However, the
+        neighbour that a removed feature is merged into can differ close to the
+        tile edges if the size of the neighbouring features are truncated by the
+        overlap.
+
         Parameters
         ----------
         size : integer (default 2)
@@ -519,6 +986,13 @@ class RasterLayer(pyspatialml.base.BaseRaster):
             Optionally specify a numpy compatible data type when saving to file. If not
             specified, a data type is set based on the data type of the RasterLayer.
 
+        block_shape : tuple (optional, default None)
+            Shape of the tiles in (rows, cols) used to process the RasterLayer. If not
+            specified then the whole RasterLayer is sieved in a single operation.
+
+        n_jobs : int (default -1)
+            Number of tiles to process in parallel. Ignored if `block_shape` is None.
+
         kwargs : opt
             Optional named arguments to pass to the format drivers. For example can be
             `compress="deflate"` to add compression.
@@ -528,6 +1002,14 @@ class RasterLayer(pyspatialml.base.BaseRaster):
         pyspatialml.RasterLayer
             Filled RasterLayer
         """
+        if block_shape is not None:
+            function = partial(_sieve_tile, size=size, connectivity=connectivity)
+            layer = self._write_tiles(
+                function, size, mask, block_shape, n_jobs, file_path, driver, dtype,
+                nodata, **kwargs
+            )
+            return layer
+
         arr = sieve(
             source=self.read(masked=True),
             size=size,
@@ -539,9 +1021,31 @@ class RasterLayer(pyspatialml.base.BaseRaster):
 
         return layer
 
-    def distance(self, file_path=None, driver="GTiff", nodata=None, **kwargs):
+    def distance(
+        self,
+        file_path=None,
+        driver="GTiff",
+        nodata=None,
+        dtype=None,
+        units="pixels",
+        max_distance=None,
+        block_shape=None,
+        n_jobs=-1,
+        **kwargs
+    ):
         """Calculate euclidean grid distances to non-NaN pixels
 
+        The distances are calculated using an exact euclidean distance transform.
+        If `block_shape` is specified then the distances are calculated in tiles
+        that are processed in parallel and written as they are completed, so that
+        the whole RasterLayer does not need to be held in memory. If `max_distance`
+        is also specified then each tile is read with an overlap of
+        `max_distance`. Otherwise, each tile is read with an overlap of the size of
+        the tile, and pixels that are further from a non-NaN pixel than from the
+        edge of the overlap use the distance to the nearest non-NaN pixel on the
+        edges of the features of the whole RasterLayer, which are collected in a
+        first pass over the tiles when they are first needed.
+
         Parameters
         ----------
         file_path : str (optional, default None)
@@ -554,7 +1058,31 @@ class RasterLayer(pyspatialml.base.BaseRaster):
         nodata : any number (optional, default None)
             Nodata value for new dataset. If not specified then a nodata value is set
             based on the minimum permissible value of the Raster's data type.
-        
+
+        dtype : str (optional, default None)
+            Optionally specify a numpy compatible data type when saving to file. If
+            not specified then np.float64 is used.
+
+        units : str (default 'pixels')
+            Units of the distances, either 'pixels' for grid distances, or 'map'
+            to use the resolution of the RasterLayer. For rasters in a projected
+            crs, 'map' distances are in the units of the crs. For rasters in a
+            geographic crs, 'map' distances are approximated in metres based on the
+            latitude of the centre of the RasterLayer, whether or not it is
+            processed in tiles.
+
+        max_distance : any number (optional, default None)
+            Maximum distance to calculate, in the same units as `units`. Pixels that
+            are further than `max_distance` from a non-NaN pixel are set to nodata.
+
+        block_shape : tuple (optional, default None)
+            Shape of the tiles in (rows, cols) used to process the RasterLayer. If not
+            specified then the distances are calculated for the whole RasterLayer in
+            a single operation.
+
+        n_jobs : int (default -1)
+            Number of tiles to process in parallel. Ignored if `block_shape` is None.
+
         kwargs : opt
             Optional named arguments to pass to the format drivers. For example can be
             `compress="deflate"` to add compression.
@@ -563,12 +1091,98 @@ class RasterLayer(pyspatialml.base.BaseRaster):
         -------
         pyspatialml.RasterLayer
             Grid distance raster
+
+        Notes
+        -----
+        The features are the pixels that are not nodata, whatever their value.
+        Versions before tiling was added calculated the distances to the pixels
+        with a value of 1, which gives the same result for rasters that only
+        contain 1 and nodata.
+
+        Without `max_distance`, the edges of the features are kept in memory, as
+        two coordinates per edge pixel, when any tile needs them.
         """
-        arr = self.read(masked=True)
-        arr = ndimage.distance_transform_edt(1 - arr)
-        dtype = arr.dtype
+        if units not in ["pixels", "map"]:
+            raise ValueError("units must be one of 'pixels' or 'map'")
 
-        layer = self._write(arr, file_path, driver, dtype, nodata, **kwargs)
+        if block_shape is None:
+            block_shape = self.shape
+
+        n_jobs = _get_num_workers(n_jobs)
+
+        if dtype is None:
+            dtype = np.float64
+
+        if nodata is None:
+            nodata = _get_nodata(dtype)
+
+        meta = self.ds.meta
+        meta["driver"] = driver
+        meta["nodata"] = nodata
+        meta["dtype"] = dtype
+        meta["count"] = 1
+        meta.update(kwargs)
+        file_path, tfile = _file_path_tempfile(file_path, meta)
+
+        windows = list(_block_windows(self.height, self.width, block_shape))
+        edges = {}
+        edges_lock = threading.Lock()
+
+        def nearest_feature(read_features, rows, cols, sampling):
+            with edges_lock:
+                if "tree" not in edges:
+                    indices = _feature_edges(read_features, self.shape, block_shape)
+                    edges["tree"] = None
+
+                    if len(indices) > 0:
+                        edges["tree"] = cKDTree(indices * sampling)
+
+                tree = edges["tree"]
+
+            if tree is None:
+                return np.inf
+
+            dist, _ = tree.query(np.column_stack([rows, cols]) * sampling)
+            return dist
+
+        sampling = _pixel_sampling(self, units)
+
+        def read_tile(raster, window):
+            return partial(_read_features, raster.iloc[0]), window
+
+        def process(tile):
+            read_features, window = tile
+            return _distance_tile(
+                read_features, self.shape, window, sampling, max_distance,
+                partial(nearest_feature, read_features)
+            )
+
+        # the layer is read by each reader thread using its own datasets, and the
+        # distances are calculated by the reader threads, because tiles that need
+        # the edges of the features read further windows
+        stack = pyspatialml.Raster([self._copy()])
+
+        with _open_dataset(file_path, "w", **meta) as dst, _borrowed(stack.iloc):
+            n_readers = min(n_jobs, len(windows))
+
+            with _reader_rasters(stack, n_readers) as rasters:
+                readers = [partial(read_tile, raster) for raster in rasters]
+                pipeline = _pipeline(windows, process, readers, None, n_jobs * 2)
+
+                with closing(pipeline) as results:
+                    for window, arr in results:
+                        arr = arr.filled(fill_value=nodata)
+                        dst.write(arr.astype(dtype), window=window, indexes=1)
+
+        stack.close()
+
+        src = _open_dataset(file_path)
+        band = rasterio.band(src, 1)
+        layer = pyspatialml.RasterLayer(band)
+
+        # remove the temporary file when the layer is closed
+        if tfile is not None:
+            tfile.attach(layer)
 
         return layer
 
@@ -1,32 +1,371 @@
-import tempfile
+import atexit
+import errno
 import os
+import shutil
+import tempfile
+import threading
+import uuid
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+import rasterio.shutil
+
+# Options for temporary results:
+#   memory_threshold : results that are smaller than this size in bytes are kept in
+#       memory instead of being written to a temporary file. Set to 0 to always use
+#       temporary files.
+#   tempdir : directory used for temporary files. Defaults to the system's temporary
+#       directory.
+#   quota : maximum size in bytes of the temporary files. When the quota would be
+#       exceeded, the least recently used temporary files that can be recomputed are
+#       removed, otherwise an OSError is raised. Defaults to no limit.
+options = {"memory_threshold": 2 ** 26, "tempdir": None, "quota": None}
+
 
-class TempRasterLayer:
-    """Create a NamedTemporaryFile like object on Windows that has a close
-    method
+class TempFile:
+    """Temporary file that is managed by the workspace.
 
-    Workaround used on Windows which cannot open the file a second time
+    The file is removed when all of the RasterLayers that are attached to it are
+    closed or garbage collected. Temporary files that have a `recompute` function
+    can be evicted by the workspace to free space, in which case the result is
+    recomputed and the attached layers are reopened when they are next accessed.
+    Files that are borrowed by an operation that is reading them are not evicted.
+
+    Parameters
+    ----------
+    workspace : Workspace
+        The workspace that manages the file.
+
+    name : str
+        Path to the file.
+
+    in_memory : bool
+        Whether the file is stored in GDAL's /vsimem/ virtual file system.
+
+    size_hint : int
+        Expected size of the file in bytes.
     """
 
-    def __init__(self):
-        self.tfile = tempfile.NamedTemporaryFile().name
-        self.name = self.tfile
+    def __init__(self, workspace, name, in_memory=False, size_hint=0):
+        self.workspace = workspace
+        self.name = name
+        self.in_memory = in_memory
+        self.size_hint = size_hint
+        self.recompute = None
+        self.evicted = False
+        self.closed = False
+        self.borrows = 0
+        self._refs = set()
+        self._layers = weakref.WeakSet()
+
+    def __repr__(self):
+        return "<TempFile name='{0}' refs={1}>".format(self.name, len(self._refs))
+
+    @property
+    def files(self):
+        """List of the files that belong to the temporary file, including sidecar
+        files.
+        """
+        return [
+            self.name, self.name + ".json", self.name + ".aux.xml", self.name + ".ovr"
+        ]
+
+    @property
+    def nbytes(self):
+        """Size of the temporary file on disk in bytes.
+        """
+        if self.in_memory or self.closed:
+            return 0
+
+        return sum(_path_size(f) for f in self.files if os.path.exists(f))
+
+    def attach(self, layer):
+        """Attach a RasterLayer to the temporary file. The file is removed once all
+        of the attached layers are closed or garbage collected.
+        """
+        key = id(layer)
+        self._refs.add(key)
+        self._layers.add(layer)
+        layer._tempfile = self
+        layer._close = lambda: self.release(key)
+        weakref.finalize(layer, self.release, key)
+
+    def release(self, key):
+        """Release the reference of a RasterLayer and remove the file if it was the
+        last reference.
+        """
+        with self.workspace.lock:
+            self._refs.discard(key)
+
+            if not self._refs:
+                self.close()
+
+    def evict(self):
+        """Remove the file to free space, closing the datasets of the attached
+        layers.
+        """
+        for layer in self._layers:
+            layer._ds.close()
+
+        self._remove()
+        self.evicted = True
+
+    def restore(self):
+        """Recompute an evicted file and reopen the datasets of the attached layers.
+        """
+        from .backends import _open_dataset
+
+        with self.workspace.lock:
+            if not self.evicted:
+                return
+
+            self.workspace._reserve(self.size_hint, exclude=self)
+            self.recompute()
+            self.evicted = False
+            src = _open_dataset(self.name)
+
+            for layer in self._layers:
+                layer._ds = src
 
     def close(self):
-        os.unlink(self.tfile)
+        """Remove the file and stop managing it.
+        """
+        if not self.closed:
+            self._remove()
+            self.closed = True
+            self.workspace._discard(self)
+
+    def _remove(self):
+        for file_path in self.files:
+            if self.in_memory:
+                if rasterio.shutil.exists(file_path):
+                    rasterio.shutil.delete(file_path)
+            elif os.path.isdir(file_path):
+                shutil.rmtree(file_path, ignore_errors=True)
+
+            elif os.path.exists(file_path):
+                try:
+                    os.unlink(file_path)
+                except OSError:
+                    pass
 
 
-def _file_path_tempfile(file_path):
-    """Returns a TemporaryFileWrapper and file path if a file_path parameter is None
+class Workspace:
+    """Manages the temporary files that are created for the results of
+    calculations.
+
+    Temporary files are created in `options["tempdir"]` and the total size of the
+    files is limited to `options["quota"]` bytes. Files are tracked in least
+    recently used order so that files which can be recomputed are evicted first
+    when the quota would be exceeded. All remaining files are removed when the
+    Python interpreter exits.
     """
-    if file_path is None:
-        if os.name != "nt":
-            tfile = tempfile.NamedTemporaryFile()
-            file_path = tfile.name
-        else:
-            tfile = TempRasterLayer()
-            file_path = tfile.name
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self._files = OrderedDict()
+
+    def __repr__(self):
+        usage = self.usage()
+        return "<Workspace directory='{0}' files={1} nbytes={2} quota={3}>".format(
+            usage["directory"], usage["files"], usage["nbytes"], usage["quota"]
+        )
+
+    @property
+    def directory(self):
+        """Directory used for temporary files.
+        """
+        directory = options["tempdir"]
+
+        if directory is None:
+            return tempfile.gettempdir()
+
+        os.makedirs(directory, exist_ok=True)
+        return directory
+
+    def create(self, suffix="", nbytes=0, in_memory=False):
+        """Create a new temporary file.
+
+        Parameters
+        ----------
+        suffix : str
+            File extension of the temporary file.
+
+        nbytes : int
+            Expected size of the file in bytes, which is checked against the quota.
+
+        in_memory : bool
+            Whether to create the file in GDAL's /vsimem/ virtual file system.
+
+        Returns
+        -------
+        TempFile
+        """
+        with self.lock:
+            if in_memory:
+                name = "/vsimem/pyspatialml/" + uuid.uuid4().hex + suffix
+            else:
+                self._reserve(nbytes)
+                fd, name = tempfile.mkstemp(suffix=suffix, dir=self.directory)
+                os.close(fd)
+
+            tfile = TempFile(self, name, in_memory, nbytes)
+            self._files[name] = tfile
+
+        return tfile
+
+    def touch(self, tfile):
+        """Mark a temporary file as recently used.
+        """
+        with self.lock:
+            if tfile.name in self._files:
+                self._files.move_to_end(tfile.name)
+
+    def usage(self):
+        """Report the current usage of the workspace.
+
+        Returns
+        -------
+        dict
+            Dict containing the directory, the number of temporary files, the total
+            size of the files on disk in bytes, the quota, the number of files that
+            can be recomputed, and the number of evicted files.
+        """
+        with self.lock:
+            files = list(self._files.values())
+
+            return {
+                "directory": self.directory,
+                "files": len(files),
+                "nbytes": sum(f.nbytes for f in files),
+                "quota": options["quota"],
+                "recomputable": sum(f.recompute is not None for f in files),
+                "evicted": sum(f.evicted for f in files),
+            }
+
+    def cleanup(self):
+        """Remove all of the temporary files.
+        """
+        with self.lock:
+            for tfile in list(self._files.values()):
+                tfile.close()
+
+    def _discard(self, tfile):
+        with self.lock:
+            self._files.pop(tfile.name, None)
+
+    def _reserve(self, nbytes, exclude=None):
+        """Evict least recently used files that can be recomputed until `nbytes`
+        can be written within the quota.
+        """
+        quota = options["quota"]
+
+        if quota is None:
+            return
+
+        files = list(self._files.values())
+        used = sum(f.nbytes for f in files)
+
+        for tfile in files:
+            if used + nbytes <= quota:
+                break
+
+            if tfile.recompute is None or tfile.evicted or tfile.in_memory:
+                continue
+
+            # files that are being read are not evicted
+            if tfile is exclude or tfile.borrows > 0:
+                continue
+
+            used -= tfile.nbytes
+            tfile.evict()
+
+        if used + nbytes > quota:
+            raise OSError(
+                errno.ENOSPC,
+                "Temporary file quota of {0} bytes would be exceeded by writing {1} "
+                "bytes with {2} bytes already in use".format(quota, nbytes, used),
+            )
+
+
+workspace = Workspace()
+atexit.register(workspace.cleanup)
+
+
+@contextmanager
+def _borrowed(layers):
+    """Context manager that borrows the temporary files of RasterLayers for the
+    duration of an operation that reads them, for example using reader threads or
+    dataset handles that are not attached to the files, so that the files are not
+    evicted while they are read.
+    """
+    tfiles = {}
+
+    for layer in layers:
+        if layer._tempfile is not None:
+            tfiles[id(layer._tempfile)] = layer._tempfile
+
+    with workspace.lock:
+        for tfile in tfiles.values():
+            tfile.borrows += 1
+
+    try:
+        yield
+    finally:
+        with workspace.lock:
+            for tfile in tfiles.values():
+                tfile.borrows -= 1
+
+
+def _path_size(path):
+    """Size in bytes of a file, or of the files within a directory such as a Zarr
+    store.
+    """
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+
+    return sum(
+        os.path.getsize(os.path.join(root, f))
+        for root, _, files in os.walk(path)
+        for f in files
+    )
+
+
+def _meta_nbytes(meta):
+    """Size in bytes of the uncompressed data described by a rasterio meta dict.
+    """
+    itemsize = np.dtype(meta["dtype"]).itemsize
+    return meta["width"] * meta["height"] * meta["count"] * itemsize
+
+
+def _in_memory(nbytes):
+    """Whether a temporary result of `nbytes` should be kept in memory.
+    """
+    return nbytes is not None and nbytes <= options["memory_threshold"]
+
+
+def _file_path_tempfile(file_path, meta=None):
+    """Returns a TempFile and file path if a file_path parameter is None
+
+    If the metadata of the result is supplied, then a temporary .npy file is used
+    for the 'NPY' driver and a .zarr store for the 'Zarr' driver, otherwise the
+    temporary file is created in memory if the size of the result is below the
+    memory threshold.
+    """
+    if file_path is not None:
+        return file_path, None
+
+    nbytes = _meta_nbytes(meta) if meta is not None else 0
+
+    if meta is not None and meta.get("driver") == "NPY":
+        tfile = workspace.create(".npy", nbytes)
+    elif meta is not None and meta.get("driver") == "Zarr":
+        tfile = workspace.create(".zarr", nbytes)
+    elif meta is not None and _in_memory(nbytes):
+        tfile = workspace.create(".tif", in_memory=True)
     else:
-        tfile = None
+        tfile = workspace.create(".tif", nbytes)
 
-    return file_path, tfile
+    return tfile.name, tfile
@@ -1,6 +1,8 @@
-import numpy as np
 import multiprocessing
 
+import numpy as np
+from rasterio.windows import Window
+
 
 def _get_nodata(dtype):
     """Get a nodata value based on the minimum value permissible by dtype.
@@ -20,3 +22,121 @@ def _get_num_workers(n_jobs):
         n_jobs = n_cpus + n_jobs + 1
 
     return n_jobs
+
+
+def _expand_window(window, halo, height, width):
+    """Expand a window by a halo of pixels in each direction, clipped to the extent
+    of the raster.
+
+    Parameters
+    ----------
+    window : rasterio.windows.Window
+        The window to expand.
+
+    halo : tuple
+        Number of (rows, cols) to expand the window by on each side.
+
+    height, width : int
+        Dimensions of the raster.
+
+    Returns
+    -------
+    tuple
+        The expanded rasterio.windows.Window and the padding ((top, bottom),
+        (left, right)) that is required to restore the parts of the halo that fall
+        outside of the raster.
+    """
+    row_halo, col_halo = halo
+    row_off, col_off = int(window.row_off), int(window.col_off)
+    row_end = row_off + int(window.height)
+    col_end = col_off + int(window.width)
+
+    row_start = max(row_off - row_halo, 0)
+    col_start = max(col_off - col_halo, 0)
+    row_stop = min(row_end + row_halo, height)
+    col_stop = min(col_end + col_halo, width)
+
+    expanded = Window(
+        col_start, row_start, col_stop - col_start, row_stop - row_start
+    )
+    pad = (
+        (row_halo - (row_off - row_start), row_halo - (row_stop - row_end)),
+        (col_halo - (col_off - col_start), col_halo - (col_stop - col_end)),
+    )
+
+    return expanded, pad
+
+
+def _read_halo(src, window, halo):
+    """Read a window of data with a halo of surrounding pixels.
+
+    Parts of the halo that fall outside of the raster are padded with masked
+    values so that the returned array always has the shape of the window plus
+    the halo on each side.
+
+    Parameters
+    ----------
+    src : pyspatialml.Raster or pyspatialml.RasterLayer
+        The object to read from.
+
+    window : rasterio.windows.Window
+        The window to read.
+
+    halo : int or tuple
+        Number of (rows, cols) of surrounding pixels to read.
+
+    Returns
+    -------
+    numpy.ma.MaskedArray
+    """
+    if isinstance(halo, int):
+        halo = (halo, halo)
+
+    expanded, pad = _expand_window(window, halo, src.height, src.width)
+    arr = src.read(window=expanded, masked=True)
+
+    if arr.ndim > 2:
+        pad = ((0, 0),) + pad
+
+    data = np.pad(arr.data, pad, mode="constant")
+    mask = np.pad(np.ma.getmaskarray(arr), pad, mode="constant", constant_values=True)
+
+    return np.ma.MaskedArray(data, mask=mask)
+
+
+def _block_windows(height, width, block_shape):
+    """Generator of windows that tile a raster using a block shape.
+
+    Parameters
+    ----------
+    height, width : int
+        Dimensions of the raster.
+
+    block_shape : tuple
+        Shape of each window in (rows, cols).
+
+    Yields
+    ------
+    rasterio.windows.Window
+    """
+    rows, cols = block_shape
+
+    for row_off in range(0, height, rows):
+        for col_off in range(0, width, cols):
+            yield Window(
+                col_off, row_off, min(cols, width - col_off), min(rows, height - row_off)
+            )
+
+
+def _slice_halo(arr, window, halo, fill_value=0):
+    """Slice a window with a halo of surrounding pixels from a 2d ndarray that
+    covers the full extent of a raster, padding the parts of the halo that fall
+    outside of the array with `fill_value`.
+    """
+    if isinstance(halo, int):
+        halo = (halo, halo)
+
+    expanded, pad = _expand_window(window, halo, arr.shape[0], arr.shape[1])
+    tile = arr[expanded.toslices()]
+
+    return np.pad(tile, pad, mode="constant", constant_values=fill_value)
@@ -0,0 +1,204 @@
+import math
+
+import numpy as np
+import rasterio.errors
+import rasterio.windows
+from rasterio.enums import Resampling
+from rasterio.warp import aligned_target, calculate_default_transform, reproject
+from rasterio.warp import transform_bounds
+from rasterio.windows import Window
+
+from .utils import _block_windows
+
+
+def _target_grid(raster, crs, transform=None, shape=None, res=None):
+    """Transform and shape of the grid that a Raster is reprojected onto.
+
+    Parameters
+    ----------
+    raster : pyspatialml.Raster
+        Raster that is being reprojected.
+
+    crs : rasterio.crs.CRS, dict or str
+        Target crs.
+
+    transform : affine.Affine (optional)
+        Transform of the target grid. Requires `shape` to also be supplied.
+
+    shape : tuple (optional)
+        Shape of the target grid in (rows, cols). If supplied without a transform
+        then the default transform is scaled to cover the extent of the raster
+        using the given dimensions.
+
+    res : float or tuple (optional)
+        Resolution of the target grid. The bounds of the grid are snapped to
+        multiples of the resolution so that results from different rasters line
+        up.
+
+    Returns
+    -------
+    tuple
+        Transform, width and height of the target grid.
+    """
+    if transform is not None:
+        if shape is None:
+            raise ValueError("shape must be supplied together with a transform")
+
+        return transform, shape[1], shape[0]
+
+    kwargs = dict(
+        src_crs=raster.crs,
+        dst_crs=crs,
+        width=raster.width,
+        height=raster.height,
+        left=raster.bounds.left,
+        right=raster.bounds.right,
+        bottom=raster.bounds.bottom,
+        top=raster.bounds.top,
+    )
+
+    if shape is not None:
+        return calculate_default_transform(
+            dst_width=shape[1], dst_height=shape[0], **kwargs
+        )
+
+    if res is not None:
+        if not isinstance(res, (list, tuple)):
+            res = (res, res)
+
+        dst_transform, dst_width, dst_height = calculate_default_transform(
+            resolution=res, **kwargs
+        )
+        return aligned_target(dst_transform, dst_width, dst_height, res)
+
+    return calculate_default_transform(**kwargs)
+
+
+def _source_window(src, dst_window, dst_transform, dst_crs):
+    """Window of a source dataset that covers a window of a target grid.
+
+    The window is padded by enough pixels for the resampling kernel and clipped to
+    the extent of the source.
+
+    Parameters
+    ----------
+    src : pyspatialml.Raster or dataset
+        Source with crs, transform, width and height attributes.
+
+    dst_window : rasterio.windows.Window
+        Window of the target grid.
+
+    dst_transform : affine.Affine
+        Transform of the target grid.
+
+    dst_crs : rasterio.crs.CRS
+        Crs of the target grid.
+
+    Returns
+    -------
+    rasterio.windows.Window or None
+        Window of the source, or None if the window of the target grid does not
+        overlap the source.
+    """
+    bounds = rasterio.windows.bounds(dst_window, dst_transform)
+    src_bounds = transform_bounds(dst_crs, src.crs, *bounds, densify_pts=21)
+    src_window = rasterio.windows.from_bounds(*src_bounds, src.transform)
+
+    # pad by the resampling kernel and the number of source pixels that
+    # contribute to each target pixel
+    ratio = max(
+        src_window.width / dst_window.width, src_window.height / dst_window.height
+    )
+    pad = 3 + int(math.ceil(ratio))
+
+    src_window = Window(
+        math.floor(src_window.col_off) - pad,
+        math.floor(src_window.row_off) - pad,
+        math.ceil(src_window.width) + 2 * pad + 1,
+        math.ceil(src_window.height) + 2 * pad + 1,
+    )
+
+    try:
+        return src_window.intersection(Window(0, 0, src.width, src.height))
+    except rasterio.errors.WindowError:
+        return None
+
+
+def _tile_windows(raster, crs, dst_transform, dst_width, dst_height, block_shape):
+    """Plans the output tiles of a reprojection.
+
+    Each tile of the target grid is paired with the window of the source raster
+    that covers it. The source window is None if the tile does not overlap the
+    source raster.
+
+    Returns
+    -------
+    list
+        List of (dst_window, src_window) tuples.
+    """
+    return [
+        (dst_window, _source_window(raster, dst_window, dst_transform, crs))
+        for dst_window in _block_windows(dst_height, dst_width, block_shape)
+    ]
+
+
+def _read_tile(raster, tile):
+    """Reader used by the workers that reads the source window of a tile for all
+    of the layers.
+    """
+    dst_window, src_window = tile
+
+    if src_window is None:
+        return None, tile
+
+    return raster.read(window=src_window, masked=True), tile
+
+
+def _warp_tile(
+    data, src_transform, src_crs, dst_transform, dst_crs, count, dtype, nodata,
+    resampling
+):
+    """Reprojects all of the layers of a tile from a single read of the source
+    window.
+
+    Parameters
+    ----------
+    data : tuple
+        Tuple of the 3d masked array of source data and the (dst_window,
+        src_window) tile that is returned by `_read_tile`.
+
+    Returns
+    -------
+    numpy.ndarray
+        3d array of the reprojected data for the tile.
+    """
+    arr, (dst_window, src_window) = data
+    destination = np.full(
+        (count, int(dst_window.height), int(dst_window.width)),
+        nodata,
+        dtype=dtype,
+    )
+
+    if arr is None:
+        return destination
+
+    src_transform = rasterio.windows.transform(src_window, src_transform)
+    dst_transform = rasterio.windows.transform(dst_window, dst_transform)
+    source = np.ma.filled(arr, nodata).astype(dtype, copy=False)
+
+    # each layer is warped separately so that nodata is masked per layer, which
+    # matches the results of reprojecting whole layers
+    for band, dst_band in zip(source, destination):
+        reproject(
+            source=band,
+            destination=dst_band,
+            src_transform=src_transform,
+            src_crs=src_crs,
+            src_nodata=nodata,
+            dst_transform=dst_transform,
+            dst_crs=dst_crs,
+            dst_nodata=nodata,
+            resampling=Resampling[resampling],
+        )
+
+    return destination
@@ -0,0 +1,81 @@
+import os
+import pickle
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+
+from pyspatialml import Raster
+from pyspatialml.backends import WarpedDataset
+import pyspatialml.cache as cache
+import pyspatialml.datasets.nc as nc
+
+
+def _sum_bands(arr):
+    return arr[0, :, :] + arr[1, :, :]
+
+
+class TestAlign(TestCase):
+
+    stack = Raster([nc.band1, nc.band2])
+
+    def test_align_to_reference(self):
+        coarse = self.stack.aggregate(out_shape=(100, 130), resampling="average")
+        aligned = coarse.align(self.stack, resampling="bilinear")
+
+        self.assertIsInstance(aligned.iloc[0].ds, WarpedDataset)
+        self.assertEqual(aligned.shape, self.stack.shape)
+        self.assertEqual(aligned.transform, self.stack.transform)
+        self.assertListEqual(aligned.names, coarse.names)
+        self.assertGreater(aligned.read(masked=True).count(), 0)
+
+        # aligned layers are unchanged
+        same = self.stack.align(self.stack)
+        self.assertIs(same.iloc[0].ds, self.stack.iloc[0].ds)
+
+        with self.assertRaises(ValueError):
+            coarse.align(self.stack, resampling="invalid")
+
+    def test_align_matches_reprojection(self):
+        projected = self.stack.to_crs({"init": "EPSG:4326"})
+        aligned = projected.align(self.stack)
+        reprojected = projected.to_crs(
+            self.stack.crs, transform=self.stack.transform, shape=self.stack.shape
+        )
+
+        np.testing.assert_array_equal(
+            aligned.read(masked=True), reprojected.read(masked=True)
+        )
+
+    def test_align_on_init(self):
+        coarse = self.stack.aggregate(out_shape=(100, 130), resampling="average")
+        stack = Raster([self.stack.iloc[0], coarse.iloc[1]], align=True)
+
+        self.assertEqual(stack.count, 2)
+        self.assertEqual(stack.shape, self.stack.shape)
+        self.assertIsInstance(stack.iloc[1].ds, WarpedDataset)
+
+    def test_align_with_processes(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            coarse = self.stack.aggregate(
+                out_shape=(100, 130), file_path=os.path.join(tmpdir, "coarse.tif")
+            )
+            aligned = coarse.align(self.stack)
+
+            # warped datasets reopen the source file when they are unpickled
+            ds = pickle.loads(pickle.dumps(aligned.iloc[0].ds))
+            np.testing.assert_array_equal(ds.read(), aligned.iloc[0].ds.read())
+
+            result = aligned.apply(
+                _sum_bands, n_jobs=2, backend="multiprocessing", count=1
+            )
+            arr = aligned.read(masked=True)
+            np.testing.assert_allclose(result.read(masked=True)[0], arr[0] + arr[1])
+
+            # aligned layers are not cached under the identity of the source file
+            cache.options["directory"] = tmpdir
+            try:
+                cropped = aligned.crop(aligned.bounds)
+                self.assertFalse(cropped.iloc[0].file.startswith(tmpdir))
+            finally:
+                cache.options["directory"] = None
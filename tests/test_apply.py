@@ -4,6 +4,21 @@ import pyspatialml.datasets.nc as nc
 import numpy as np
 
 
+_lookup = {}
+
+
+def _load_lookup(offset):
+    _lookup["offset"] = offset
+
+
+def _add_offset(arr):
+    return arr[0, :, :] + _lookup["offset"]
+
+
+def _sum_bands(arr):
+    return arr[0, :, :] + arr[1, :, :]
+
+
 class TestCalc(TestCase):
 
     predictors = [nc.band1, nc.band2, nc.band3, nc.band4, nc.band5, nc.band7]
@@ -58,3 +73,28 @@ class TestCalc(TestCase):
         self.assertIsInstance(calculation, Raster)
         self.assertEqual(calculation.count, 1)
         self.assertEqual(calculation.read(masked=True).count(), 183418)
+
+    def test_calc_with_process_backend(self):
+        calculation = self.stack.apply(
+            _sum_bands, n_jobs=2, backend="multiprocessing", count=1
+        )
+
+        self.assertIsInstance(calculation, Raster)
+        self.assertEqual(calculation.count, 1)
+        self.assertEqual(calculation.read(masked=True).count(), 183418)
+
+    def test_calc_with_initializer(self):
+        calculation = self.stack.apply(
+            _add_offset,
+            n_jobs=2,
+            backend="multiprocessing",
+            count=1,
+            initializer=_load_lookup,
+            initargs=(10,),
+        )
+
+        self.assertEqual(calculation.count, 1)
+        self.assertEqual(
+            calculation.read(masked=True).min(),
+            self.stack.iloc[0].read(masked=True).min() + 10
+        )
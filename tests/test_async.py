@@ -0,0 +1,77 @@
+import asyncio
+from unittest import TestCase
+
+import geopandas as gpd
+import numpy as np
+from rasterio.windows import Window
+from sklearn.ensemble import RandomForestClassifier
+
+from pyspatialml import Raster, aio
+import pyspatialml.datasets.nc as nc
+
+
+class TestAsync(TestCase):
+
+    def setUp(self):
+        self.stack = Raster([nc.band1, nc.band2, nc.band3])
+        aio.options["max_workers"] = 3
+
+    def tearDown(self):
+        aio.options["max_workers"] = 8
+        self.stack.close()
+
+    def test_read_async(self):
+        windows = [Window(i * 10, i * 5, 50, 40) for i in range(12)]
+
+        async def requests():
+            return await asyncio.gather(
+                *[self.stack.read_async(window=w, masked=True) for w in windows]
+            )
+
+        results = asyncio.run(requests())
+
+        for window, arr in zip(windows, results):
+            np.testing.assert_array_equal(
+                arr, self.stack.read(masked=True, window=window)
+            )
+
+        # the requests share a bounded number of dataset handles
+        pool = self.stack._pool
+        self.assertLessEqual(len(pool.handles), 3)
+        self.assertIs(pool.handles[0], self.stack)
+
+        # bounds are converted to the window that covers them
+        xmin, ymin, xmax, ymax = self.stack.bounds
+        bounds = (xmin, ymin, xmin + 1000, ymin + 1000)
+        arr = asyncio.run(self.stack.read_async(bounds=bounds))
+        np.testing.assert_array_equal(arr, self.stack.sel(bounds).read())
+
+        with self.assertRaises(ValueError):
+            asyncio.run(self.stack.read_async(window=windows[0], bounds=bounds))
+
+    def test_extract_and_predict_async(self):
+        training_pt = gpd.read_file(nc.points)
+        xys = np.array([(p.x, p.y) for p in training_pt.geometry])
+
+        arr = asyncio.run(self.stack.extract_xy_async(xys, return_array=True))
+        np.testing.assert_array_equal(
+            arr, self.stack.extract_xy(xys, return_array=True)
+        )
+
+        df_points = self.stack.extract_vector(gdf=training_pt)
+        df_points["id"] = training_pt["id"].values
+        df_points = df_points.dropna()
+        clf = RandomForestClassifier(n_estimators=5, random_state=1)
+        clf.fit(df_points[self.stack.names], df_points["id"])
+
+        expected = self.stack.predict(clf).read(masked=True)
+        windows = [Window(100, 100, 64, 64), Window(0, 200, 128, 32)]
+
+        async def requests():
+            return await asyncio.gather(
+                *[self.stack.predict_async(clf, window=w) for w in windows]
+            )
+
+        for window, result in zip(windows, asyncio.run(requests())):
+            rows, cols = window.toslices()
+            np.testing.assert_array_equal(result, expected[:, rows, cols])
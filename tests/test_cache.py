@@ -0,0 +1,110 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+
+from pyspatialml import Raster
+from pyspatialml.preprocessing import xy_coordinates
+import pyspatialml.cache as cache
+import pyspatialml.datasets.nc as nc
+
+
+class TestCache(TestCase):
+
+    stack = Raster([nc.band1, nc.band2])
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        cache.options["directory"] = self.tmpdir.name
+
+    def tearDown(self):
+        cache.options.update(directory=None, max_size=2 ** 32)
+        self.tmpdir.cleanup()
+
+    def test_disabled_by_default(self):
+        cache.options["directory"] = None
+        result = self.stack.aggregate(out_shape=(50, 50))
+
+        self.assertFalse(result.iloc[0].file.startswith(self.tmpdir.name))
+        self.assertEqual(os.listdir(self.tmpdir.name), [])
+
+    def test_cache_hit(self):
+        bounds = self.stack.bounds
+        bounds = (bounds.left, bounds.bottom, bounds.left + 1000, bounds.bottom + 1000)
+
+        first = self.stack.crop(bounds)
+        second = self.stack.crop(bounds)
+
+        self.assertEqual(os.path.dirname(first.iloc[0].file), self.tmpdir.name)
+        self.assertEqual(first.iloc[0].file, second.iloc[0].file)
+        self.assertListEqual(first.names, self.stack.names)
+        self.assertListEqual(second.names, self.stack.names)
+        np.testing.assert_array_equal(second.read(), first.read())
+
+        # different parameters and inputs are cached separately
+        third = self.stack.crop(bounds, dtype="float64")
+        self.assertNotEqual(third.iloc[0].file, first.iloc[0].file)
+
+        single = self.stack.iloc[0:1].crop(bounds)
+        self.assertNotEqual(single.iloc[0].file, first.iloc[0].file)
+
+        # file_path bypasses the cache
+        file_path = os.path.join(self.tmpdir.name, "crop.tif")
+        saved = self.stack.crop(bounds, file_path=file_path)
+        self.assertEqual(saved.iloc[0].file, file_path)
+
+    def test_preprocessing(self):
+        first = xy_coordinates(self.stack.iloc[0])
+        second = xy_coordinates(self.stack.iloc[0])
+        self.assertEqual(first.iloc[0].file, second.iloc[0].file)
+
+        lazy = xy_coordinates(self.stack.iloc[0], lazy=True)
+        self.assertFalse(lazy.iloc[0].file.startswith(self.tmpdir.name))
+
+    def test_eviction(self):
+        first = self.stack.aggregate(out_shape=(100, 100))
+        size = os.path.getsize(first.iloc[0].file)
+        cache.options["max_size"] = size * 1.5
+
+        second = self.stack.aggregate(out_shape=(100, 100), resampling="bilinear")
+
+        self.assertFalse(os.path.exists(first.iloc[0].file))
+        self.assertTrue(os.path.exists(second.iloc[0].file))
+
+        cache.clear()
+        self.assertEqual(os.listdir(self.tmpdir.name), [])
+
+    def test_partial_files_are_not_evicted(self):
+        # a result that is being written by another process
+        part_path = os.path.join(self.tmpdir.name, cache._part_prefix + "1234.tif")
+
+        with open(part_path, "wb") as f:
+            f.write(b"0" * 2 ** 20)
+
+        os.utime(part_path, (0, 0))
+        cache.options["max_size"] = 1024
+        self.stack.aggregate(out_shape=(100, 100))
+
+        self.assertTrue(os.path.exists(part_path))
+        self.assertNotIn(cache._part_prefix[:-1], cache._entries(self.tmpdir.name))
+        os.unlink(part_path)
+
+    def test_array_tokens(self):
+        self.assertNotEqual(
+            cache._token(np.zeros(4, dtype=np.int32)),
+            cache._token(np.zeros(2, dtype=np.int64)),
+        )
+        self.assertNotEqual(
+            cache._token(np.array([1, 2])), cache._token(np.array([[1], [2]]))
+        )
+
+    def test_geometry_tokens(self):
+        from shapely.geometry import box
+
+        self.assertNotEqual(
+            cache._token(box(0, 0, 1, 1.0001)), cache._token(box(0, 0, 1, 1.0002))
+        )
+
+        with self.assertRaises(cache._Uncacheable):
+            cache._token(object())
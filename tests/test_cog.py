@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import geopandas as gpd
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+from sklearn.ensemble import RandomForestClassifier
+
+from pyspatialml import Raster
+from pyspatialml.backends import _decimate, _open_dataset
+from pyspatialml.utils import _block_windows
+import pyspatialml.datasets.nc as nc
+
+
+def _sum_bands(arr):
+    return arr[0, :, :] + arr[1, :, :]
+
+
+class TestCOG(TestCase):
+
+    stack = Raster([nc.band1, nc.band2, nc.band3])
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_apply(self):
+        file_path = os.path.join(self.tmpdir, "sum.tif")
+        expected = self.stack.apply(_sum_bands).read(masked=True)
+        result = self.stack.apply(
+            _sum_bands, file_path=file_path, cog=True, blocksize=128,
+            overview_resampling="average"
+        )
+        np.testing.assert_allclose(result.read(masked=True), expected)
+
+        with rasterio.open(file_path) as src:
+            self.assertEqual(src.tags(ns="IMAGE_STRUCTURE")["LAYOUT"], "COG")
+            self.assertEqual(src.compression.value, "DEFLATE")
+            self.assertEqual(src.block_shapes[0], (128, 128))
+            self.assertEqual(src.overviews(1), [2, 4])
+
+            # the overviews match the decimated data
+            data = src.read()
+            overview = src.read(out_shape=(1, 222, 245))
+            np.testing.assert_allclose(
+                overview, _decimate(data, 2, "average", src.nodata)
+            )
+
+    def test_write_keeps_meta(self):
+        stack = Raster([nc.band1, nc.band2, nc.band3])
+        meta = dict(stack.meta)
+        stack.write(os.path.join(self.tmpdir, "cog.tif"), cog=True, blocksize=128)
+        self.assertDictEqual(stack.meta, meta)
+
+        # later writes do not inherit the COG options
+        file_path = os.path.join(self.tmpdir, "sum.tif")
+        stack.apply(_sum_bands, file_path=file_path)
+
+        with rasterio.open(file_path) as src:
+            self.assertNotIn("LAYOUT", src.tags(ns="IMAGE_STRUCTURE"))
+
+    def test_predict_and_mask(self):
+        training_pt = gpd.read_file(nc.points)
+        df_points = self.stack.extract_vector(gdf=training_pt)
+        df_points["id"] = training_pt["id"].values
+        df_points = df_points.dropna()
+        clf = RandomForestClassifier(n_estimators=5, random_state=1)
+        clf.fit(df_points[self.stack.names], df_points["id"])
+
+        expected = self.stack.predict(clf, dtype="int16", nodata=0)
+        result = self.stack.predict(
+            clf, dtype="int16", nodata=0, cog=True, blocksize=128, overview_count=3
+        )
+        np.testing.assert_array_equal(result.read(), expected.read())
+        self.assertEqual(result.iloc[0].ds.overviews(1), [2, 4, 8])
+
+        polygons = gpd.read_file(nc.polygons).iloc[0:1, :]
+        masked = self.stack.mask(polygons, cog=True)
+        np.testing.assert_array_equal(
+            masked.read(masked=True), self.stack.mask(polygons).read(masked=True)
+        )
+
+    def test_unaligned_windows(self):
+        file_path = os.path.join(self.tmpdir, "band1.tif")
+
+        with rasterio.open(nc.band1) as src:
+            arr = src.read()
+            meta = src.meta
+
+        # windows that do not match the tiles and levels that are coarser than a
+        # tile
+        with _open_dataset(
+            file_path, "w", cog=True, blocksize=128, overview_count=8, **meta
+        ) as dst:
+            self.assertEqual(dst.factors, [2, 4, 8, 16, 32, 64, 128, 256])
+
+            for window in _block_windows(dst.height, dst.width, (37, 100)):
+                data = arr[:, window.row_off : window.row_off + window.height,
+                           window.col_off : window.col_off + window.width]
+                dst.write(data, window=window)
+
+            # writes to completed tiles are merged
+            dst.write(np.zeros((10, 10), dtype=arr.dtype), 1, Window(0, 0, 10, 10))
+
+        arr[:, :10, :10] = 0
+
+        with rasterio.open(file_path) as src:
+            np.testing.assert_array_equal(src.read(), arr)
+            overview = src.read(out_shape=(1, 2, 2))
+            np.testing.assert_array_equal(overview, _decimate(_decimate(arr, 128), 2))
@@ -1,7 +1,15 @@
 from unittest import TestCase
+
+import geopandas as gpd
+import numpy as np
+
 from pyspatialml import Raster
+from pyspatialml.backends import WindowDataset
 import pyspatialml.datasets.nc as nc
-import geopandas as gpd
+
+
+def _double(arr):
+    return arr * 2
 
 
 class TestToCrs(TestCase):
@@ -24,3 +32,57 @@ class TestToCrs(TestCase):
         # test nodata value is recognized
         self.assertEqual(stack_cropped.read(masked=True).min(), 35.0)
         self.assertEqual(stack_cropped.read(masked=True).max(), 168.0)
+
+    def test_crop_in_blocks(self):
+
+        stack = Raster(self.predictors)
+        stack.block_shape = (7, 9)
+        stack_cropped = stack.crop(self.crop_bounds)
+
+        np.testing.assert_array_equal(
+            stack_cropped.read(), self.stack.crop(self.crop_bounds).read()
+        )
+
+    def test_crop_view(self):
+
+        stack_view = self.stack.crop(self.crop_bounds, view=True)
+        stack_cropped = self.stack.crop(self.crop_bounds)
+
+        # views reference the existing datasets
+        self.assertIsInstance(stack_view.iloc[0].ds, WindowDataset)
+        self.assertIs(stack_view.iloc[0].ds.source, self.stack.iloc[0].ds)
+        self.assertListEqual(stack_view.names, self.stack.names)
+        self.assertEqual(stack_view.shape, stack_cropped.shape)
+        np.testing.assert_array_equal(
+            stack_view.read(masked=True), stack_cropped.read(masked=True)
+        )
+
+        # views of views are taken from the original dataset
+        nested = stack_view.crop(stack_view.bounds, view=True)
+        self.assertIs(nested.iloc[0].ds.source, self.stack.iloc[0].ds)
+        np.testing.assert_array_equal(nested.read(), stack_view.read())
+
+        # calculations on a view
+        result = stack_view.apply(_double, n_jobs=2, backend="multiprocessing")
+        np.testing.assert_allclose(
+            result.read(masked=True), stack_view.read(masked=True) * 2
+        )
+
+    def test_crop_past_extent(self):
+
+        # bounds that extend past the extent and fall between pixels
+        xmin, ymin, xmax, ymax = self.stack.bounds
+        xres, yres = self.stack.res
+        bounds = (xmin + 10.3 * xres, ymin - 50.7 * yres, xmax + 20, ymax - 30.4 * yres)
+
+        stack_cropped = self.stack.crop(bounds)
+        stack_view = self.stack.crop(bounds, view=True)
+
+        self.assertEqual(stack_cropped.res, self.stack.res)
+        self.assertEqual(stack_cropped.transform, stack_view.transform)
+        self.assertEqual(stack_cropped.shape, stack_view.shape)
+        self.assertEqual(stack_cropped.bounds.right, xmax)
+        self.assertEqual(stack_cropped.bounds.bottom, ymin)
+        np.testing.assert_array_equal(
+            stack_cropped.read(masked=True), stack_view.read(masked=True)
+        )
@@ -0,0 +1,128 @@
+import warnings
+from unittest import TestCase
+
+import numpy as np
+from rasterio.windows import Window
+
+from pyspatialml import Raster, RasterCube
+import pyspatialml.datasets.nc as nc
+
+
+def _mask_rows(arr):
+    arr = arr.copy()
+    arr[:, 0:5, :] = np.ma.masked
+    return arr
+
+
+class TestRasterCube(TestCase):
+
+    stack = Raster([nc.band1, nc.band2, nc.band3])
+
+    def setUp(self):
+        # scenes in reverse time order, where each year the values increase by
+        # the values of the stack
+        self.scenes = [
+            self.stack.apply(lambda arr, k=k: arr * k, n_jobs=1) for k in (4, 3, 2, 1)
+        ]
+        self.times = ["2003-06-01", "2002-06-01", "2001-06-01", "2000-06-01"]
+        self.cube = RasterCube(self.scenes, times=self.times)
+
+    def test_cube(self):
+        self.assertEqual(len(self.cube), 4)
+        self.assertEqual(self.cube.count, 3)
+        self.assertEqual(self.cube.times[0], np.datetime64("2000-06-01"))
+
+        arr = self.cube.read(window=Window(0, 0, 10, 10))
+        self.assertEqual(arr.shape, (4, 3, 10, 10))
+
+        # rasters are sorted by time
+        first = self.cube[0]
+        self.assertEqual(first.names, self.cube.names)
+        np.testing.assert_array_equal(
+            first.read(masked=True), self.stack.read(masked=True)
+        )
+        self.assertEqual(len(self.cube[1:3]), 2)
+
+    def test_reductions(self):
+        expected = self.stack.read(masked=True)
+
+        median = self.cube.reduce("median")
+        self.assertEqual(median.count, 3)
+        self.assertTrue(median.names[0].endswith("_median"))
+        np.testing.assert_allclose(
+            median.read(masked=True), expected * 2.5, rtol=1e-5
+        )
+
+        count = self.cube.reduce("count")
+        self.assertEqual(count.dtypes[0], "int32")
+        self.assertEqual(count.read().max(), 4)
+
+        # values increase by the values of the stack each year
+        trend = self.cube.reduce("trend")
+        np.testing.assert_allclose(
+            trend.read(masked=True), expected, rtol=1e-2, atol=1e-2
+        )
+
+        percentile = self.cube.reduce(
+            "percentile", q=50, n_jobs=2, backend="multiprocessing"
+        )
+        np.testing.assert_allclose(
+            percentile.read(masked=True), median.read(masked=True)
+        )
+
+        with self.assertRaises(ValueError):
+            self.cube.reduce("percentile")
+
+    def test_nodata(self):
+        # mask one of the scenes in the first rows
+        masked = self.scenes[0].apply(_mask_rows, n_jobs=1)
+        cube = RasterCube([masked] + self.scenes[1:], times=self.times)
+
+        count = cube.reduce("count").read()
+        self.assertTrue((count[:, 0, :] <= 3).all())
+
+        maximum = cube.reduce("max").read(masked=True)
+        expected = self.stack.read(masked=True)
+        np.testing.assert_allclose(maximum[:, 0, :], expected[:, 0, :] * 3)
+        np.testing.assert_allclose(maximum[:, -1, :], expected[:, -1, :] * 4)
+
+    def test_apply(self):
+        result = self.cube.apply(
+            lambda arr: arr.mean(axis=(0, 1)), names=["mean"], n_jobs=1
+        )
+        self.assertEqual(result.names, ["mean"])
+        self.assertEqual(result.count, 1)
+
+    def test_streaming_statistics(self):
+        masked = self.scenes[0].apply(_mask_rows, n_jobs=1)
+        cube = RasterCube([masked] + self.scenes[1:], times=self.times)
+        data = np.ma.filled(cube.read().astype("float64"), np.nan)
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            expected = {
+                "mean": np.nanmean(data, axis=0),
+                "std": np.nanstd(data, axis=0),
+                "min": np.nanmin(data, axis=0),
+                "max": np.nanmax(data, axis=0),
+            }
+
+        for statistic, values in expected.items():
+            result = cube.reduce(statistic, n_jobs=2).read(masked=True)
+            np.testing.assert_allclose(
+                result.filled(np.nan), values, rtol=1e-5, atol=1e-3
+            )
+
+        # the trend of the rows with a masked scene uses the valid observations
+        trend = cube.reduce("trend").read(masked=True)
+        np.testing.assert_allclose(
+            trend, self.stack.read(masked=True), rtol=1e-2, atol=1e-2
+        )
+
+    def test_window_size(self):
+        # the windows of the calculations are reduced by the number of times
+        self.cube.block_shape = (64, 64)
+        result = self.cube.reduce("mean")
+        rows, cols = result.iloc[0].ds.block_shapes[0]
+        self.assertLessEqual(rows * cols, 64 * 64 // len(self.cube) + self.cube.width)
+        self.assertEqual(result.dtypes[0], "float32")
@@ -0,0 +1,127 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+from scipy import ndimage
+
+from pyspatialml import Raster
+from pyspatialml.rasterlayer import _distance_tile, _feature_edges
+import pyspatialml.datasets.nc as nc
+
+
+class TestDistance(TestCase):
+
+    # labelled pixels are sparse, non-NaN pixels within a NaN background
+    stack = Raster(nc.labelled_pixels)
+
+    def test_distance(self):
+        layer = self.stack.iloc[0]
+        features = ~layer.read(masked=True).mask
+        expected = ndimage.distance_transform_edt(~features)
+
+        result = layer.distance()
+        self.assertEqual(result.dtype, "float64")
+        np.testing.assert_allclose(result.read(masked=True), expected, rtol=1e-6)
+
+    def test_distance_tiled_exact(self):
+        layer = self.stack.iloc[0]
+        expected = layer.distance(units="map").read(masked=True)
+        result = layer.distance(units="map", block_shape=(50, 50), n_jobs=2)
+
+        np.testing.assert_allclose(result.read(masked=True), expected, rtol=1e-6)
+
+        # small tiles where most pixels are further from a feature than the overlap
+        result = layer.distance(block_shape=(8, 8), n_jobs=2)
+        np.testing.assert_allclose(
+            result.read(masked=True), layer.distance().read(masked=True), rtol=1e-6
+        )
+
+    def test_distance_overlap_is_bounded(self):
+        features = np.zeros((200, 200), dtype=bool)
+        features[0, 0] = True
+        windows = []
+
+        def read_features(window):
+            windows.append(window)
+            return features[window.toslices()]
+
+        def nearest_feature(rows, cols, sampling):
+            edges = _feature_edges(read_features, features.shape, (50, 50))
+            return np.hypot(*(np.column_stack([rows, cols]) - edges[0]).T)
+
+        window = Window(150, 150, 10, 10)
+        dist = _distance_tile(
+            read_features, features.shape, window, (1, 1), None, nearest_feature
+        )
+
+        # the tile is read once with an overlap of the size of the tile
+        self.assertEqual((windows[0].height, windows[0].width), (30, 30))
+        expected = ndimage.distance_transform_edt(~features)[150:160, 150:160]
+        np.testing.assert_allclose(dist, expected)
+
+    def test_distance_binary_raster(self):
+        # rasters of 1 and nodata give the distances to the pixels with a value of 1
+        tmpdir = tempfile.mkdtemp()
+        file_path = os.path.join(tmpdir, "binary.tif")
+        arr = np.zeros((100, 120), dtype="uint8")
+        arr[10, 20] = 1
+        arr[70:75, 90:100] = 1
+
+        with rasterio.open(
+            file_path, "w", driver="GTiff", width=120, height=100, count=1,
+            dtype="uint8", nodata=0, transform=rasterio.Affine(1, 0, 0, 0, -1, 100)
+        ) as dst:
+            dst.write(arr, 1)
+
+        layer = Raster(file_path).iloc[0]
+        expected = ndimage.distance_transform_edt(1 - arr)
+
+        for block_shape in [None, (16, 16)]:
+            result = layer.distance(block_shape=block_shape)
+            np.testing.assert_allclose(result.read(), expected)
+
+        shutil.rmtree(tmpdir)
+
+    def test_distance_geographic_tiled(self):
+        # map distances in a geographic crs do not depend on the tiling
+        tmpdir = tempfile.mkdtemp()
+        file_path = os.path.join(tmpdir, "geographic.tif")
+        arr = np.zeros((100, 120), dtype="uint8")
+        arr[5, 10] = 1
+        arr[90, 110] = 1
+
+        with rasterio.open(
+            file_path, "w", driver="GTiff", width=120, height=100, count=1,
+            dtype="uint8", nodata=0, crs="EPSG:4326",
+            transform=rasterio.Affine(0.1, 0, 10, 0, -0.1, 70)
+        ) as dst:
+            dst.write(arr, 1)
+
+        layer = Raster(file_path).iloc[0]
+        expected = layer.distance(units="map").read(masked=True)
+
+        for block_shape in [(16, 16), (50, 30)]:
+            result = layer.distance(units="map", block_shape=block_shape)
+            np.testing.assert_allclose(result.read(masked=True), expected, rtol=1e-6)
+
+        result = layer.distance(units="map", max_distance=50000, block_shape=(16, 16))
+        result = result.read(masked=True)
+        self.assertEqual(result.count(), (expected <= 50000).sum())
+        np.testing.assert_allclose(
+            result.compressed(), expected[expected <= 50000], rtol=1e-6
+        )
+
+        shutil.rmtree(tmpdir)
+
+    def test_distance_max_distance(self):
+        layer = self.stack.iloc[0]
+        expected = layer.distance().read(masked=True)
+        result = layer.distance(max_distance=10, block_shape=(50, 50))
+        result = result.read(masked=True)
+
+        self.assertEqual(result.count(), (expected <= 10).sum())
+        np.testing.assert_allclose(result.compressed(), expected[expected <= 10])
@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+import rasterio
+
+from pyspatialml import Raster
+import pyspatialml.datasets.nc as nc
+
+
+class TestFillSieve(TestCase):
+
+    stack = Raster([nc.band1, nc.strata])
+
+    def test_fill_tiled(self):
+        layer = self.stack.iloc[0]
+        filled = layer.fill(max_search_distance=10)
+        filled_tiled = layer.fill(
+            max_search_distance=10, block_shape=(64, 64), n_jobs=2
+        )
+
+        arr = filled.read(masked=True)
+        arr_tiled = filled_tiled.read(masked=True)
+
+        self.assertGreater(arr.count(), layer.read(masked=True).count())
+        self.assertEqual(arr.count(), arr_tiled.count())
+        np.testing.assert_array_equal(arr.filled(0), arr_tiled.filled(0))
+
+    def test_sieve_tiled(self):
+        layer = self.stack[["strata"]].apply(lambda arr: arr, dtype="int16", n_jobs=1)
+        layer = layer.iloc[0]
+        sieved = layer.sieve(size=10)
+        sieved_tiled = layer.sieve(size=10, block_shape=(64, 64), n_jobs=2)
+
+        # the same features are removed; the value that they are replaced with can
+        # differ close to the tile edges
+        original = layer.read()
+        removed = sieved.read() != original
+        removed_tiled = sieved_tiled.read() != original
+
+        self.assertGreater(removed.sum(), 0)
+        np.testing.assert_array_equal(removed, removed_tiled)
+
+    def test_tiled_without_nodata(self):
+        tmpdir = tempfile.mkdtemp()
+        file_path = os.path.join(tmpdir, "no_nodata.tif")
+
+        with rasterio.open(nc.band1) as src:
+            arr = src.read(1).astype("float32")
+            meta = src.meta
+
+        arr[100:150, 100:150] = np.nan
+        meta.update(dtype="float32", nodata=None)
+
+        with rasterio.open(file_path, "w", **meta) as dst:
+            dst.write(arr, 1)
+
+        layer = Raster(file_path).iloc[0]
+        self.assertIsNone(layer.nodata)
+
+        # invalid values are written as nodata and valid values are kept
+        for filled in [
+            layer.fill(max_search_distance=2),
+            layer.fill(max_search_distance=2, block_shape=(64, 64), n_jobs=2),
+        ]:
+            result = filled.read(masked=True)
+            self.assertEqual(result.mask.sum(), np.isnan(arr).sum())
+            self.assertFalse(np.isnan(result.compressed()).any())
+            np.testing.assert_array_equal(
+                result[~np.isnan(arr)], arr[~np.isnan(arr)]
+            )
+
+        shutil.rmtree(tmpdir)
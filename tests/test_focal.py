@@ -0,0 +1,87 @@
+from unittest import TestCase
+
+import numpy as np
+from scipy import ndimage
+
+from pyspatialml import Raster
+import pyspatialml.datasets.nc as nc
+
+
+def _band_difference(arr):
+    return arr[0, :, :] - arr[1, :, :]
+
+
+class TestFocal(TestCase):
+
+    predictors = [nc.band1, nc.band2]
+    stack = Raster(predictors)
+    stack.block_shape = (64, 64)
+
+    def test_focal_mean(self):
+        result = self.stack.focal("mean", size=3, n_jobs=2)
+
+        self.assertIsInstance(result, Raster)
+        self.assertEqual(result.count, self.stack.count)
+        self.assertEqual(result.names, ["lsat7_2000_10_mean", "lsat7_2000_20_mean"])
+
+        # compare with a calculation on the whole array
+        arr = self.stack.read(masked=True)
+        expected = ndimage.uniform_filter(arr.data[0].astype("float64"), size=3)
+        valid = ndimage.minimum_filter(~arr.mask[0], size=3)
+        result_arr = result.read(masked=True)
+
+        np.testing.assert_allclose(
+            result_arr[0][valid], expected[valid], rtol=1e-5
+        )
+        self.assertEqual(result_arr.count(), arr.count())
+
+    def test_focal_max_with_processes(self):
+        result = self.stack.focal("max", size=5, n_jobs=2, backend="multiprocessing")
+
+        arr = self.stack.read(masked=True)
+        expected = ndimage.maximum_filter(arr.filled(0)[1], size=5)
+        result_arr = result.read(masked=True)
+
+        valid = ~result_arr.mask[1]
+        np.testing.assert_allclose(result_arr[1][valid], expected[valid])
+
+    def test_focal_kernel(self):
+        kernel = np.ones((3, 3)) / 9
+        mean = self.stack.focal("mean", size=3)
+        convolved = self.stack.focal(kernel)
+
+        arr = self.stack.read(masked=True)
+        valid = ndimage.minimum_filter(~arr.mask[0], size=3)
+
+        np.testing.assert_allclose(
+            convolved.read(masked=True)[0][valid],
+            mean.read(masked=True)[0][valid],
+            rtol=1e-5,
+        )
+
+    def test_focal_function(self):
+        result = self.stack.focal(_band_difference, halo=1)
+
+        self.assertEqual(result.count, 1)
+        self.assertEqual(
+            result.read(masked=True).count(), self.stack.read(masked=True)[0].count()
+        )
+
+    def test_focal_borrows_temporary_inputs(self):
+        # temporary files that are read by the reader threads are not evicted
+        mean = self.stack.focal("mean", size=3)
+        mean.block_shape = (32, 32)
+        tfile = mean.iloc[0]._tempfile
+        borrows = []
+
+        def function(arr):
+            borrows.append(tfile.borrows)
+            return arr
+
+        result = mean.focal(function, halo=1, count=2, n_jobs=4)
+
+        self.assertTrue(all(b > 0 for b in borrows))
+        self.assertEqual(tfile.borrows, 0)
+        np.testing.assert_allclose(
+            result.read(masked=True), mean.read(masked=True), rtol=1e-6
+        )
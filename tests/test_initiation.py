@@ -1,6 +1,8 @@
 from unittest import TestCase
 from pyspatialml import Raster, RasterLayer
+from pyspatialml.backends import LazyDataset
 from pyspatialml.datasets import nc
+import numpy as np
 import rasterio
 
 
@@ -79,3 +81,44 @@ class TestInit(TestCase):
         self.assertIsInstance(stack, Raster)
         self.assertEqual(stack.count, 6)
         stack = None
+
+    def test_lazy_opening(self):
+        stack = Raster(self.predictors)
+
+        # only the headers are read until the data is accessed
+        self.assertIsInstance(stack.iloc[0]._ds, LazyDataset)
+        self.assertEqual(stack.count, 6)
+
+        with rasterio.open(nc.band1) as src:
+            expected = src.read(1, masked=True)
+
+        np.testing.assert_array_equal(stack.iloc[0].read(masked=True), expected)
+        self.assertIsInstance(stack.iloc[0]._ds, rasterio.io.DatasetReader)
+
+    def test_many_files(self):
+        stack = Raster([nc.band1] * 200)
+
+        self.assertEqual(stack.count, 200)
+        self.assertEqual(len(set(stack.names)), 200)
+        self.assertEqual(stack.names[0], "lsat7_2000_10_1")
+        self.assertEqual(stack.names[-1], "lsat7_2000_10_200")
+
+        # copies share the datasets of the original layers
+        subset = stack.drop(list(range(1, 200)), in_place=False)
+        self.assertEqual(subset.count, 1)
+        self.assertEqual(stack.count, 200)
+        self.assertIs(subset.iloc[0].ds, stack.iloc[0].ds)
+
+    def test_copies_of_temporary_layers(self):
+        stack = Raster(self.predictors)
+        result = stack.apply(lambda arr: arr * 2, n_jobs=1)
+        self.assertTrue(result.iloc[0].file.startswith("/vsimem/"))
+
+        # dropping layers from a temporary result does not reopen its files
+        subset = result.drop(0, in_place=False)
+        renamed = subset.rename({subset.names[0]: "doubled"}, in_place=False)
+        del result, subset
+
+        self.assertEqual(renamed.names[0], "doubled")
+        expected = stack.drop(0, in_place=False).read(masked=True) * 2
+        np.testing.assert_array_equal(renamed.read(masked=True), expected)
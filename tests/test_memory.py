@@ -0,0 +1,150 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+from rasterio.windows import Window
+
+from pyspatialml import Raster
+from pyspatialml.backends import ArrayDataset, MemmapDataset
+import pyspatialml.datasets.nc as nc
+import pyspatialml.temporary_files as temporary_files
+
+
+def _sum_bands(arr):
+    return arr[0, :, :] + arr[1, :, :]
+
+
+def _double(arr):
+    return arr * 2
+
+
+def _zero_large_values(arr):
+    arr[arr > 10] = 0
+    return arr
+
+
+class TestMemory(TestCase):
+
+    stack = Raster([nc.band1, nc.band2])
+
+    def tearDown(self):
+        temporary_files.options["memory_threshold"] = 2 ** 26
+
+    def test_raster_from_array(self):
+        arr = np.arange(2 * 10 * 12, dtype="float32").reshape((2, 10, 12))
+        stack = Raster(arr=arr, crs=self.stack.crs, transform=self.stack.transform)
+
+        self.assertIsInstance(stack.iloc[0].ds, ArrayDataset)
+        self.assertEqual(stack.count, 2)
+        np.testing.assert_array_equal(stack.read(), arr)
+        np.testing.assert_array_equal(
+            stack.read(window=Window(2, 3, 4, 5)), arr[:, 3:8, 2:6]
+        )
+
+    def test_reads_can_be_modified(self):
+        arr = np.arange(2 * 10 * 12, dtype="float32").reshape((2, 10, 12))
+        stack = Raster(
+            arr=arr.copy(), crs=self.stack.crs, transform=self.stack.transform
+        )
+
+        # reads are modified in place without changing the dataset
+        for data in [
+            stack.read(masked=True),
+            stack.read(window=Window(2, 3, 4, 5)),
+            stack.iloc[1].read(masked=True),
+        ]:
+            data[data > 10] = 0
+
+        np.testing.assert_array_equal(stack.read(), arr)
+
+        result = stack.apply(_zero_large_values, n_jobs=1)
+        np.testing.assert_array_equal(result.read(), np.where(arr > 10, 0, arr))
+
+    def test_small_results_in_memory(self):
+        result = self.stack.apply(_sum_bands, n_jobs=1)
+        self.assertTrue(result.iloc[0].file.startswith("/vsimem/"))
+
+        layer = self.stack.iloc[0] + 1
+        self.assertTrue(layer.file.startswith("/vsimem/"))
+
+        filled = self.stack.iloc[0].fill()
+        self.assertIsInstance(filled.ds, ArrayDataset)
+
+        expected = _sum_bands(self.stack.read(masked=True))
+        np.testing.assert_allclose(result.read(masked=True)[0], expected)
+
+    def test_threshold(self):
+        temporary_files.options["memory_threshold"] = 0
+
+        result = self.stack.apply(_sum_bands, n_jobs=1)
+        self.assertFalse(result.iloc[0].file.startswith("/vsimem/"))
+
+        filled = self.stack.iloc[0].fill()
+        self.assertNotIsInstance(filled.ds, ArrayDataset)
+
+    def test_memory_layers_with_processes(self):
+        result = self.stack.apply(_sum_bands, n_jobs=1)
+        result.append(self.stack)
+
+        total = result.apply(
+            _sum_bands, n_jobs=2, backend="multiprocessing", count=1
+        )
+        expected = result.read(masked=True)
+        np.testing.assert_allclose(
+            total.read(masked=True)[0], expected[0] + expected[1], rtol=1e-5
+        )
+
+    def test_memmap_outputs(self):
+        result = self.stack.apply(_sum_bands, driver="NPY", n_jobs=1)
+        layer = result.iloc[0]
+
+        self.assertIsInstance(layer.ds, MemmapDataset)
+        self.assertTrue(layer.file.endswith(".npy"))
+        self.assertEqual(layer.driver, "NPY")
+        self.assertEqual(result.crs, self.stack.crs)
+        self.assertEqual(result.transform, self.stack.transform)
+
+        expected = _sum_bands(self.stack.read(masked=True))
+        np.testing.assert_allclose(result.read(masked=True)[0], expected)
+
+        # window reads are views of the memory map, masked reads are copies
+        arr = layer.read(window=Window(0, 0, 10, 10))
+        self.assertIsInstance(arr.base, np.memmap)
+        arr = layer.read(window=Window(0, 0, 10, 10), masked=True)
+        arr[0, 0] = 0
+        self.assertNotEqual(layer.read(window=Window(0, 0, 10, 10))[0, 0], 0)
+
+        # calculations on a memmap layer also use the memmap backend
+        doubled = layer * 2
+        self.assertIsInstance(doubled.ds, MemmapDataset)
+
+        # temporary files are removed when the layer is closed
+        file_path = doubled.file
+        doubled.close()
+        self.assertFalse(os.path.exists(file_path))
+
+    def test_memmap_write(self):
+        result = self.stack.apply(_sum_bands, driver="NPY", n_jobs=1)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            saved = result.write(os.path.join(tmpdir, "result.npy"), driver="NPY")
+            reopened = Raster(os.path.join(tmpdir, "result.npy"))
+
+            self.assertIsInstance(reopened.iloc[0].ds, MemmapDataset)
+            self.assertEqual(reopened.crs, self.stack.crs)
+            np.testing.assert_array_equal(reopened.read(), saved.read())
+
+            converted = reopened.write(os.path.join(tmpdir, "result.tif"))
+            self.assertEqual(converted.iloc[0].driver, "GTiff")
+            np.testing.assert_allclose(
+                converted.read(masked=True), result.read(masked=True)
+            )
+
+            # memmap datasets can be read within process-based workers
+            total = reopened.apply(
+                _double, n_jobs=2, backend="multiprocessing", count=1
+            )
+            np.testing.assert_allclose(
+                total.read(masked=True), reopened.read(masked=True) * 2
+            )
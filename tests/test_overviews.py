@@ -0,0 +1,151 @@
+import os
+import shutil
+import tempfile
+import threading
+from unittest import TestCase
+
+import numpy as np
+
+from pyspatialml import Raster, overviews
+from pyspatialml.overviews import _overview_dataset
+import pyspatialml.datasets.nc as nc
+
+
+class TestOverviews(TestCase):
+
+    def setUp(self):
+        # copies of the datasets so that sidecar files can be written
+        self.tmpdir = tempfile.mkdtemp()
+        self.files = []
+
+        for file in [nc.band1, nc.band2, nc.band3]:
+            shutil.copy(file, self.tmpdir)
+            self.files.append(os.path.join(self.tmpdir, os.path.basename(file)))
+
+        self.stack = Raster(self.files)
+        overviews.options.update(enabled=True, min_pixels=0, min_size=64)
+
+    def tearDown(self):
+        overviews.clear()
+        overviews.options.update(
+            enabled=False, min_pixels=2 ** 22, min_size=256, sidecar=False
+        )
+        self.stack.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_decimated_reads(self):
+        expected = self.stack.read(masked=True)
+        arr = self.stack.read(masked=True, out_shape=(100, 100))
+
+        # the pyramids are built once and are cached for the following reads
+        self.assertEqual(len(overviews._pyramids), 3)
+
+        for file in self.files:
+            pyramid = overviews._pyramids[file]
+            self.assertEqual(pyramid.readers, 0)
+            self.assertFalse(os.path.exists(file + ".ovr"))
+
+        # every dataset handle opens its own handle of the pyramid
+        layer = self.stack.iloc[0]
+        pyramid = overviews._pyramids[layer.file]
+
+        with _overview_dataset(layer.ds, (100, 100)) as src:
+            self.assertEqual(src.overviews(1), [2, 4, 8])
+            self.assertEqual(src.name, pyramid.path)
+            self.assertEqual(pyramid.readers, 1)
+
+            other = Raster(layer.file).iloc[0]
+
+            with _overview_dataset(other.ds, (100, 100)) as other_src:
+                self.assertIsNot(other_src, src)
+
+        np.testing.assert_array_equal(
+            arr[0], layer.read(masked=True, out_shape=(100, 100))
+        )
+        self.assertAlmostEqual(arr.mean(), expected.mean(), delta=1)
+
+        # full resolution reads and small datasets use the dataset
+        with _overview_dataset(layer.ds, layer.shape) as src:
+            self.assertIs(src, layer.ds)
+
+        overviews.options["min_pixels"] = 2 ** 22
+
+        with _overview_dataset(layer.ds, (100, 100)) as src:
+            self.assertIs(src, layer.ds)
+
+        # pyramids that are being read are removed when the reads are finished
+        overviews.options["min_pixels"] = 0
+        file_path = pyramid.path
+
+        with _overview_dataset(layer.ds, (100, 100)) as src:
+            overviews.clear()
+            self.assertTrue(os.path.exists(file_path + ".ovr"))
+            src.read(1, out_shape=(100, 100))
+
+        self.assertFalse(os.path.exists(file_path + ".ovr"))
+
+    def test_disabled(self):
+        overviews.options["enabled"] = False
+        self.stack.read(out_shape=(50, 50))
+        self.assertEqual(len(overviews._pyramids), 0)
+
+    def test_concurrent_reads(self):
+        results = {}
+
+        def read(i):
+            results[i] = Raster(self.files).read(masked=True, out_shape=(50, 50))
+
+        threads = [threading.Thread(target=read, args=(i,)) for i in range(4)]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(overviews._pyramids), 3)
+
+        for i in range(1, 4):
+            np.testing.assert_array_equal(results[0], results[i])
+
+    def test_sidecar(self):
+        overviews.options["sidecar"] = True
+        self.stack.read(out_shape=(50, 50))
+
+        for file in self.files:
+            self.assertTrue(os.path.exists(file + ".ovr"))
+            self.assertEqual(Raster(file).iloc[0].ds.overviews(1), [2, 4, 8])
+
+        # sidecars that are older than the dataset are rebuilt in a later session
+        overviews.clear()
+        sidecar = self.files[0] + ".ovr"
+        os.utime(sidecar, (0, 0))
+        stack = Raster(self.files)
+
+        with _overview_dataset(stack.iloc[0].ds, (50, 50)) as pyramid:
+            self.assertEqual(pyramid.overviews(1), [2, 4, 8])
+
+        self.assertGreater(
+            os.path.getmtime(sidecar), os.path.getmtime(self.files[0])
+        )
+        stack.close()
+
+    def test_stale_user_sidecar(self):
+        # .ovr files that were not written by pyspatialml are never modified
+        sidecar = self.files[0] + ".ovr"
+
+        with open(sidecar, "wb") as f:
+            f.write(b"user file")
+
+        os.utime(sidecar, (0, 0))
+
+        for sidecar_option in [False, True]:
+            overviews.clear()
+            overviews.options["sidecar"] = sidecar_option
+            arr = Raster(self.files[0]).read(out_shape=(50, 50))
+
+            with open(sidecar, "rb") as f:
+                self.assertEqual(f.read(), b"user file")
+
+            self.assertNotEqual(overviews._pyramids[self.files[0]].path, self.files[0])
+            self.assertEqual(arr.shape, (1, 50, 50))
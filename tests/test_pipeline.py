@@ -0,0 +1,100 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+
+import numpy as np
+
+from pyspatialml import Raster
+from pyspatialml.backends import LazyDataset
+from pyspatialml.parallel import _pipeline, _reader_rasters
+import pyspatialml.datasets.nc as nc
+
+
+class TestPipeline(TestCase):
+
+    stack = Raster([nc.band1, nc.band2, nc.band3])
+
+    def test_ordered_results(self):
+        def read(window):
+            # later windows are read faster so that they finish out of order
+            time.sleep(0.001 * (20 - window))
+            return window
+
+        results = _pipeline(
+            range(20), lambda x: x * 2, readers=[read] * 3,
+            executor=ThreadPoolExecutor(2), max_pending=4
+        )
+        self.assertEqual(list(results), [(i, i * 2) for i in range(20)])
+
+    def test_overlapping_stages(self):
+        read_ahead = []
+        lock = threading.Lock()
+        written = [0]
+
+        def read(window):
+            with lock:
+                read_ahead.append(window - written[0])
+            return window
+
+        for window, result in _pipeline(range(10), lambda x: x, [read], None, 3):
+            # windows are read while the writer is busy
+            time.sleep(0.01)
+            written[0] += 1
+
+        self.assertGreater(max(read_ahead), 0)
+        self.assertLessEqual(max(read_ahead), 3)
+
+    def test_errors(self):
+        def function(x):
+            if x == 5:
+                raise ValueError("bad window")
+            return x
+
+        results = _pipeline(range(10), function, executor=ThreadPoolExecutor(2))
+
+        with self.assertRaises(ValueError):
+            list(results)
+
+    def test_reader_datasets(self):
+        with _reader_rasters(self.stack, 3) as rasters:
+            self.assertEqual(len(rasters), 3)
+            self.assertIs(rasters[0], self.stack)
+
+            # the copies are opened when they are first read
+            for raster in rasters[1:]:
+                self.assertIsInstance(raster.iloc[0]._ds, LazyDataset)
+
+            for raster in rasters[1:]:
+                self.assertEqual(raster.names, self.stack.names)
+                self.assertIsNot(raster.iloc[0].ds, self.stack.iloc[0].ds)
+                np.testing.assert_array_equal(raster.read(), self.stack.read())
+
+        for raster in rasters[1:]:
+            self.assertTrue(raster.iloc[0].ds.closed)
+
+        # the copies are also closed if the pipeline fails
+        with self.assertRaises(ValueError):
+            with _reader_rasters(self.stack, 2) as rasters:
+                rasters[1].read()
+                raise ValueError
+
+        self.assertTrue(rasters[1].iloc[0].ds.closed)
+
+    def test_parallel_predict_proba(self):
+        from sklearn.ensemble import RandomForestClassifier
+        import geopandas as gpd
+
+        training_pt = gpd.read_file(nc.points)
+        df_points = self.stack.extract_vector(gdf=training_pt)
+        df_points["id"] = training_pt["id"].values
+        df_points = df_points.dropna()
+        clf = RandomForestClassifier(n_estimators=5, random_state=1)
+        clf.fit(df_points[self.stack.names], df_points["id"])
+
+        stack = Raster([nc.band1, nc.band2, nc.band3])
+        stack.block_shape = (32, 32)
+        serial = stack.predict_proba(clf, n_jobs=1)
+        parallel = stack.predict_proba(clf, n_jobs=4)
+
+        np.testing.assert_array_equal(serial.read(), parallel.read())
@@ -38,3 +38,30 @@ class TestPlotting(TestCase):
         stack = Raster(self.predictors[0])
         p = stack.plot(legend_kwds={"orientation": "horizontal", "fraction": 0.04})
         self.assertIsInstance(p, mpl.axes.Subplot)
+
+    def test_cached_thumbnails(self):
+        stack = Raster(self.predictors)
+        stack.plot(out_shape=(50, 50), n_jobs=2)
+        plt.close("all")
+
+        thumbnails = stack._thumbnails((50, 50))
+        self.assertEqual(len(thumbnails), stack.count)
+
+        for layer, arr in zip(stack.iloc, thumbnails):
+            self.assertEqual(arr.shape, (50, 50))
+            self.assertEqual(len(layer._thumbnails), 1)
+            np.testing.assert_array_equal(
+                arr, layer.read(masked=True, out_shape=(50, 50))
+            )
+
+        # thumbnails are read again when the dataset of a layer is replaced
+        layer = stack.iloc[0]
+        key = next(iter(layer._thumbnails))
+        layer.ds = Raster(self.predictors[1]).iloc[0].ds
+        stack.plot(out_shape=(50, 50))
+        plt.close("all")
+
+        self.assertNotIn(key, layer._thumbnails)
+        np.testing.assert_array_equal(
+            layer._thumbnail((50, 50)), stack.iloc[1]._thumbnail((50, 50))
+        )
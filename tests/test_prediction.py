@@ -1,4 +1,10 @@
 from unittest import TestCase
+
+import numpy as np
+from rasterio.features import geometry_mask
+from rasterio.windows import Window
+from shapely.geometry import box
+
 from pyspatialml import Raster
 from pyspatialml.datasets import nc
 import pyspatialml.datasets.meuse as ms
@@ -62,3 +68,42 @@ class TestPrediction(TestCase):
         multi_regr = self.stack_meuse.predict(regr)
         self.assertIsInstance(multi_regr, Raster)
         self.assertEqual(multi_regr.count, 4)
+
+    def test_predict_window(self):
+        training_pt = gpd.read_file(ms.meuse)
+        training = self.stack_meuse.extract_vector(gdf=training_pt)
+        training["zinc"] = training_pt["zinc"].values
+        training["cadmium"] = training_pt["cadmium"].values
+        training = training.dropna()
+
+        regr = RandomForestRegressor(n_estimators=10, random_state=1)
+        X = training.loc[:, self.stack_meuse.names].values
+        regr.fit(X, training.loc[:, ["zinc", "cadmium"]])
+        expected = self.stack_meuse.predict(regr).read(masked=True)
+
+        # the result is the same as the window of the full prediction, including
+        # the nodata pixels
+        window = Window(20, 40, 50, 30)
+        result = self.stack_meuse.predict_window(regr, window=window)
+        rows, cols = window.toslices()
+        self.assertEqual(result.shape, (2, 30, 50))
+        np.testing.assert_allclose(result, expected[:, rows, cols], rtol=1e-6)
+        np.testing.assert_array_equal(result.mask, expected[:, rows, cols].mask)
+
+        # pixels outside of a geometry are masked
+        xmin, ymin, xmax, ymax = self.stack_meuse.bounds
+        geometry = box(xmin, ymin, (xmin + xmax) / 2, (ymin + ymax) / 2).buffer(-100)
+        result = self.stack_meuse.predict_window(regr, geometry=geometry)
+        view = self.stack_meuse.sel(geometry.bounds)
+        inside = ~geometry_mask(
+            [geometry], out_shape=view.shape, transform=view.transform
+        )
+        self.assertEqual(result.shape[1:], view.shape)
+        self.assertTrue(result.mask[:, ~inside].all())
+        np.testing.assert_allclose(
+            result[:, inside], view.predict(regr).read(masked=True)[:, inside],
+            rtol=1e-6
+        )
+
+        with self.assertRaises(ValueError):
+            self.stack_meuse.predict_window(regr, window=window, geometry=geometry)
@@ -0,0 +1,130 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+import rasterio
+from scipy import ndimage
+
+from pyspatialml import Raster
+from pyspatialml.backends import FunctionDataset
+from pyspatialml.preprocessing import (
+    distance_to_corners,
+    distance_to_samples,
+    one_hot_encode,
+    rotated_coordinates,
+    xy_coordinates,
+)
+import pyspatialml.datasets.nc as nc
+
+
+def _sum_bands(arr):
+    return arr.sum(axis=0)
+
+
+class TestPreprocessing(TestCase):
+
+    stack = Raster([nc.band1])
+    layer = stack.iloc[0]
+
+    def test_distance_to_samples(self):
+        rows = np.asarray([0, 100, 442])
+        cols = np.asarray([0, 250, 10])
+        result = distance_to_samples(self.layer, rows, cols)
+
+        self.assertIsInstance(result, Raster)
+        self.assertEqual(result.names, ["dist_sample1", "dist_sample2", "dist_sample3"])
+
+        for i, (row, col) in enumerate(zip(rows, cols)):
+            point_arr = np.ones(self.layer.shape)
+            point_arr[row, col] = 0
+            expected = ndimage.distance_transform_edt(point_arr)
+            np.testing.assert_allclose(result.iloc[i].read(), expected, rtol=1e-6)
+
+    def test_distance_to_samples_compressed(self):
+        tmpdir = tempfile.mkdtemp()
+        file_path = os.path.join(tmpdir, "distances.tif")
+        expected = distance_to_samples(self.layer, [0, 100], [0, 250]).read()
+        result = distance_to_samples(
+            self.layer, [0, 100], [0, 250], file_path=file_path, compress="deflate"
+        )
+        np.testing.assert_allclose(result.read(), expected)
+
+        # the output is tiled in the blocks that are written
+        with rasterio.open(file_path) as src:
+            self.assertTrue(src.profile["tiled"])
+            self.assertEqual(src.block_shapes[0], (1024, 1024))
+            self.assertEqual(src.compression.value, "DEFLATE")
+
+        shutil.rmtree(tmpdir)
+
+    def test_distance_to_samples_integer_dtype(self):
+        result = distance_to_samples(self.layer, [10], [10], dtype="uint16")
+
+        self.assertEqual(result.dtypes, ["uint16"])
+        self.assertEqual(result.read()[0, 10, 20], 10)
+
+    def test_distance_to_corners(self):
+        result = distance_to_corners(self.layer)
+
+        self.assertEqual(result.count, 5)
+        self.assertEqual(result.read()[0, 0, 0], 0)
+        self.assertEqual(result.read()[3, -1, -1], 0)
+
+    def test_xy_coordinates(self):
+        result = xy_coordinates(self.layer)
+        virtual = xy_coordinates(self.layer, lazy=True)
+        xx, yy = np.meshgrid(np.arange(self.layer.width), np.arange(self.layer.height))
+
+        self.assertEqual(virtual.names, ["x_coordinates", "y_coordinates"])
+        self.assertIsInstance(virtual.iloc[0].ds, FunctionDataset)
+        np.testing.assert_array_equal(result.read(), virtual.read())
+        np.testing.assert_array_equal(virtual.read()[0], xx)
+        np.testing.assert_array_equal(virtual.read()[1], yy)
+
+    def test_rotated_coordinates(self):
+        result = rotated_coordinates(self.layer, n_angles=4)
+        virtual = rotated_coordinates(self.layer, n_angles=4, lazy=True)
+
+        self.assertEqual(virtual.count, 4)
+        np.testing.assert_allclose(result.read(), virtual.read())
+        np.testing.assert_allclose(
+            virtual.read()[1],
+            np.arange(self.layer.width)[np.newaxis, :]
+            + np.tan(np.deg2rad(45)) * np.arange(self.layer.height)[:, np.newaxis],
+        )
+
+    def test_lazy_layers_with_raster(self):
+        stack = Raster([nc.band1, nc.band2])
+        stack.append(distance_to_corners(self.layer, lazy=True))
+        written = distance_to_corners(self.layer)
+
+        np.testing.assert_allclose(stack.read()[2:], written.read())
+
+        # virtual layers are read within process-based workers
+        result = stack.apply(
+            _sum_bands, dtype="float32", n_jobs=2, backend="multiprocessing", count=1
+        )
+        np.testing.assert_allclose(
+            result.read(masked=True)[0], stack.read(masked=True).sum(axis=0), rtol=1e-5
+        )
+
+    def test_one_hot_encode(self):
+        strata = Raster(nc.strata).iloc[0]
+        arr = strata.read(masked=True)
+        categories = np.unique(arr.compressed()).astype("int32")
+
+        result = one_hot_encode(strata)
+
+        self.assertEqual(result.count, len(categories))
+        self.assertEqual(result.dtypes[0], "uint8")
+        self.assertEqual(
+            result.names, ["strata_cat_" + str(cat) for cat in categories]
+        )
+
+        encoded = result.read()
+        np.testing.assert_array_equal(encoded.sum(axis=0), (~arr.mask).astype(int))
+        np.testing.assert_array_equal(
+            encoded[0], (arr == categories[0]).filled(False).astype("uint8")
+        )
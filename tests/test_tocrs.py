@@ -1,4 +1,7 @@
 from unittest import TestCase
+
+import numpy as np
+
 from pyspatialml import Raster
 import pyspatialml.datasets.nc as nc
 
@@ -41,3 +44,44 @@ class TestToCrs(TestCase):
         self.assertEqual(
             stack_prj.read(masked=True).max(), self.stack.read(masked=True).max()
         )
+
+    def test_to_crs_tiled(self):
+
+        stack_prj = self.stack.to_crs({"init": "EPSG:4326"})
+        stack_tiled = self.stack.to_crs({"init": "EPSG:4326"}, tiled=True, n_jobs=2)
+
+        self.assertEqual(stack_tiled.count, self.stack.count)
+        self.assertEqual(stack_tiled.shape, stack_prj.shape)
+        self.assertEqual(stack_tiled.transform, stack_prj.transform)
+        self.assertEqual(stack_tiled.read(masked=True).count(), 1012061)
+        np.testing.assert_array_equal(
+            stack_tiled.read(masked=True), stack_prj.read(masked=True)
+        )
+
+        # tiles reprojected by worker processes
+        stack_mp = self.stack.to_crs(
+            {"init": "EPSG:4326"}, resampling="bilinear", tiled=True, n_jobs=2,
+            backend="multiprocessing"
+        )
+        stack_bilinear = self.stack.to_crs({"init": "EPSG:4326"}, resampling="bilinear")
+        np.testing.assert_array_equal(
+            stack_mp.read(masked=True), stack_bilinear.read(masked=True)
+        )
+
+    def test_to_crs_target_grid(self):
+
+        # snap to a resolution
+        stack_prj = self.stack.to_crs(self.stack.crs, res=100, tiled=True)
+        self.assertEqual(stack_prj.res, (100, 100))
+        self.assertEqual(stack_prj.bounds.left % 100, 0)
+        self.assertEqual(stack_prj.bounds.top % 100, 0)
+
+        # reproject onto the grid of another raster
+        stack_grid = self.stack.to_crs(
+            self.stack.crs, transform=stack_prj.transform, shape=stack_prj.shape
+        )
+        self.assertEqual(stack_grid.transform, stack_prj.transform)
+        self.assertEqual(stack_grid.shape, stack_prj.shape)
+
+        with self.assertRaises(ValueError):
+            self.stack.to_crs(self.stack.crs, transform=stack_prj.transform)
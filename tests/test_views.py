@@ -0,0 +1,67 @@
+from unittest import TestCase
+
+import geopandas as gpd
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+from pyspatialml import Raster
+from pyspatialml.backends import WindowDataset
+import pyspatialml.datasets.nc as nc
+
+
+class TestViews(TestCase):
+
+    predictors = [nc.band1, nc.band2, nc.band3, nc.band4, nc.band5, nc.band7]
+    stack = Raster(predictors)
+
+    def test_window(self):
+        view = self.stack.window[100:200, -150:]
+
+        self.assertIsInstance(view.iloc[0].ds, WindowDataset)
+        self.assertEqual(view.shape, (100, 150))
+        self.assertEqual(view.transform, self.stack.iloc[0].ds.window_transform(
+            view.iloc[0].ds.window
+        ))
+        self.assertListEqual(view.names, self.stack.names)
+        np.testing.assert_array_equal(
+            view.read(), self.stack.read()[:, 100:200, -150:]
+        )
+
+        # single rows or cols
+        self.assertEqual(self.stack.window[5, :].shape, (1, self.stack.width))
+
+        with self.assertRaises(IndexError):
+            self.stack.window[::2, :]
+
+        with self.assertRaises(IndexError):
+            self.stack.window[10:10, :]
+
+    def test_sel(self):
+        view = self.stack.window[100:200, 50:250]
+        selected = self.stack.sel(bounds=view.bounds)
+
+        self.assertEqual(selected.bounds, view.bounds)
+        np.testing.assert_array_equal(selected.read(), view.read())
+
+    def test_view_calculations(self):
+        training_pt = gpd.read_file(nc.points)
+        df_points = self.stack.extract_vector(gdf=training_pt)
+        df_points["class_id"] = training_pt["id"].values
+        df_points = df_points.dropna()
+
+        clf = RandomForestClassifier(n_estimators=10, random_state=1)
+        clf.fit(df_points[self.stack.names].values, df_points.class_id.values)
+
+        view = self.stack.window[100:200, 50:250]
+        view_pred = view.predict(clf, dtype="int16", nodata=0)
+        stack_pred = self.stack.predict(clf, dtype="int16", nodata=0)
+        np.testing.assert_array_equal(
+            view_pred.read(), stack_pred.read()[:, 100:200, 50:250]
+        )
+
+        # extraction uses the coordinates of the view
+        df = view.extract_vector(gdf=training_pt).dropna()
+        inside = training_pt.cx[
+            view.bounds.left:view.bounds.right, view.bounds.bottom:view.bounds.top
+        ]
+        self.assertEqual(len(df), len(inside.dropna()))
@@ -0,0 +1,68 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+from rasterio.windows import Window
+
+from pyspatialml import Raster
+import pyspatialml.datasets.nc as nc
+
+
+def _double(arr):
+    return arr * 2
+
+
+class TestVRT(TestCase):
+
+    predictors = [nc.band1, nc.band2, nc.band3, nc.band4, nc.band5, nc.band7]
+
+    def test_to_vrt(self):
+        stack = Raster(self.predictors)
+        vrt = stack.to_vrt()
+
+        self.assertTrue(vrt.iloc[0].file.startswith("/vsimem/"))
+        self.assertEqual(vrt.names, stack.names)
+        self.assertEqual(vrt.dtypes, stack.dtypes)
+
+        # all of the layers are bands of the same dataset
+        self.assertEqual(len(set(id(layer.ds) for layer in vrt.iloc)), 1)
+
+        for kwargs in [
+            dict(masked=True),
+            dict(masked=True, window=Window(10, 20, 100, 50)),
+            dict(out_shape=(50, 60), resampling="bilinear"),
+        ]:
+            expected = stack.read(**kwargs)
+            result = vrt.read(**kwargs)
+            np.testing.assert_array_equal(result, expected)
+            np.testing.assert_array_equal(
+                np.ma.getmaskarray(result), np.ma.getmaskarray(expected)
+            )
+
+    def test_vrt_of_temporary_files(self):
+        stack = Raster(self.predictors)
+        result = stack.apply(_double, n_jobs=1)
+        vrt = result.to_vrt()
+
+        # the temporary files are kept while they are referenced by the vrt
+        del result
+        np.testing.assert_array_equal(
+            vrt.read(masked=True), stack.read(masked=True) * 2
+        )
+
+        # calculations on the vrt are not written to a vrt
+        self.assertEqual((vrt.iloc[0] + 1).driver, "GTiff")
+
+    def test_write_vrt(self):
+        stack = Raster(self.predictors)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            vrt = stack.write(os.path.join(tmpdir, "stack.vrt"), driver="VRT")
+            tif = stack.write(os.path.join(tmpdir, "stack.tif"))
+
+            self.assertEqual(vrt.iloc[0].driver, "VRT")
+            self.assertEqual(vrt.names, stack.names)
+            self.assertEqual(vrt.dtypes, tif.dtypes)
+            self.assertEqual(vrt.nodatavals, tif.nodatavals)
+            np.testing.assert_array_equal(vrt.read(), tif.read())
@@ -0,0 +1,97 @@
+import gc
+import os
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+
+from pyspatialml import Raster
+import pyspatialml.datasets.nc as nc
+from pyspatialml.parallel import _handle_pool
+from pyspatialml.temporary_files import options, workspace
+
+
+def _sum_bands(arr):
+    return arr[0, :, :] + arr[1, :, :]
+
+
+class TestWorkspace(TestCase):
+
+    stack = Raster([nc.band1, nc.band2])
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        options.update(memory_threshold=0, tempdir=self.tmpdir.name)
+
+    def tearDown(self):
+        options.update(memory_threshold=2 ** 26, tempdir=None, quota=None)
+        workspace.cleanup()
+        self.tmpdir.cleanup()
+
+    def test_tempdir(self):
+        result = self.stack.apply(_sum_bands, n_jobs=1)
+
+        self.assertEqual(os.path.dirname(result.iloc[0].file), self.tmpdir.name)
+        self.assertGreater(workspace.usage()["nbytes"], 0)
+        self.assertEqual(workspace.usage()["directory"], self.tmpdir.name)
+
+    def test_reference_counting(self):
+        result = self.stack.apply(lambda arr: arr * 2, n_jobs=1)
+        file_path = result.iloc[0].file
+
+        # closing one layer keeps the file used by the other layer
+        result.iloc[0].close()
+        self.assertTrue(os.path.exists(file_path))
+
+        result.iloc[1].close()
+        self.assertFalse(os.path.exists(file_path))
+
+    def test_garbage_collection(self):
+        result = self.stack.apply(_sum_bands, n_jobs=1)
+        file_path = result.iloc[0].file
+
+        del result
+        gc.collect()
+        self.assertFalse(os.path.exists(file_path))
+        self.assertEqual(workspace.usage()["files"], 0)
+
+    def test_eviction(self):
+        first = self.stack.apply(_sum_bands, n_jobs=1)
+        expected = first.read(masked=True)
+        nbytes = workspace.usage()["nbytes"]
+
+        # the second result only fits in the quota by evicting the first
+        options["quota"] = int(nbytes * 1.5)
+        second = self.stack.apply(_sum_bands, n_jobs=1)
+
+        self.assertFalse(os.path.exists(first.iloc[0].file))
+        self.assertEqual(workspace.usage()["evicted"], 1)
+
+        # the evicted result is recomputed when it is accessed
+        np.testing.assert_array_equal(first.read(masked=True), expected)
+        self.assertTrue(os.path.exists(first.iloc[0].file))
+        self.assertFalse(os.path.exists(second.iloc[0].file))
+
+    def test_borrowed_files_are_not_evicted(self):
+        first = self.stack.apply(_sum_bands, n_jobs=1)
+        nbytes = workspace.usage()["nbytes"]
+        options["quota"] = int(nbytes * 1.5)
+
+        # files that are read by the handles of a pool are kept
+        with _handle_pool(first, 2).borrow():
+            with self.assertRaises(OSError):
+                self.stack.apply(_sum_bands, n_jobs=1)
+
+            self.assertTrue(os.path.exists(first.iloc[0].file))
+            self.assertFalse(first.iloc[0]._ds.closed)
+
+        # and are evicted once they are returned
+        self.stack.apply(_sum_bands, n_jobs=1)
+        self.assertFalse(os.path.exists(first.iloc[0].file))
+        self.assertEqual(workspace.usage()["evicted"], 1)
+
+    def test_quota_exceeded(self):
+        options["quota"] = 1024
+
+        with self.assertRaises(OSError):
+            self.stack.iloc[0].fill()
@@ -0,0 +1,106 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+import rasterio.shutil
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+
+from pyspatialml import Raster
+from pyspatialml.backends import ZarrDataset
+import pyspatialml.datasets.nc as nc
+
+
+def _sum_bands(arr):
+    return arr[0, :, :] + arr[1, :, :]
+
+
+class TestZarr(TestCase):
+
+    stack = Raster([nc.band1, nc.band2, nc.band3])
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_apply(self):
+        expected = self.stack.apply(_sum_bands, n_jobs=1).read(masked=True)
+
+        for backend in ["threading", "multiprocessing"]:
+            result = self.stack.apply(
+                _sum_bands, driver="Zarr", n_jobs=2, backend=backend
+            )
+            self.assertEqual(result.iloc[0].driver, "Zarr")
+            self.assertTrue(os.path.isdir(result.iloc[0].file))
+            np.testing.assert_allclose(result.read(masked=True), expected)
+            np.testing.assert_array_equal(
+                result.read(masked=True).mask, expected.mask
+            )
+
+            # temporary stores are removed with the layers
+            file_path = result.iloc[0].file
+            result.iloc[0].close()
+            self.assertFalse(os.path.exists(file_path))
+
+    def test_write_and_read(self):
+        file_path = os.path.join(self.tmpdir, "stack.zarr")
+        result = self.stack.write(file_path, driver="Zarr", compress="deflate")
+
+        self.assertEqual(result.count, 3)
+        self.assertEqual(result.crs, self.stack.crs)
+        self.assertEqual(result.transform, self.stack.transform)
+        np.testing.assert_array_equal(
+            result.read(masked=True), self.stack.read(masked=True)
+        )
+
+        # partially covered chunks are merged with the existing chunks
+        store = ZarrDataset(file_path, mode="r+")
+        arr = np.zeros((3, 10, 300), dtype=store.dtypes[0])
+        store.write(arr, window=rasterio.windows.Window(200, 250, 300, 10))
+        updated = Raster(file_path).read()
+        self.assertTrue((updated[:, 250:260, 200:489] == 0).all())
+        np.testing.assert_array_equal(updated[:, 0:250], result.read()[:, 0:250])
+
+    def test_predict(self):
+        X = self.stack.read(masked=True).reshape((3, -1)).T.filled(0)[0:2000]
+        estimator = RandomForestRegressor(n_estimators=5).fit(X, X[:, 0])
+
+        expected = self.stack.predict(estimator)
+        result = self.stack.predict(estimator, driver="Zarr")
+        np.testing.assert_allclose(
+            result.read(masked=True), expected.read(masked=True)
+        )
+
+    def test_predict_proba(self):
+        X = self.stack.read(masked=True).reshape((3, -1)).T
+        X = X[~X.mask.any(axis=1)].data[0:2000]
+        y = np.digitize(X[:, 0], np.percentile(X[:, 0], [33, 66]))
+        estimator = RandomForestClassifier(n_estimators=5).fit(X, y)
+
+        expected = self.stack.predict_proba(estimator)
+        result = self.stack.predict_proba(estimator, driver="Zarr", n_jobs=2)
+        self.assertEqual(result.iloc[0].driver, "Zarr")
+        self.assertEqual(result.count, 3)
+        np.testing.assert_allclose(
+            result.read(masked=True), expected.read(masked=True)
+        )
+
+        # subsets of the classes
+        result = self.stack.predict_proba(estimator, indexes=[2], driver="Zarr")
+        np.testing.assert_allclose(
+            result.read(masked=True)[0], expected.read(masked=True)[2]
+        )
+
+    def test_variables(self):
+        tif = self.stack.write(os.path.join(self.tmpdir, "stack.tif"))
+        file_path = os.path.join(self.tmpdir, "stack.nc")
+        rasterio.shutil.copy(tif.iloc[0].file, file_path, driver="netCDF")
+
+        # variables of a NetCDF file are read as RasterLayers
+        stack = Raster(file_path)
+        self.assertEqual(stack.names, ["Band1", "Band2", "Band3"])
+        self.assertEqual(stack.transform, self.stack.transform)
+        np.testing.assert_allclose(stack.read(masked=True), tif.read(masked=True))